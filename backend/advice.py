@@ -1,12 +1,33 @@
 # routes/advice.py
-from fastapi import APIRouter, Form
+from fastapi import APIRouter, Form, Request
 from fastapi.responses import HTMLResponse
-from openai import OpenAI
+from config import (
+    ADVICE_CACHE_ENABLED,
+    ADVICE_CACHE_MAX_ENTRIES,
+    ADVICE_CACHE_SIMILARITY,
+    ADVICE_CACHE_TTL_S,
+)
+from metrics import Histogram, stage_seconds
+from openai_client import chat_completion
+from semantic_cache import SemanticCache
+import logging
 import markdown 
-import os
+import time
 
 router = APIRouter()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+logger = logging.getLogger(__name__)
+
+advice_cache = SemanticCache(
+    max_entries=ADVICE_CACHE_MAX_ENTRIES,
+    ttl_s=ADVICE_CACHE_TTL_S,
+    similarity_threshold=ADVICE_CACHE_SIMILARITY,
+)
+
+advice_latency = Histogram(
+    "advice_request_seconds",
+    "Time to answer an advice request, by cache outcome",
+    labelnames=("cache",),
+)
 
 # --- prompt template ----------------------------------------------------------
 SYSTEM_PROMPT = """
@@ -37,8 +58,8 @@ Rules:
 """
 
 # --- GPT helper ---------------------------------------------------------------
-def get_counselor_advice(problem: str) -> str:
-    rsp = client.chat.completions.create(
+async def get_counselor_advice(problem: str) -> str:
+    rsp = await chat_completion(
         model="gpt-4o-mini",  # or "gpt-4o" / "gpt-4"
         temperature=0.6,
         max_tokens=700,
@@ -50,20 +71,72 @@ def get_counselor_advice(problem: str) -> str:
     return rsp.choices[0].message.content
 
 
-# --- FastAPI route ------------------------------------------------------------
-@router.post("/advice", response_class=HTMLResponse)
-async def get_advice(problem: str = Form(...)):
-    advice_md = get_counselor_advice(problem)
-
+def render_advice(advice_md: str) -> str:
     # convert Markdown → HTML
-    advice_html = markdown.markdown(
-        advice_md, extensions=["fenced_code", "tables"]
-    )
+    with stage_seconds.timer(stage="advice.render_markdown"):
+        advice_html = markdown.markdown(
+            advice_md, extensions=["fenced_code", "tables"]
+        )
 
     # wrap in Tailwind-styled card
-    html = f"""
+    return f"""
     <div class="bg-white p-6 rounded-lg shadow border prose prose-indigo max-w-none">
         {advice_html}
     </div>
     """
-    return HTMLResponse(content=html)
+
+
+def wants_bypass(request: Request) -> bool:
+    if "x-cache-bypass" in request.headers:
+        return True
+    return "no-cache" in request.headers.get("cache-control", "").lower()
+
+
+async def embed_problem(problem: str):
+    """Query embedding for the semantic tier, or None if the provider is unavailable."""
+    from examples import embed_query
+
+    try:
+        return await embed_query(problem)
+    except Exception as e:
+        logger.warning("Advice cache: embedding failed, exact matches only: %s", e)
+        return None
+
+
+# --- FastAPI route ------------------------------------------------------------
+@router.post("/advice", response_class=HTMLResponse)
+async def get_advice(request: Request, problem: str = Form(...)):
+    start = time.perf_counter()
+    outcome = "disabled"
+    embedding = None
+
+    if ADVICE_CACHE_ENABLED:
+        if wants_bypass(request):
+            outcome = "bypass"
+            advice_cache.record_bypass()
+        else:
+            html = advice_cache.get_exact(problem)
+            outcome = "exact"
+            if html is None:
+                embedding = await embed_problem(problem)
+                match = advice_cache.get_similar(embedding)
+                html, outcome = (match[0], "semantic") if match else (None, "miss")
+            if html is not None:
+                advice_latency.observe(time.perf_counter() - start, cache=outcome)
+                return HTMLResponse(content=html, headers={"X-Advice-Cache": outcome})
+
+    html = render_advice(await get_counselor_advice(problem))
+    elapsed = time.perf_counter() - start
+    if outcome == "miss":
+        advice_cache.put(problem, embedding, html, cost_s=elapsed)
+    advice_latency.observe(elapsed, cache=outcome)
+    return HTMLResponse(content=html, headers={"X-Advice-Cache": outcome})
+
+
+@router.get("/advice/cache/stats")
+async def advice_cache_stats():
+    return {
+        "enabled": ADVICE_CACHE_ENABLED,
+        "cache": advice_cache.stats(),
+        "request_seconds": advice_latency.summary(),
+    }
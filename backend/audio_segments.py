@@ -0,0 +1,108 @@
+"""Cutting recordings into overlapping segments for transcription.
+
+WAV files are cut with the standard library. Other formats need ffmpeg
+(installed in the Docker image); without it they are transcribed whole.
+Segments of compressed input are re-encoded as mono FLAC, which keeps a
+ten-minute segment well under the transcription API's 25 MB file limit.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import wave
+from dataclasses import dataclass
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Segment:
+    path: str
+    start_s: float
+    end_s: float
+
+
+def probe_duration(path: str) -> Optional[float]:
+    """Length in seconds, or None if it can't be determined."""
+    if path.lower().endswith(".wav"):
+        try:
+            with wave.open(path, "rb") as audio:
+                return audio.getnframes() / audio.getframerate()
+        except (wave.Error, EOFError):
+            pass  # e.g. compressed WAV; try ffprobe
+    if shutil.which("ffprobe") is None:
+        return None
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+        capture_output=True, text=True,
+    )
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+
+def segment_bounds(duration: float, segment_s: float, overlap_s: float):
+    """(start, end) pairs covering ``duration``, each ``segment_s`` long and overlapping the next by ``overlap_s``."""
+    if duration <= segment_s:
+        return [(0.0, duration)]
+    step = segment_s - overlap_s
+    if step <= 0:
+        raise ValueError("The segment length must be longer than the overlap")
+    bounds, start = [], 0.0
+    while True:
+        end = min(start + segment_s, duration)
+        bounds.append((start, end))
+        if end >= duration:
+            return bounds
+        start += step
+
+
+def _split_wav(path, bounds, folder):
+    segments = []
+    with wave.open(path, "rb") as audio:
+        params = audio.getparams()
+        rate = audio.getframerate()
+        for i, (start, end) in enumerate(bounds):
+            audio.setpos(int(start * rate))
+            frames = audio.readframes(int((end - start) * rate))
+            segment_path = os.path.join(folder, f"segment-{i:04d}.wav")
+            with wave.open(segment_path, "wb") as out:
+                out.setparams(params)
+                out.writeframes(frames)
+            segments.append(Segment(segment_path, start, end))
+    return segments
+
+
+def _split_ffmpeg(path, bounds, folder):
+    segments = []
+    for i, (start, end) in enumerate(bounds):
+        segment_path = os.path.join(folder, f"segment-{i:04d}.flac")
+        subprocess.run(
+            ["ffmpeg", "-v", "error", "-y", "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", path,
+             "-vn", "-ac", "1", "-c:a", "flac", segment_path],
+            check=True, capture_output=True,
+        )
+        segments.append(Segment(segment_path, start, end))
+    return segments
+
+
+def split_audio(path: str, segment_s: float, overlap_s: float, folder: str) -> List[Segment]:
+    """Segments of ``path`` written to ``folder``; a single segment (the file itself) if it's short or can't be cut."""
+    duration = probe_duration(path)
+    if duration is None:
+        logger.warning("Can't determine the length of %s; transcribing it whole", path)
+        return [Segment(path, 0.0, 0.0)]
+    bounds = segment_bounds(duration, segment_s, overlap_s)
+    if len(bounds) == 1:
+        return [Segment(path, 0.0, duration)]
+    try:
+        with wave.open(path, "rb"):
+            return _split_wav(path, bounds, folder)
+    except (wave.Error, EOFError):
+        pass
+    if shutil.which("ffmpeg") is None:
+        logger.warning("ffmpeg is not installed; transcribing %s whole", path)
+        return [Segment(path, 0.0, duration)]
+    return _split_ffmpeg(path, bounds, folder)
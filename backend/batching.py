@@ -0,0 +1,141 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Sequence
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """Collects single items from many callers and processes them in batches.
+
+    Callers submit one item and get a future back. Worker threads take the
+    first queued item, then keep gathering until either ``max_batch_size``
+    items are collected or ``max_wait_ms`` has passed, and hand the whole
+    batch to ``process_batch``. ``process_batch`` must return one result per
+    input, in the same order.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        num_workers: int = 1,
+        name: str = "batcher",
+    ):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.num_workers = max(1, num_workers)
+        self.name = name
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+        self._batches = 0
+        self._items = 0
+        self._largest_batch = 0
+
+    # ==== Public API ====
+
+    def submit(self, item: Any) -> Future:
+        """Queue one item and return a future resolved with its result."""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    async def run(self, item: Any) -> Any:
+        """Awaitable wrapper around ``submit`` for use inside request handlers."""
+        return await asyncio.wrap_future(self.submit(item))
+
+    def stats(self) -> dict:
+        batches = self._batches
+        return {
+            "batches": batches,
+            "items": self._items,
+            "avg_batch_size": round(self._items / batches, 2) if batches else 0.0,
+            "largest_batch": self._largest_batch,
+            "queue_depth": self._queue.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "workers": self.num_workers,
+        }
+
+    def close(self):
+        """Stop the worker threads once the queued items have been processed."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join()
+
+    # ==== Worker ====
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.num_workers):
+                thread = threading.Thread(
+                    target=self._worker, name=f"{self.name}-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                # Leave the sentinel for this worker's next loop iteration
+                self._queue.put(_STOP)
+                break
+            batch.append(entry)
+        return batch
+
+    def _worker(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+
+            # Drop callers that gave up (e.g. the client disconnected)
+            batch = [
+                (item, future)
+                for item, future in self._collect(first)
+                if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+
+            try:
+                results = self.process_batch([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"{self.name}: process_batch returned {len(results)} results for {len(batch)} items"
+                    )
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._largest_batch = max(self._largest_batch, len(batch))
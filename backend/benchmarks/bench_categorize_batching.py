@@ -0,0 +1,91 @@
+"""Throughput of /api/categorize inference with and without micro-batching.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_categorize_batching --concurrency 1 4 16 64
+
+For each concurrency level the script fires that many simultaneous callers
+at a MicroBatcher wrapping ``categorize.predict_batch`` and reports
+questions/second, the average batch size, and the worst event-loop stall
+seen by a 1 ms ticker coroutine running alongside.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from batching import MicroBatcher
+from categorize import predict_batch
+
+QUESTIONS = [
+    "I have been feeling really down for weeks and can't get out of bed.",
+    "My husband and I fight constantly about money and the kids.",
+    "I get panic attacks before every meeting at work.",
+    "How do I tell my parents that I'm gay?",
+    "I can't sleep more than three hours a night.",
+    "My teenage son has stopped talking to me since the divorce.",
+    "I drink every night to calm down and I think it's getting worse.",
+    "Ever since my mother passed away I feel numb.",
+]
+
+
+async def _ticker(stop, lags):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - start - 0.001)
+
+
+async def _run_level(batcher, concurrency, requests):
+    stop = asyncio.Event()
+    lags = []
+    ticker = asyncio.create_task(_ticker(stop, lags))
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            await batcher.run(QUESTIONS[i % len(QUESTIONS)])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "seconds": round(elapsed, 3),
+        "questions_per_s": round(requests / elapsed, 1),
+        "max_loop_stall_ms": round(max(lags, default=0.0) * 1000, 2),
+    }
+
+
+async def main(args):
+    results = []
+    for label, batch_size in (("unbatched", 1), ("batched", args.max_batch_size)):
+        for concurrency in args.concurrency:
+            batcher = MicroBatcher(
+                predict_batch,
+                max_batch_size=batch_size,
+                max_wait_ms=args.max_wait_ms,
+                num_workers=args.workers,
+                name=f"bench-{label}",
+            )
+            # warm-up so the first measured batch doesn't pay for lazy init
+            await batcher.run(QUESTIONS[0])
+            row = await _run_level(batcher, concurrency, args.requests)
+            row.update(mode=label, avg_batch_size=batcher.stats()["avg_batch_size"])
+            batcher.close()
+            results.append(row)
+            print(json.dumps(row))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,114 @@
+"""Query latency and retrieval agreement between embedding providers.
+
+Run from the backend directory, after building an index per provider with
+data_exploration/generating_embeddings.py --provider <name>:
+
+    python -m benchmarks.bench_embedding_providers --providers openai local --k 5
+    python -m benchmarks.bench_embedding_providers --output providers_report.json
+
+Queries are random word windows cut from the transcripts, standing in for a
+partial conversation. Latency is one ``aembed_one`` call per query, the way
+/api/examples embeds (without the embedding cache). Agreement compares each
+provider's top-k transcript ids with the first provider's; the transcript a
+query was cut from is left out of the results so it doesn't match trivially.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+import vector_index
+from config import EXAMPLES_EF_SEARCH, EXAMPLES_NPROBE
+from embedding_providers import PROVIDERS, corpus_files, create_provider
+from transcript_store import TranscriptStore
+
+
+def load_corpus(provider_name):
+    index_file, _, store_file = corpus_files(provider_name)
+    index = vector_index.read_index(index_file)
+    vector_index.configure_search(index, nprobe=EXAMPLES_NPROBE, ef_search=EXAMPLES_EF_SEARCH)
+    return index, TranscriptStore(store_file)
+
+
+def sample_queries(store, n, words, rng):
+    rows = store.all_rows()
+    queries = []
+    for i in rng.choice(len(rows), size=min(n, len(rows)), replace=False):
+        transcript_id, _, text = rows[i]
+        tokens = text.split()
+        start = int(rng.integers(0, max(1, len(tokens) - words)))
+        queries.append((transcript_id, " ".join(tokens[start:start + words])))
+    return queries
+
+
+def top_ids(index, store, embedding, k, exclude):
+    _, idxs = vector_index.search(index, embedding, k + 1)
+    rows = [int(i) for i in idxs[0] if i >= 0]
+    ids = [transcript_id for transcript_id, _ in store.get_many(rows) if transcript_id != exclude]
+    return ids[:k]
+
+
+async def measure(provider, index, store, queries, k):
+    await provider.aembed_one("warm-up query")
+    latencies, found = [], []
+    for transcript_id, text in queries:
+        start = time.perf_counter()
+        embedding = await provider.aembed_one(text)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(top_ids(index, store, embedding, k, exclude=transcript_id))
+    return latencies, found
+
+
+async def run(args):
+    rng = np.random.default_rng(args.seed)
+    corpora = {name: load_corpus(name) for name in args.providers}
+    queries = sample_queries(corpora[args.providers[0]][1], args.queries, args.query_words, rng)
+
+    report = {"queries": len(queries), "k": args.k, "results": []}
+    reference = None
+    for name in args.providers:
+        provider = create_provider(name)
+        index, store = corpora[name]
+        latencies, found = await measure(provider, index, store, queries, args.k)
+
+        row = {
+            "provider": name,
+            "model": provider.name,
+            "dim": provider.dim,
+            "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+            "latency_ms_p99": round(float(np.percentile(latencies, 99)), 3),
+        }
+        if reference is None:
+            reference = found
+        else:
+            overlap = [len(set(a) & set(b)) / args.k for a, b in zip(reference, found)]
+            top1 = [bool(a) and bool(b) and a[0] == b[0] for a, b in zip(reference, found)]
+            row[f"overlap@{args.k}"] = round(float(np.mean(overlap)), 4)
+            row["top1_agreement"] = round(float(np.mean(top1)), 4)
+        report["results"].append(row)
+        print(json.dumps(row))
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding providers for /api/examples")
+    parser.add_argument("--providers", nargs="+", choices=PROVIDERS, default=["openai", "local"],
+                        help="the first one is the reference for agreement")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--query-words", type=int, default=80)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""Micro-benchmarks of the in-process hot paths: classifier inference and FAISS search.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_hot_paths classifier --batch-sizes 1 8 32 --seq-lengths 32 128 256 --threads 1 2 4
+    python -m benchmarks.bench_hot_paths classifier --backend onnx-int8 --interop-threads 1
+    python -m benchmarks.bench_hot_paths search --k 1 5 20 --scales 1 10 100 --index-types flat hnsw
+    python -m benchmarks.bench_hot_paths search --output search.json --compare search_before.json
+
+``classifier`` loads the model from categorize.MODEL_DIR (or an ONNX export
+with ``--backend``) and times the logits function alone, without the HTTP
+layer or the micro-batcher, on batches of ``batch size`` inputs padded to
+exactly ``sequence length`` tokens (at most categorize.MAX_LENGTH). The
+backend is reloaded for each thread count. torch only lets the inter-op
+pool be sized once per process, so ``--interop-threads`` takes one value;
+run the script once per setting to compare them.
+
+``search`` times ``vector_index.search`` over the serving corpus from
+conversation_embeddings. ``--scales`` grows the corpus with perturbed copies
+of its vectors to estimate latency at 10x-100x the current size. Queries
+are corpus vectors with noise added, like in bench_index_types, which also
+reports recall.
+
+Rows are printed as JSON lines. Each row has the p50/p95/p99 latency, the
+throughput and the process's RSS (current and peak while the row ran).
+``--output`` writes the report with the commit, and ``--compare`` prints
+the change in throughput and p95 against an earlier report.
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from benchmarks.load_test import RssSampler, _git_commit, compare
+
+FILLER = (
+    "I have been feeling anxious and tired for months, I can't focus at work, "
+    "I argue with my partner and I don't know who to talk to about any of it. "
+)
+
+
+def _timed(fn, repeats, warmup):
+    """Per-call latencies in seconds of ``fn()`` after ``warmup`` unmeasured calls."""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _summary(latencies):
+    ms = np.asarray(latencies) * 1000
+    return {
+        **{f"latency_ms_p{q}": round(float(np.percentile(ms, q)), 4) for q in (50, 95, 99)},
+        "calls_per_s": round(len(ms) / (ms.sum() / 1000), 2),
+    }
+
+
+def _current_rss_mb():
+    with open("/proc/self/status", encoding="ascii") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return None
+
+
+# ==== Classifier ====
+
+def classifier_inputs(tokenizer, batch_size, seq_len):
+    """A batch of distinct questions tokenized and padded to exactly ``seq_len`` tokens."""
+    texts = [f"Question {i}: {FILLER * (seq_len // 20 + 1)}" for i in range(batch_size)]
+    encoded = tokenizer(texts, truncation=True, max_length=seq_len, padding="max_length", return_tensors="np")
+    return dict(encoded)
+
+
+def bench_classifier(args):
+    from transformers import AutoTokenizer
+
+    import categorize
+
+    if args.interop_threads:
+        import torch
+
+        torch.set_num_interop_threads(args.interop_threads)
+    # Just the tokenizer: a Classifier would hold an extra copy of the model in every RSS reading
+    tokenizer = AutoTokenizer.from_pretrained(categorize.MODEL_NAME)
+    seq_lengths = [min(n, categorize.MAX_LENGTH) for n in args.seq_lengths]
+
+    rows = []
+    for threads in args.threads:
+        # The loaders read the thread count from this module-level setting
+        categorize.CATEGORIZE_TORCH_THREADS = threads
+        start = time.perf_counter()
+        compute_logits = categorize.load_backend(args.backend)
+        load_seconds = time.perf_counter() - start
+        for seq_len in seq_lengths:
+            for batch_size in args.batch_sizes:
+                inputs = classifier_inputs(tokenizer, batch_size, seq_len)
+                with RssSampler(os.getpid()) as rss:
+                    latencies = _timed(lambda: compute_logits(inputs), args.repeats, args.warmup)
+                rss_mb = _current_rss_mb()
+                row = {
+                    "backend": args.backend,
+                    "threads": threads,
+                    "interop_threads": args.interop_threads or None,
+                    "batch_size": batch_size,
+                    "seq_len": seq_len,
+                    "load_seconds": round(load_seconds, 3),
+                    **_summary(latencies),
+                }
+                row["sequences_per_s"] = round(row["calls_per_s"] * batch_size, 1)
+                row["tokens_per_s"] = round(row["sequences_per_s"] * seq_len)
+                row.update(rss_mb=rss_mb, peak_rss_mb=rss.peak_mb())
+                rows.append(row)
+                print(json.dumps(row))
+        del compute_logits
+    return rows
+
+
+# ==== Vector search ====
+
+def _grown(vectors, scale, noise, rng):
+    """``vectors`` plus perturbed copies up to ``scale`` times as many rows."""
+    import faiss
+
+    extra = len(vectors) * (scale - 1)
+    if extra <= 0:
+        return vectors
+    picks = vectors[rng.integers(0, len(vectors), size=extra)]
+    grown = picks + rng.normal(scale=noise, size=picks.shape).astype(np.float32)
+    faiss.normalize_L2(grown)
+    return np.concatenate([vectors, grown])
+
+
+def bench_search(args):
+    import faiss
+
+    import vector_index
+    from config import EXAMPLES_EF_SEARCH, EXAMPLES_NPROBE
+    from examples import conversation_corpus
+
+    if args.search_threads:
+        faiss.omp_set_num_threads(args.search_threads)
+    rng = np.random.default_rng(args.seed)
+    corpus = conversation_corpus.get()
+    base = vector_index.vectors_from_index(corpus.index)
+    index_types = args.index_types or [None]
+
+    rows = []
+    for scale in args.scales:
+        vectors = _grown(base, scale, args.noise, rng)
+        queries = base[rng.integers(0, len(base), size=args.queries)]
+        queries = queries + rng.normal(scale=args.noise, size=queries.shape).astype(np.float32)
+        faiss.normalize_L2(queries)  # unit length like real embeddings and the grown corpus
+        for index_type in index_types:
+            if index_type is None and scale == 1:
+                # The serving index as loaded, e.g. memory-mapped
+                index, label, build_seconds = corpus.index, "serving", None
+            else:
+                label = index_type or "flat"
+                start = time.perf_counter()
+                index = vector_index.build_index(vectors, label, corpus.metric)
+                build_seconds = round(time.perf_counter() - start, 3)
+                vector_index.configure_search(index, nprobe=EXAMPLES_NPROBE, ef_search=EXAMPLES_EF_SEARCH)
+            for k in args.k:
+                next_query = iter(np.resize(np.arange(len(queries)), args.queries + args.warmup))
+                with RssSampler(os.getpid()) as rss:
+                    latencies = _timed(
+                        lambda: vector_index.search(index, queries[next(next_query)], k),
+                        args.queries, args.warmup,
+                    )
+                rss_mb = _current_rss_mb()
+                row = {
+                    "index_type": label,
+                    "metric": corpus.metric,
+                    "scale": scale,
+                    "vectors": int(index.ntotal),
+                    "k": k,
+                    "build_seconds": build_seconds,
+                    "index_mb": round(len(faiss.serialize_index(index)) / 1e6, 2),
+                    **_summary(latencies),
+                    "rss_mb": rss_mb,
+                    "peak_rss_mb": rss.peak_mb(),
+                }
+                rows.append(row)
+                print(json.dumps(row))
+    return rows
+
+
+# ==== Report ====
+
+# Columns identifying a row and the metrics --compare reports the change of
+KEYS = {
+    "classifier": ("backend", "threads", "interop_threads", "batch_size", "seq_len"),
+    "search": ("index_type", "scale", "k"),
+}
+METRICS = ("calls_per_s", "latency_ms_p95", "peak_rss_mb")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Micro-benchmark classifier inference and vector search")
+    parser.add_argument("--repeats", type=int, default=50, help="measured calls per row (classifier)")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured calls before each row")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    parser.add_argument("--compare", help="earlier report of the same benchmark to compare against")
+    benchmarks = parser.add_subparsers(dest="benchmark", required=True)
+
+    classifier = benchmarks.add_parser("classifier", help="logits function of the categorize classifier")
+    classifier.add_argument("--backend", default="torch", help="torch, onnx or onnx-int8")
+    classifier.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    classifier.add_argument("--seq-lengths", type=int, nargs="+", default=[32, 64, 128, 256])
+    classifier.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    classifier.add_argument("--interop-threads", type=int, default=0, help="torch inter-op pool size")
+
+    search = benchmarks.add_parser("search", help="FAISS search over the conversation corpus")
+    search.add_argument("--k", type=int, nargs="+", default=[1, 5, 20])
+    search.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100],
+                        help="corpus size as a multiple of the serving corpus")
+    search.add_argument("--index-types", nargs="+", help="rebuild as these types; default the serving index, or flat when scaled")
+    search.add_argument("--queries", type=int, default=200, help="measured searches per row")
+    search.add_argument("--noise", type=float, default=0.02, help="per-dimension noise for queries/synthetic rows")
+    search.add_argument("--search-threads", type=int, default=0, help="FAISS OpenMP threads")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    rows = bench_classifier(args) if args.benchmark == "classifier" else bench_search(args)
+    report = {
+        "benchmark": args.benchmark,
+        "commit": _git_commit(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": rows,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(report, args.compare, KEYS[report["benchmark"]], METRICS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Recall@k, latency and memory of each FAISS index type against exact search.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_index_types --k 1 5 10 --output index_report.json
+    python -m benchmarks.bench_index_types --synthetic 50000   # extrapolate
+
+Vectors come from the serving corpus (which must be a flat index, the
+default). ``--synthetic N`` appends N perturbed copies of corpus vectors to
+see how the index types behave on a larger corpus. Queries are corpus
+vectors with noise added, normalized like real embeddings; the ground truth
+is exact flat L2 search.
+"""
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+import vector_index
+from config import EXAMPLES_EF_SEARCH, EXAMPLES_NPROBE
+from examples import conversation_corpus
+
+
+def perturbed(vectors, n, noise, rng):
+    picks = vectors[rng.integers(0, len(vectors), size=n)]
+    out = picks + rng.normal(scale=noise, size=picks.shape).astype(np.float32)
+    faiss.normalize_L2(out)
+    return out
+
+
+def recall_at_k(found, truth_distances, vectors, queries, k):
+    """Share of the top-k results that are no farther than the true k-th neighbour.
+
+    Comparing distances rather than ids keeps duplicate transcripts (exact
+    ties) from counting as misses.
+    """
+    scores = []
+    for ids, true_d, query in zip(found, truth_distances, queries):
+        ids = [i for i in ids[:k] if i >= 0]
+        d = ((vectors[ids] - query) ** 2).sum(axis=1)
+        scores.append(float((d <= true_d[k - 1] + 1e-4).sum()) / k)
+    return round(float(np.mean(scores)), 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare FAISS index types")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--synthetic", type=int, default=0, help="extra synthetic vectors to add")
+    parser.add_argument("--noise", type=float, default=0.02, help="per-dimension noise for queries/synthetic rows")
+    parser.add_argument("--nprobe", type=int, default=EXAMPLES_NPROBE)
+    parser.add_argument("--ef-search", type=int, default=EXAMPLES_EF_SEARCH)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = vector_index.vectors_from_index(conversation_corpus.get().index)
+    if args.synthetic:
+        vectors = np.concatenate([vectors, perturbed(vectors, args.synthetic, args.noise, rng)])
+    queries = perturbed(vectors, args.queries, args.noise, rng)
+    max_k = max(args.k)
+
+    exact = vector_index.build_index(vectors, "flat", "l2")
+    truth_distances, _ = exact.search(queries, max_k)
+
+    report = {"vectors": len(vectors), "dim": vectors.shape[1], "queries": len(queries), "results": []}
+    for metric in vector_index.METRICS:
+        for index_type in vector_index.INDEX_TYPES:
+            start = time.perf_counter()
+            index = vector_index.build_index(vectors, index_type, metric)
+            build_seconds = time.perf_counter() - start
+            vector_index.configure_search(index, nprobe=args.nprobe, ef_search=args.ef_search)
+
+            latencies, found = [], []
+            for query in queries:
+                start = time.perf_counter()
+                _, ids = vector_index.search(index, query, max_k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                found.append(ids[0].tolist())
+
+            row = {
+                "index_type": index_type,
+                "metric": metric,
+                "build_seconds": round(build_seconds, 3),
+                "memory_mb": round(len(faiss.serialize_index(index)) / 1e6, 3),
+                "latency_ms_p50": round(float(np.percentile(latencies, 50)), 4),
+                "latency_ms_p99": round(float(np.percentile(latencies, 99)), 4),
+                **{f"recall@{k}": recall_at_k(found, truth_distances, vectors, queries, k) for k in args.k},
+            }
+            report["results"].append(row)
+            print(json.dumps(row))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
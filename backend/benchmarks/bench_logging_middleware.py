@@ -0,0 +1,199 @@
+"""Cost of the request-logging middleware: the old BaseHTTPMiddleware vs pure ASGI.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_logging_middleware --requests 500 --large-kb 1024
+    python -m benchmarks.bench_logging_middleware --output middleware_report.json
+
+The app is called directly through ASGI, so time to first byte is measured
+at the ``send`` of the first body chunk, as a client would see it. Three
+routes are exercised: a small JSON echo, a large JSON response and a
+streamed response whose chunks are produced with a delay. Log records go to
+a counter instead of the database; bench_logging_overhead covers the
+database side.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_logs.sqlite"
+
+from fastapi import Body, FastAPI  # noqa: E402
+from fastapi.responses import StreamingResponse  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+import logging_middleware  # noqa: E402
+from logging_middleware import EXCLUDED_PATHS, MAX_BODY_LENGTH  # noqa: E402
+
+MODES = ("none", "base_http", "asgi")
+
+
+class CountingWriter:
+    def __init__(self):
+        self.records = 0
+
+    def submit(self, record):
+        self.records += 1
+        return True
+
+
+class OldDBLoggingMiddleware(BaseHTTPMiddleware):
+    """The previous middleware: buffers both bodies and re-prints them as JSON."""
+
+    async def dispatch(self, request: Request, call_next):
+        if request.url.path in EXCLUDED_PATHS:
+            return await call_next(request)
+
+        body_bytes = await request.body()
+        try:
+            body_text = body_bytes.decode('utf-8')
+            body_json = json.loads(body_text)
+            body_text = json.dumps(body_json, indent=2)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            body_text = body_bytes.decode('utf-8', errors='ignore')
+        if len(body_text) > MAX_BODY_LENGTH:
+            body_text = body_text[:MAX_BODY_LENGTH] + "... [TRUNCATED]"
+
+        response = await call_next(request)
+
+        response_body = b""
+        async for chunk in response.body_iterator:
+            response_body += chunk
+        response.body_iterator = _iterate_in_memory(response_body)
+
+        try:
+            response_text = response_body.decode('utf-8')
+            response_json = json.loads(response_text)
+            response_text = json.dumps(response_json, indent=2)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            response_text = response_body.decode('utf-8', errors='ignore')
+        if len(response_text) > MAX_BODY_LENGTH:
+            response_text = response_text[:MAX_BODY_LENGTH] + "... [TRUNCATED]"
+
+        logging_middleware.request_log_writer.submit({
+            "method": request.method,
+            "path": str(request.url.path),
+            "request_body": body_text,
+            "response_body": response_text,
+            "status_code": response.status_code,
+        })
+        return response
+
+
+async def _iterate_in_memory(data: bytes):
+    yield data
+
+
+def build_app(mode, large_kb, chunks, chunk_delay_ms):
+    app = FastAPI()
+    large = {"items": [{"id": i, "text": "lorem ipsum dolor sit amet " * 4} for i in range(large_kb * 8)]}
+
+    @app.post("/small")
+    async def small(payload: dict = Body(...)):
+        return {"received": payload}
+
+    @app.get("/large")
+    async def large_json():
+        return large
+
+    @app.get("/stream")
+    async def stream():
+        async def generate():
+            for i in range(chunks):
+                await asyncio.sleep(chunk_delay_ms / 1000)
+                yield f"data: chunk {i} {'x' * 200}\n\n".encode()
+        return StreamingResponse(generate(), media_type="text/event-stream")
+
+    if mode == "base_http":
+        app.add_middleware(OldDBLoggingMiddleware)
+    elif mode == "asgi":
+        app.add_middleware(logging_middleware.DBLoggingMiddleware)
+    return app
+
+
+async def call(app, method, path, body=b""):
+    """One request through ``app``; returns (ttfb_ms, total_ms, bytes received)."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "path": path, "raw_path": path.encode(), "root_path": "",
+        "scheme": "http", "query_string": b"", "server": ("bench", 80), "client": ("127.0.0.1", 1234),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    received = 0
+    first_byte = None
+    start = time.perf_counter()
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.Event().wait()  # no disconnect during the benchmark
+
+    async def send(message):
+        nonlocal received, first_byte
+        if message["type"] == "http.response.body":
+            if first_byte is None and message.get("body"):
+                first_byte = time.perf_counter()
+            received += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    end = time.perf_counter()
+    return (first_byte - start) * 1000, (end - start) * 1000, received
+
+
+async def _run_case(app, method, path, body, requests):
+    ttfb, total = [], []
+    for _ in range(requests):
+        first, elapsed, _ = await call(app, method, path, body)
+        ttfb.append(first)
+        total.append(elapsed)
+    return {
+        "ttfb_ms_p50": round(float(np.percentile(ttfb, 50)), 3),
+        "ttfb_ms_p99": round(float(np.percentile(ttfb, 99)), 3),
+        "total_ms_p50": round(float(np.percentile(total, 50)), 3),
+        "total_ms_p99": round(float(np.percentile(total, 99)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare logging middleware implementations")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--large-kb", type=int, default=512, help="approximate size of the large response")
+    parser.add_argument("--chunks", type=int, default=10, help="chunks in the streamed response")
+    parser.add_argument("--chunk-delay-ms", type=float, default=5.0)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    small_body = json.dumps({"history": [{"role": "user", "content": "How do I stop worrying? " * 20}]}).encode()
+    cases = [
+        ("small_json", "POST", "/small", small_body, args.requests),
+        ("large_json", "GET", "/large", b"", max(1, args.requests // 10)),
+        ("stream", "GET", "/stream", b"", max(1, args.requests // 10)),
+    ]
+    report = {"results": []}
+    for mode in args.modes:
+        writer = CountingWriter()
+        logging_middleware.request_log_writer = writer
+        app = build_app(mode, args.large_kb, args.chunks, args.chunk_delay_ms)
+        for case, method, path, body, requests in cases:
+            _, _, size = asyncio.run(call(app, method, path, body))
+            row = {"mode": mode, "case": case, "requests": requests, "response_bytes": size}
+            row.update(asyncio.run(_run_case(app, method, path, body, requests)))
+            report["results"].append(row)
+            print(json.dumps(row))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Per-request latency added by the request-logging middleware.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_logging_overhead --requests 2000 --concurrency 1 16
+    python -m benchmarks.bench_logging_overhead --db-latency-ms 2   # simulate a network DB
+
+Serves a small JSON echo route in-process (httpx ASGI transport) in three
+modes: no logging middleware, the middleware inserting each log inline as
+it used to, and the middleware handing logs to the background bulk writer.
+Uses DATABASE_URL if set, otherwise a throwaway SQLite file; every
+statement can be delayed by --db-latency-ms to stand in for a round trip
+to Postgres.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_logs.sqlite"
+
+import httpx  # noqa: E402
+from fastapi import Body, FastAPI  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+import logging_middleware  # noqa: E402
+from database import database, engine  # noqa: E402
+from log_writer import LogWriter, write_request_logs  # noqa: E402
+
+MODES = ("off", "inline", "queued")
+
+
+class InlineWriter:
+    """The old behaviour: one INSERT and COMMIT per request, on the event loop."""
+
+    def submit(self, record):
+        write_request_logs([record])
+        return True
+
+
+def build_app(mode):
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(payload: dict = Body(...)):
+        return {"received": payload}
+
+    if mode != "off":
+        app.add_middleware(logging_middleware.DBLoggingMiddleware)
+    return app
+
+
+async def _run(app, requests, concurrency):
+    payload = {"history": [{"role": "user", "content": "I can't sleep before exams. " * 20}]}
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one():
+            async with sem:
+                start = time.perf_counter()
+                response = await client.post("/echo", json=payload)
+                latencies.append((time.perf_counter() - start) * 1000)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+    return latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure request-logging overhead")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    database.get()
+    if args.db_latency_ms:
+        @event.listens_for(engine, "before_cursor_execute")
+        def _delay(*_):
+            time.sleep(args.db_latency_ms / 1000)
+
+    report = {"requests": args.requests, "db_latency_ms": args.db_latency_ms, "results": []}
+    for concurrency in args.concurrency:
+        for mode in args.modes:
+            writer = LogWriter(write_request_logs, name=f"bench-{mode}") if mode == "queued" else InlineWriter()
+            logging_middleware.request_log_writer = writer
+            latencies, elapsed = asyncio.run(_run(build_app(mode), args.requests, concurrency))
+            row = {
+                "mode": mode,
+                "concurrency": concurrency,
+                "requests_per_s": round(args.requests / elapsed, 1),
+                "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+                "latency_ms_p99": round(float(np.percentile(latencies, 99)), 3),
+            }
+            if mode == "queued":
+                start = time.perf_counter()
+                writer.close()
+                row["final_flush_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                row["writer"] = {k: writer.stats()[k] for k in ("written", "dropped", "failed", "avg_batch_size")}
+            report["results"].append(row)
+            print(json.dumps(row))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Cost of the request metrics middleware and of recording one observation.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_metrics_overhead --requests 5000 --concurrency 1 32
+    python -m benchmarks.bench_metrics_overhead --output metrics_overhead.json
+
+Serves a small JSON echo route with a path parameter in-process (httpx ASGI
+transport), with and without RequestMetricsMiddleware, and reports
+requests/s and latency percentiles. ``observe_ns`` and ``timer_ns`` are the
+per-call cost of Histogram.observe and of a ``with histogram.timer()``
+block, measured in a tight loop; ``render_ms`` is the time to render
+/metrics with every series the runs created.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+import numpy as np
+from fastapi import Body, FastAPI
+
+from metrics import Histogram, render_prometheus
+from request_metrics import RequestMetricsMiddleware
+
+MODES = ("off", "on")
+
+
+def build_app(mode):
+    app = FastAPI()
+
+    @app.post("/echo/{item_id}")
+    async def echo(item_id: str, payload: dict = Body(...)):
+        return {"item_id": item_id, "received": payload}
+
+    if mode == "on":
+        app.add_middleware(RequestMetricsMiddleware)
+    return app
+
+
+async def _run(app, requests, concurrency):
+    payload = {"message": "I can't sleep before exams."}
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+
+        async def one(i):
+            async with sem:
+                start = time.perf_counter()
+                response = await client.post(f"/echo/{i % 100}", json=payload)
+                latencies.append((time.perf_counter() - start) * 1000)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+    return latencies, elapsed
+
+
+def _per_call_ns(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return round((time.perf_counter() - start) / calls * 1e9, 1)
+
+
+def micro(calls):
+    histogram = Histogram("bench_observe_seconds", "Benchmark only", labelnames=("stage",))
+
+    def timed():
+        with histogram.timer(stage="bench"):
+            pass
+
+    return {
+        "observe_ns": _per_call_ns(lambda: histogram.observe(0.003, stage="bench"), calls),
+        "timer_ns": _per_call_ns(timed, calls),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure request metrics overhead")
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 32])
+    parser.add_argument("--calls", type=int, default=200000, help="iterations of the per-call measurements")
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = {"requests": args.requests, "results": []}
+    for concurrency in args.concurrency:
+        for mode in MODES:
+            latencies, elapsed = asyncio.run(_run(build_app(mode), args.requests, concurrency))
+            row = {
+                "metrics": mode,
+                "concurrency": concurrency,
+                "requests_per_s": round(args.requests / elapsed, 1),
+                "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+                "latency_ms_p99": round(float(np.percentile(latencies, 99)), 3),
+            }
+            report["results"].append(row)
+            print(json.dumps(row))
+
+    report["per_call"] = micro(args.calls)
+    start = time.perf_counter()
+    render_prometheus()
+    report["per_call"]["render_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    print(json.dumps(report["per_call"]))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
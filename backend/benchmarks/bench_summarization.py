@@ -0,0 +1,125 @@
+"""Wall-clock time of single-call vs map-reduce transcript summarization.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_summarization --words 8000 32000 64000
+    python -m benchmarks.bench_summarization --concurrency 1 4 8 --output summarization.json
+
+Starts benchmarks.mock_openai with latency proportional to prompt and
+completion size (``--prompt-ms-per-token``, ``--completion-ms-per-token``,
+defaults roughly those of a hosted small model), builds synthetic
+Counselor/Client transcripts of each length in words and times
+``summarize_single`` against ``summarize_chunked`` at each map concurrency.
+The mock counts words as tokens; chunking uses the real tokenizer.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+
+from benchmarks.mock_openai import start_in_background
+
+SENTENCES = {
+    "Counselor": [
+        "How have you been since our last session?",
+        "What do you notice in your body when that happens?",
+        "That sounds exhausting, and it makes sense you feel that way.",
+        "Let's try to slow down and look at that thought together.",
+        "What would you say to a friend in the same situation?",
+        "Could we plan one small step for this week?",
+    ],
+    "Client": [
+        "I have been sleeping badly and waking up around four every night.",
+        "Work has been overwhelming and my manager keeps adding deadlines.",
+        "I keep thinking that I am going to fail and everyone will notice.",
+        "My sister called and we argued about our parents again.",
+        "I tried the breathing exercise twice and it helped a little.",
+        "Sometimes I just want to stay home and not talk to anyone.",
+    ],
+}
+
+
+def make_transcript(words, rng):
+    turns, total = [], 0
+    while total < words:
+        speaker = "Counselor" if len(turns) % 2 == 0 else "Client"
+        text = " ".join(rng.choice(SENTENCES[speaker], size=int(rng.integers(1, 4))))
+        turns.append(f"{speaker}: {text}")
+        total += len(text.split()) + 1
+    return "\n".join(turns)
+
+
+async def _time(coro_fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await coro_fn()
+        times.append(time.perf_counter() - start)
+    return round(float(np.median(times)), 3)
+
+
+async def run(args):
+    from summarization import SUMMARY_CHUNK_TOKENS, chunk_transcript, summarize_chunked, summarize_single
+
+    args.chunk_tokens = args.chunk_tokens or SUMMARY_CHUNK_TOKENS
+    rng = np.random.default_rng(args.seed)
+    report = {"chunk_tokens": args.chunk_tokens, "results": []}
+    for words in args.words:
+        transcript = make_transcript(words, rng)
+        chunks = len(chunk_transcript(transcript, args.chunk_tokens))
+        rows = [{"mode": "single", "concurrency": 1,
+                 "seconds": await _time(lambda: summarize_single(transcript), args.repeats)}]
+        for concurrency in args.concurrency:
+            seconds = await _time(
+                lambda: summarize_chunked(transcript, chunk_tokens=args.chunk_tokens, concurrency=concurrency),
+                args.repeats,
+            )
+            rows.append({"mode": "chunked", "concurrency": concurrency, "seconds": seconds})
+        for row in rows:
+            row = {"transcript_words": words, "chunks": chunks, **row,
+                   "speedup": round(rows[0]["seconds"] / row["seconds"], 2)}
+            report["results"].append(row)
+            print(json.dumps(row))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark map-reduce summarization against a mock LLM")
+    parser.add_argument("--words", type=int, nargs="+", default=[8000, 32000, 64000, 96000])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--chunk-tokens", type=int, default=0, help="default SUMMARY_CHUNK_TOKENS")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="fixed per-call overhead")
+    parser.add_argument("--prompt-ms-per-token", type=float, default=0.05)
+    parser.add_argument("--completion-ms-per-token", type=float, default=10.0)
+    parser.add_argument("--completion-tokens", type=int, default=800, help="reply length before max_tokens")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    # Must happen before config.py is imported
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "mock-key")
+    server = start_in_background(
+        args.port,
+        latency_ms=args.latency_ms,
+        prompt_ms_per_token=args.prompt_ms_per_token,
+        completion_ms_per_token=args.completion_ms_per_token,
+        completion_tokens=args.completion_tokens,
+    )
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        server.should_exit = True
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
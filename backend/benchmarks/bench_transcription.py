@@ -0,0 +1,165 @@
+"""Transcription wall-clock time and upload memory for /api/summarization/audio.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_transcription --minutes 10 30 60 --concurrency 1 4 8
+    python -m benchmarks.bench_transcription --latency-s 1 --realtime-factor 0.05 --output transcription.json
+
+Synthesizes recordings with transcribers.synthesize_speech and transcribes
+them with the local SyntheticTranscriber, whose response time is
+``--latency-s`` plus ``--realtime-factor`` seconds per second of audio. Each
+recording is transcribed whole (one call, as before) and in overlapping
+segments at each concurrency; ``word_accuracy`` is the share of spoken words
+found in order in the stitched transcript, which checks that overlaps are
+neither dropped nor repeated. A refrain row (the vocabulary spoken 20
+times, cut into 30 s segments with 3 s overlaps) is a regression check for
+stitching repeated speech: the run fails if its accuracy is below
+``--min-refrain-accuracy``. The upload rows send each recording as a
+multipart body in 64 KB network chunks and compare Starlette's form parsing
+(the whole body spooled, then copied to disk, as ``UploadFile`` parameters
+did) against uploads.receive_upload writing it as it arrives: peak Python
+memory, and how much of the body is read before a 413 when the limit is
+half the file.
+"""
+import argparse
+import asyncio
+import difflib
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from config import AUDIO_SEGMENT_OVERLAP_SECONDS, AUDIO_SEGMENT_SECONDS
+from uploads import receive_upload
+from transcribers import WORD_SECONDS, VOCABULARY, SyntheticTranscriber, synthesize_speech, transcribe_long
+
+
+def word_accuracy(reference, transcript):
+    matcher = difflib.SequenceMatcher(None, reference, transcript.split(), autojunk=False)
+    return sum(block.size for block in matcher.get_matching_blocks()) / len(reference)
+
+
+NETWORK_CHUNK_BYTES = 64 * 1024
+BOUNDARY = "bench-boundary"
+
+
+def _multipart_request(path, received):
+    """A Request whose body is ``path`` as form field ``audio``, arriving in network-sized chunks."""
+    head = (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="audio"; '
+            f'filename="{os.path.basename(path)}"\r\nContent-Type: audio/wav\r\n\r\n').encode()
+    tail = f"\r\n--{BOUNDARY}--\r\n".encode()
+    f = open(path, "rb")
+
+    async def receive():
+        chunk = head if received[0] == 0 else f.read(NETWORK_CHUNK_BYTES)
+        body = chunk or tail
+        received[0] += len(body)
+        return {"type": "http.request", "body": body, "more_body": bool(chunk)}
+
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": headers}, receive), f
+
+
+async def _upload(path, streamed, max_mb=1e9):
+    """Peak Python memory in MB and bytes of the body read, for one upload."""
+    received = [0]
+    request, source = _multipart_request(path, received)
+    with source, tempfile.TemporaryFile() as out:
+        tracemalloc.start()
+        try:
+            if streamed:
+                await receive_upload(request, "audio", max_mb, lambda filename: out)
+            else:
+                form = await request.form()
+                upload = form["audio"]
+                if upload.size > max_mb * 2 ** 20:
+                    raise HTTPException(status_code=413)
+                while chunk := await upload.read(2 ** 20):
+                    out.write(chunk)
+                await form.close()
+        except HTTPException as e:
+            assert e.status_code == 413
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return round(peak / 2 ** 20, 1), received[0]
+
+
+async def refrain_accuracy(folder, segment_s=30.0, overlap_s=3.0):
+    """Word accuracy of segmented transcription when the same passage repeats."""
+    words = list(VOCABULARY) * 20
+    path = os.path.join(folder, "refrain.wav")
+    synthesize_speech(words, path)
+    text = await transcribe_long(SyntheticTranscriber(), path, segment_s, overlap_s, 4)
+    os.remove(path)
+    return round(word_accuracy(words, text), 4)
+
+
+async def run(args, folder):
+    rng = np.random.default_rng(args.seed)
+    transcriber = SyntheticTranscriber(latency_s=args.latency_s, seconds_per_audio_second=args.realtime_factor)
+    report = {"segment_s": args.segment_s, "overlap_s": args.overlap_s, "results": [], "upload": []}
+
+    report["refrain_word_accuracy"] = await refrain_accuracy(folder)
+    print(json.dumps({"mode": "refrain", "word_accuracy": report["refrain_word_accuracy"]}))
+
+    for minutes in args.minutes:
+        words = list(rng.choice(VOCABULARY, size=int(minutes * 60 / WORD_SECONDS)))
+        path = os.path.join(folder, f"session-{minutes}.wav")
+        synthesize_speech(words, path)
+        size_mb = round(os.path.getsize(path) / 2 ** 20, 1)
+
+        start = time.perf_counter()
+        text = await transcriber.transcribe(path)
+        rows = [{"mode": "whole", "concurrency": 1, "seconds": time.perf_counter() - start,
+                 "word_accuracy": word_accuracy(words, text)}]
+        for concurrency in args.concurrency:
+            start = time.perf_counter()
+            text = await transcribe_long(transcriber, path, args.segment_s, args.overlap_s, concurrency)
+            rows.append({"mode": "segmented", "concurrency": concurrency, "seconds": time.perf_counter() - start,
+                         "word_accuracy": word_accuracy(words, text)})
+        for row in rows:
+            row = {"minutes": minutes, "file_mb": size_mb, **row,
+                   "seconds": round(row["seconds"], 2), "word_accuracy": round(row["word_accuracy"], 4)}
+            report["results"].append(row)
+            print(json.dumps(row))
+
+        for streamed in (False, True):
+            peak_mb, _ = await _upload(path, streamed)
+            _, read_before_413 = await _upload(path, streamed, max_mb=size_mb / 2)
+            row = {"minutes": minutes, "file_mb": size_mb, "upload": "streamed" if streamed else "form",
+                   "peak_mb": peak_mb, "mb_read_before_413": round(read_before_413 / 2 ** 20, 1)}
+            report["upload"].append(row)
+            print(json.dumps(row))
+        os.remove(path)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark segmented transcription with a local stand-in")
+    parser.add_argument("--minutes", type=float, nargs="+", default=[10, 30, 60])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--segment-s", type=float, default=AUDIO_SEGMENT_SECONDS)
+    parser.add_argument("--overlap-s", type=float, default=AUDIO_SEGMENT_OVERLAP_SECONDS)
+    parser.add_argument("--latency-s", type=float, default=0.5, help="per transcription call")
+    parser.add_argument("--realtime-factor", type=float, default=0.05, help="seconds per second of audio")
+    parser.add_argument("--min-refrain-accuracy", type=float, default=0.99)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench-transcription-") as folder:
+        report = asyncio.run(run(args, folder))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if report["refrain_word_accuracy"] < args.min_refrain_accuracy:
+        raise SystemExit(f"Refrain word accuracy {report['refrain_word_accuracy']} is below {args.min_refrain_accuracy}")
+
+
+if __name__ == "__main__":
+    main()
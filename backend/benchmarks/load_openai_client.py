@@ -0,0 +1,129 @@
+"""Concurrent /api/advice throughput with a blocking vs the shared async OpenAI client.
+
+Run from the backend directory:
+
+    python -m benchmarks.load_openai_client --concurrency 1 8 32 --latency-ms 300
+    python -m benchmarks.load_openai_client --error-rate 0.05 --output openai_load.json
+
+Starts benchmarks.mock_openai on a local port and serves /api/advice
+in-process twice: as it used to be written (a synchronous ``OpenAI`` client
+called from the ``async def`` handler, blocking the event loop for every
+completion) and with the real router on the shared ``AsyncOpenAI`` client.
+Reports requests/second and p50/p99 latency per concurrency level.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+
+from benchmarks.mock_openai import start_in_background
+
+MODES = ("blocking", "async")
+
+
+def _configure_env(port):
+    # Must happen before config.py is imported
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "mock-key")
+
+
+def build_app(mode):
+    from fastapi import FastAPI, Form
+    from fastapi.responses import HTMLResponse
+
+    app = FastAPI()
+    if mode == "async":
+        from advice import router
+        app.include_router(router, prefix="/api")
+        return app
+
+    import markdown
+    from openai import OpenAI
+    from advice import SYSTEM_PROMPT
+
+    client = OpenAI(base_url=os.environ["OPENAI_BASE_URL"], api_key=os.environ["OPENAI_API_KEY"])
+
+    @app.post("/api/advice", response_class=HTMLResponse)
+    async def blocking_advice(problem: str = Form(...)):
+        rsp = client.chat.completions.create(
+            model="gpt-4o-mini",
+            temperature=0.6,
+            max_tokens=700,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": problem.strip()},
+            ],
+        )
+        return HTMLResponse(content=markdown.markdown(rsp.choices[0].message.content))
+
+    return app
+
+
+async def _run_level(app, concurrency, requests):
+    import httpx
+
+    sem = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+
+        async def one(i):
+            nonlocal failures
+            async with sem:
+                start = time.perf_counter()
+                response = await client.post("/api/advice", data={"problem": f"Client {i} can't sleep before exams."})
+                latencies.append((time.perf_counter() - start) * 1000)
+                failures += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "failures": failures,
+        "requests_per_s": round(requests / elapsed, 2),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 1),
+        "latency_ms_p99": round(float(np.percentile(latencies, 99)), 1),
+    }
+
+
+async def run(args):
+    report = {"latency_ms": args.latency_ms, "error_rate": args.error_rate, "results": []}
+    for mode in args.modes:
+        app = build_app(mode)
+        for concurrency in args.concurrency:
+            row = {"mode": mode, **await _run_level(app, concurrency, args.requests_per_level or 4 * concurrency)}
+            report["results"].append(row)
+            print(json.dumps(row))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the OpenAI client against a mock server")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests-per-level", type=int, default=0, help="default 4x concurrency")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    _configure_env(args.port)
+    server = start_in_background(args.port, latency_ms=args.latency_ms, error_rate=args.error_rate)
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        server.should_exit = True
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""End-to-end HTTP load test of the API against a local OpenAI stand-in.
+
+Run from the backend directory:
+
+    python -m benchmarks.load_test --endpoints chat chat_stream advice examples --concurrency 1 8 32
+    python -m benchmarks.load_test --requests 500 --error-rate 0.02 --output before.json
+    python -m benchmarks.load_test --output after.json --compare before.json
+
+Starts benchmarks.mock_openai (``--latency-ms``, ``--token-delay-ms``,
+``--error-rate``) and the app itself under uvicorn in a subprocess. The app
+is pointed at the mock, a fresh SQLite database (or ``--database-url``, e.g.
+a local Postgres) and a fixture corpus of ``--corpus-size`` synthetic
+transcripts with random embeddings, all in a temporary folder;
+``--env NAME=VALUE`` passes further settings (CLASSIFIER_BACKEND=onnx, ...).
+/api/categorize needs the classifier weights in model_weights/.
+
+Each endpoint is driven by closed-loop clients at each concurrency level,
+every request with different text so caches don't answer in the model's
+place. ``summarize_job`` is timed from submission until the job is done.
+Each row has throughput, p50/p95/p99 latency (plus time to first byte for
+the streamed chat), errors and the server's peak RSS during the run; the
+report also records the commit and settings. ``--compare`` prints the
+change in throughput and p95 against an earlier report.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.bench_summarization import make_transcript
+from benchmarks.mock_openai import start_in_background
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIM = 1536  # what the mock's embeddings endpoint returns
+
+PROBLEMS = [
+    "My client can't sleep before exams and feels their heart racing",
+    "A client says they argue with their partner every evening about money",
+    "The client has lost interest in hobbies since moving to a new city",
+    "My client is anxious about speaking up in meetings at work",
+    "A teenager tells me they feel left out by their friends online",
+]
+
+
+# ==== Requests ====
+
+def _problem(i):
+    return f"{PROBLEMS[i % len(PROBLEMS)]} (case {i})"
+
+
+def _history(i):
+    return [
+        {"role": "user", "sender": "user", "content": _problem(i)},
+        {"role": "assistant", "sender": "ai", "content": "What have they tried so far?"},
+    ]
+
+
+def _requests(transcripts):
+    """Endpoint name -> function building the httpx request arguments of request ``i``."""
+    return {
+        "categorize": lambda i: ("POST", "/api/categorize", {"json": {"question": _problem(i)}}),
+        "advice": lambda i: ("POST", "/api/advice", {"data": {"problem": _problem(i)}}),
+        "examples": lambda i: ("POST", "/api/examples", {"json": {"history": _history(i), "k": 3}}),
+        "chat": lambda i: ("POST", "/api/chat", {"json": {
+            "message": _problem(i), "category": "anxiety", "history": _history(i + 1)}}),
+        "chat_stream": lambda i: ("POST", "/api/chat/stream", {"json": {
+            "message": _problem(i), "category": "anxiety", "history": _history(i + 1)}}),
+        "summarize": lambda i: ("POST", "/api/summarization/text", {"json": {
+            "text": f"{transcripts[i % len(transcripts)]}\nCounselor: Session {i}."}}),
+        "summarize_job": lambda i: ("POST", "/api/summarization/jobs/text", {"json": {
+            "text": f"{transcripts[i % len(transcripts)]}\nCounselor: Session {i}."}}),
+    }
+
+
+ENDPOINTS = ("categorize", "advice", "examples", "chat", "chat_stream", "summarize", "summarize_job")
+
+
+async def _send(client, endpoint, method, path, kwargs, poll_s):
+    """(ok, seconds, seconds to first byte or None) of one request."""
+    start = time.perf_counter()
+    if endpoint == "chat_stream":
+        ttfb = None
+        async with client.stream(method, path, **kwargs) as response:
+            async for line in response.aiter_lines():
+                if ttfb is None and line.startswith("event: token"):
+                    ttfb = time.perf_counter() - start
+                if line.startswith("event: error"):
+                    return False, time.perf_counter() - start, ttfb
+        return response.status_code == 200, time.perf_counter() - start, ttfb
+
+    response = await client.request(method, path, **kwargs)
+    if endpoint == "summarize_job" and response.status_code == 202:
+        status_url = response.json()["status_url"]
+        while True:
+            await asyncio.sleep(poll_s)
+            status = (await client.get(status_url)).json()["status"]
+            if status in ("done", "failed"):
+                return status == "done", time.perf_counter() - start, None
+    return response.is_success, time.perf_counter() - start, None
+
+
+async def _drive(base_url, endpoint, build, concurrency, requests, warmup, offset, poll_s, timeout_s):
+    limits = httpx.Limits(max_connections=concurrency + 4, max_keepalive_connections=concurrency + 4)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout_s, limits=limits) as client:
+        for i in range(warmup):
+            method, path, kwargs = build(offset + i)
+            await _send(client, endpoint, method, path, kwargs, poll_s)
+
+        latencies, ttfbs, errors = [], [], 0
+        next_request = iter(range(offset + warmup, offset + warmup + requests))
+
+        async def worker():
+            nonlocal errors
+            for i in next_request:
+                method, path, kwargs = build(i)
+                try:
+                    ok, seconds, ttfb = await _send(client, endpoint, method, path, kwargs, poll_s)
+                except httpx.HTTPError:
+                    ok, seconds, ttfb = False, None, None
+                if ok:
+                    latencies.append(seconds)
+                    if ttfb is not None:
+                        ttfbs.append(ttfb)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return latencies, ttfbs, errors, elapsed
+
+
+def _percentiles(values, prefix):
+    if not values:
+        return {f"{prefix}_p{q}": None for q in (50, 95, 99)}
+    ms = np.asarray(values) * 1000
+    return {f"{prefix}_p{q}": round(float(np.percentile(ms, q)), 2) for q in (50, 95, 99)}
+
+
+# ==== Server process ====
+
+class RssSampler:
+    """Peak resident memory of a process, sampled from /proc every ``interval_s``."""
+
+    def __init__(self, pid, interval_s=0.05):
+        self.pid = pid
+        self.interval_s = interval_s
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _status_kb(self, field):
+        try:
+            with open(f"/proc/{self.pid}/status", encoding="ascii") as f:
+                for line in f:
+                    if line.startswith(field + ":"):
+                        return int(line.split()[1])
+        except OSError:
+            return None
+        return None
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.peak_kb = max(self.peak_kb, self._status_kb("VmRSS") or 0)
+
+    def __enter__(self):
+        self.peak_kb = self._status_kb("VmRSS") or 0
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_kb = max(self.peak_kb, self._status_kb("VmRSS") or 0)
+
+    def peak_mb(self):
+        return round(self.peak_kb / 1024, 1) if self.peak_kb else None
+
+    def lifetime_peak_mb(self):
+        hwm = self._status_kb("VmHWM")
+        return round(hwm / 1024, 1) if hwm else None
+
+
+def build_corpus(folder, size, rng, transcript_words):
+    """A flat cosine index over random unit vectors plus the matching transcript store and meta."""
+    import vector_index
+    from embedding_providers import new_corpus_build, publish_corpus
+    from transcript_store import write_store
+
+    version, (index_file, meta_file, store_file) = new_corpus_build("openai", folder)
+    vectors = rng.normal(size=(size, EMBEDDING_DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    vector_index.write_index(vector_index.build_index(vectors, index_type="flat", metric="cosine"), index_file)
+    entries = [{"id": f"fixture-{i}", "quality": "high" if i % 2 == 0 else "low"} for i in range(size)]
+    write_store(store_file, entries, [make_transcript(transcript_words, rng) for _ in range(size)])
+    with open(meta_file, "w", encoding="utf-8") as f:
+        json.dump({"model": EMBEDDING_MODEL, "index_type": "flat", "metric": "cosine",
+                   "dim": EMBEDDING_DIM, "count": size}, f)
+    publish_corpus("openai", version, folder)
+
+
+def start_server(args, workdir):
+    env = dict(
+        os.environ,
+        OPENAI_BASE_URL=f"http://127.0.0.1:{args.mock_port}/v1",
+        OPENAI_API_KEY="mock-key",
+        DATABASE_URL=args.database_url or f"sqlite:///{os.path.join(workdir, 'load_test.sqlite')}",
+        EMBEDDING_PROVIDER="openai",
+        EXAMPLES_CORPUS_DIR=os.path.join(workdir, "corpus"),
+        EMBEDDING_CACHE_PATH=os.path.join(workdir, "embeddings.sqlite"),
+        SUMMARY_JOB_UPLOAD_DIR=os.path.join(workdir, "job_uploads"),
+        LOG_LEVEL="WARNING",
+    )
+    for item in args.env:
+        name, _, value = item.partition("=")
+        env[name] = value
+    log = open(os.path.join(workdir, "server.log"), "w", encoding="utf-8")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+def wait_until_ready(base_url, server, timeout_s):
+    """The /ready body once warm-up has finished (or failed), polling until ``timeout_s``."""
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"The server exited with code {server.returncode}; see server.log")
+        try:
+            body = httpx.get(f"{base_url}/ready", timeout=5).json()
+            if body["status"] != "loading":
+                return body
+        except (httpx.HTTPError, ValueError):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"The server wasn't ready after {timeout_s}s")
+
+
+# ==== Report ====
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline_path, keys=("endpoint", "concurrency"),
+            metrics=("requests_per_s", "latency_ms_p95", "peak_rss_mb")):
+    """Print the change in ``metrics`` for each result row also in the baseline, matched on ``keys``."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {tuple(row.get(key) for key in keys): row for row in json.load(f)["results"]}
+    for row in report["results"]:
+        before = baseline.get(tuple(row.get(key) for key in keys))
+        if before is None:
+            continue
+        delta = {key: row.get(key) for key in keys}
+        for key in metrics:
+            if before.get(key) and row.get(key) is not None:
+                delta[f"{key}_change"] = f"{(row[key] / before[key] - 1) * 100:+.1f}%"
+        print(json.dumps(delta))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load-test the API end to end against a mock OpenAI")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="per endpoint and concurrency level")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests before each run")
+    parser.add_argument("--timeout-s", type=float, default=120.0, help="per request")
+
+    mock = parser.add_argument_group("mock OpenAI")
+    mock.add_argument("--latency-ms", type=float, default=300.0)
+    mock.add_argument("--token-delay-ms", type=float, default=20.0, help="between streamed tokens")
+    mock.add_argument("--error-rate", type=float, default=0.0)
+    mock.add_argument("--mock-port", type=int, default=8201)
+
+    server = parser.add_argument_group("server")
+    server.add_argument("--port", type=int, default=8200)
+    server.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    server.add_argument("--database-url", help="default: a fresh SQLite file")
+    server.add_argument("--corpus-size", type=int, default=2000, help="transcripts in the fixture index")
+    server.add_argument("--transcript-words", type=int, default=1500)
+    server.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="extra setting for the server; repeatable")
+    server.add_argument("--ready-timeout-s", type=float, default=300.0)
+    server.add_argument("--seed", type=int, default=0)
+
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    parser.add_argument("--compare", help="earlier report to compare against")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    base_url = f"http://127.0.0.1:{args.port}"
+    rng = np.random.default_rng(args.seed)
+    transcripts = [make_transcript(args.transcript_words, rng) for _ in range(20)]
+    builders = _requests(transcripts)
+
+    mock = start_in_background(
+        args.mock_port, latency_ms=args.latency_ms, token_delay_ms=args.token_delay_ms,
+        error_rate=args.error_rate, embedding_dim=EMBEDDING_DIM,
+    )
+    report = {
+        "commit": _git_commit(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="load-test-") as workdir:
+        build_corpus(os.path.join(workdir, "corpus"), args.corpus_size, rng, args.transcript_words)
+        server = start_server(args, workdir)
+        try:
+            ready = wait_until_ready(base_url, server, args.ready_timeout_s)
+            report["ready"] = ready["status"]
+            report["startup"] = ready.get("startup")
+            if ready["status"] != "ready":
+                failed = [name for name, r in ready["resources"].items() if r["state"] == "failed"]
+                print(f"Warm-up failed for {', '.join(failed)}; their endpoints will report errors")
+
+            offset = 0
+            for endpoint in args.endpoints:
+                for concurrency in args.concurrency:
+                    # With several workers this samples the parent process only
+                    with RssSampler(server.pid) as rss:
+                        latencies, ttfbs, errors, elapsed = asyncio.run(_drive(
+                            base_url, endpoint, builders[endpoint], concurrency, args.requests,
+                            args.warmup, offset, poll_s=0.05, timeout_s=args.timeout_s,
+                        ))
+                    offset += args.requests + args.warmup
+                    row = {
+                        "endpoint": endpoint,
+                        "concurrency": concurrency,
+                        "requests": args.requests,
+                        "errors": errors,
+                        "requests_per_s": round(len(latencies) / elapsed, 2),
+                        **_percentiles(latencies, "latency_ms"),
+                        "peak_rss_mb": rss.peak_mb(),
+                    }
+                    if ttfbs:
+                        row.update(_percentiles(ttfbs, "ttfb_ms"))
+                    report["results"].append(row)
+                    print(json.dumps(row))
+            report["server_peak_rss_mb"] = RssSampler(server.pid).lifetime_peak_mb()
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+            mock.should_exit = True
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
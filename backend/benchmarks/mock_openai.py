@@ -0,0 +1,168 @@
+"""A local stand-in for the OpenAI API, for load tests.
+
+Run from the backend directory:
+
+    python -m benchmarks.mock_openai --port 8100 --latency-ms 400 --error-rate 0.05
+
+then point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:8100/v1.
+Serves chat completions (plain and streamed), embeddings and audio
+transcriptions with a fixed latency, and fails a share of requests with 429
+or 500 so retries get exercised. Chat completions can also take time in
+proportion to their size, like a real model: ``prompt_ms_per_token`` for
+reading the prompt and ``completion_ms_per_token`` for each generated token,
+with replies padded up to ``completion_tokens`` (capped by max_tokens). Load tests can also start it in-process
+with ``start_in_background``.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+REPLY = (
+    "## Key Themes\n- Stress at work\n- Poor sleep\n\n"
+    "## Summary\nThe client describes ongoing stress and trouble sleeping. "
+    "Validate their feelings, explore triggers and agree on small steps.\n\n"
+    "## Clinical Notes\nClient reports stress; plan sleep hygiene homework."
+)
+
+
+def _reply_words(max_tokens, completion_tokens):
+    """The canned reply, padded with filler notes to ``completion_tokens`` words, cut at ``max_tokens``."""
+    words = REPLY.split(" ")
+    if completion_tokens and len(words) < completion_tokens:
+        filler = "Client discussed coping strategies and agreed to review progress next session."
+        extra = (filler.split(" ") * (completion_tokens // len(filler.split(" ")) + 1))
+        words = words + extra[: completion_tokens - len(words)]
+    return words[: max_tokens or None]
+
+
+def create_app(latency_ms=300.0, token_delay_ms=20.0, error_rate=0.0, embedding_dim=1536,
+               prompt_ms_per_token=0.0, completion_ms_per_token=0.0, completion_tokens=0):
+    app = FastAPI()
+    app.state.calls = 0
+
+    async def maybe_fail():
+        app.state.calls += 1
+        await asyncio.sleep(latency_ms / 1000)
+        if error_rate and random.random() < error_rate:
+            status = random.choice((429, 500))
+            return JSONResponse(
+                status_code=status,
+                content={"error": {"message": "mock failure", "type": "mock", "code": None}},
+                headers={"retry-after": "0.1"} if status == 429 else None,
+            )
+        return None
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        failure = await maybe_fail()
+        if failure is not None:
+            return failure
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        words = _reply_words(body.get("max_tokens"), completion_tokens)
+        await asyncio.sleep(prompt_tokens * prompt_ms_per_token / 1000)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                 "total_tokens": prompt_tokens + len(words)}
+        created = int(time.time())
+
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+            async def events():
+                base = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created,
+                        "model": body["model"]}
+                for i, word in enumerate(words):
+                    delta = {"role": "assistant", "content": word if i == 0 else " " + word}
+                    chunk = {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    await asyncio.sleep(token_delay_ms / 1000)
+                yield f"data: {json.dumps({**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
+                if include_usage:
+                    yield f"data: {json.dumps({**base, 'choices': [], 'usage': usage})}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(len(words) * completion_ms_per_token / 1000)
+        return {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": created,
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(words)},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        }
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        failure = await maybe_fail()
+        if failure is not None:
+            return failure
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = []
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha256(str(text).encode()).digest()[:4], "little")
+            vector = np.random.default_rng(seed).normal(size=embedding_dim).astype(np.float32)
+            vector /= np.linalg.norm(vector)
+            data.append({"object": "embedding", "index": i, "embedding": vector.tolist()})
+        return {"object": "list", "data": data, "model": body["model"],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+
+    @app.post("/v1/audio/transcriptions")
+    async def transcriptions(request: Request):
+        form = await request.form()
+        failure = await maybe_fail()
+        if failure is not None:
+            return failure
+        audio = await form["file"].read()
+        return {"text": f"Counselor: How have you been sleeping? Client: Not well. ({len(audio)} bytes)"}
+
+    return app
+
+
+def start_in_background(port=8100, **options):
+    """Serve the mock on a daemon thread; returns the uvicorn Server (set ``should_exit`` to stop)."""
+    config = uvicorn.Config(create_app(**options), host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, name="mock-openai", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI API")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--token-delay-ms", type=float, default=20.0, help="between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--prompt-ms-per-token", type=float, default=0.0)
+    parser.add_argument("--completion-ms-per-token", type=float, default=0.0)
+    parser.add_argument("--completion-tokens", type=int, default=0, help="pad chat replies to this length")
+    args = parser.parse_args()
+    app = create_app(
+        args.latency_ms, args.token_delay_ms, args.error_rate,
+        prompt_ms_per_token=args.prompt_ms_per_token,
+        completion_ms_per_token=args.completion_ms_per_token,
+        completion_tokens=args.completion_tokens,
+    )
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Parity and speed check of the ONNX classifier backends against eager torch.
+
+Run from the backend directory after ``python export_onnx.py``:
+
+    python -m benchmarks.onnx_parity --output onnx_parity.json
+
+Uses the same counsel-chat test split as data_exploration/model_training.py
+(20%, stratified, seed 42). For every backend it reports label agreement with
+torch, max/mean absolute logit difference, accuracy against the gold topics,
+single-question latency (p50/p99) and batched throughput.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from categorize import BACKENDS, MAX_LENGTH, classifier, load_backend
+
+
+def load_test_split(limit=None):
+    """Questions and topics of the counsel-chat test split used in training."""
+    from datasets import ClassLabel, Dataset, load_dataset
+
+    df = load_dataset("nbertagnolli/counsel-chat")["train"].to_pandas()
+    df = df.dropna(subset=["questionText"])
+    texts = df["questionText"].tolist()
+    topics = df["topic"].tolist()
+
+    label2id = {t: i for i, t in enumerate(sorted(set(topics)))}
+    class_names = sorted(label2id, key=label2id.get)
+    ds = Dataset.from_dict({"text": texts, "label": [label2id[t] for t in topics]})
+    ds = ds.cast_column("label", ClassLabel(num_classes=len(class_names), names=class_names))
+    test = ds.train_test_split(test_size=0.20, stratify_by_column="label", seed=42)["test"]
+
+    questions = test["text"]
+    gold = [class_names[i] for i in test["label"]]
+    if limit:
+        questions, gold = questions[:limit], gold[:limit]
+    return questions, gold
+
+
+def _encode(questions):
+    return classifier.get().tokenizer(questions, return_tensors="np", truncation=True, padding=True, max_length=MAX_LENGTH)
+
+
+def all_logits(run, questions, batch_size):
+    chunks = []
+    for i in range(0, len(questions), batch_size):
+        chunks.append(run(_encode(questions[i:i + batch_size])))
+    return np.concatenate(chunks)
+
+
+def latency_ms(run, questions, repeats):
+    samples = []
+    for i in range(repeats):
+        inputs = _encode([questions[i % len(questions)]])
+        start = time.perf_counter()
+        run(inputs)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50": round(float(np.percentile(samples, 50)), 2),
+        "p99": round(float(np.percentile(samples, 99)), 2),
+    }
+
+
+def throughput(run, questions, batch_size):
+    start = time.perf_counter()
+    all_logits(run, questions, batch_size)
+    return round(len(questions) / (time.perf_counter() - start), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare classifier backends")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--limit", type=int, default=None, help="only use the first N test questions")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--latency-repeats", type=int, default=200)
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    questions, gold = load_test_split(args.limit)
+    print(f"Loaded {len(questions)} test questions")
+
+    reference = None
+    report = {"questions": len(questions), "batch_size": args.batch_size, "backends": {}}
+    for name in ["torch"] + [b for b in args.backends if b != "torch"]:
+        run = load_backend(name)
+        run(_encode(questions[:2]))  # warm-up
+
+        logits = all_logits(run, questions, args.batch_size)
+        labels = [classifier.get().id2label[i] for i in logits.argmax(axis=-1)]
+        if reference is None:
+            reference = (logits, labels)
+
+        ref_logits, ref_labels = reference
+        diff = np.abs(logits - ref_logits)
+        row = {
+            "label_agreement": round(float(np.mean([a == b for a, b in zip(labels, ref_labels)])), 4),
+            "max_abs_logit_diff": round(float(diff.max()), 5),
+            "mean_abs_logit_diff": round(float(diff.mean()), 5),
+            "accuracy": round(float(np.mean([p == g for p, g in zip(labels, gold)])), 4),
+            "latency_ms_batch1": latency_ms(run, questions, args.latency_repeats),
+            "throughput_qps": throughput(run, questions, args.batch_size),
+        }
+        report["backends"][name] = row
+        print(name, json.dumps(row))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
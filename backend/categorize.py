@@ -1,29 +1,226 @@
-from fastapi import APIRouter, Form, Body
+from fastapi import APIRouter, Form, Body, HTTPException
 from fastapi.responses import HTMLResponse, JSONResponse
-import torch
-from transformers import AutoModelForSequenceClassification, AutoTokenizer
+from starlette.concurrency import run_in_threadpool
+from typing import List
+import logging
+import os
+import numpy as np
+from batching import MicroBatcher
+from cache import LRUCache, text_key
+from metrics import stage_seconds
+from resources import LazyResource
+from config import (
+    CATEGORIZE_MAX_BATCH_SIZE,
+    CATEGORIZE_MAX_WAIT_MS,
+    CATEGORIZE_WORKERS,
+    CATEGORIZE_TORCH_THREADS,
+    CATEGORIZE_BATCH_CHUNK_SIZE,
+    CATEGORIZE_BATCH_MAX_QUESTIONS,
+    CATEGORIZE_CACHE_SIZE,
+    CLASSIFIER_BACKEND,
+)
 
 #CONFIG
 MODEL_DIR = "model_weights/roberta_classification"
 MODEL_NAME = "microsoft/deberta-v3-small"
 MAX_LENGTH = 256
+ONNX_DIR = "model_weights/roberta_classification_onnx"
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model.int8.onnx"}
+BACKENDS = ("torch",) + tuple(ONNX_FILES)
 
+logger = logging.getLogger(__name__)
 
-model = AutoModelForSequenceClassification.from_pretrained(MODEL_DIR)
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-model.eval()
+
+# ==== Backends ====
+# Every backend is a callable taking the tokenizer's numpy output and
+# returning a (batch, num_labels) float32 array of logits.
+
+def _load_torch_backend():
+    import torch
+    from transformers import AutoModelForSequenceClassification
+
+    if CATEGORIZE_TORCH_THREADS > 0:
+        torch.set_num_threads(CATEGORIZE_TORCH_THREADS)
+    model = AutoModelForSequenceClassification.from_pretrained(MODEL_DIR)
+    model.eval()
+
+    def run(inputs):
+        with torch.no_grad():
+            outputs = model(**{k: torch.from_numpy(v) for k, v in inputs.items()})
+        return outputs.logits.numpy()
+
+    return run
+
+
+def _load_onnx_backend(path):
+    import onnxruntime as ort
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found, run export_onnx.py first")
+
+    options = ort.SessionOptions()
+    if CATEGORIZE_TORCH_THREADS > 0:
+        options.intra_op_num_threads = CATEGORIZE_TORCH_THREADS
+    session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+    input_names = {i.name for i in session.get_inputs()}
+
+    def run(inputs):
+        feed = {k: v.astype(np.int64) for k, v in inputs.items() if k in input_names}
+        return session.run(["logits"], feed)[0]
+
+    return run
+
+
+def load_backend(name):
+    """Load the classifier backend called ``name`` (one of BACKENDS)."""
+    if name == "torch":
+        return _load_torch_backend()
+    if name in ONNX_FILES:
+        return _load_onnx_backend(os.path.join(ONNX_DIR, ONNX_FILES[name]))
+    raise ValueError(f"Unknown classifier backend {name!r}, expected one of {BACKENDS}")
+
+
+class Classifier:
+    """Tokenizer, label map and logits function of the configured backend."""
+
+    def __init__(self, backend=CLASSIFIER_BACKEND):
+        from transformers import AutoConfig, AutoTokenizer
+
+        self.backend = backend
+        self.tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+        self.id2label = AutoConfig.from_pretrained(MODEL_DIR).id2label
+        self.compute_logits = load_backend(backend)
+        logger.info("Categorization backend: %s", backend)
+
+
+# Loaded by the startup warm-up task, or by the first request if that comes first
+classifier = LazyResource(
+    "classifier",
+    Classifier,
+    warmup=lambda clf: predict_batch(["warm-up question"]),
+)
+
+
+def _softmax(logits):
+    shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return shifted / shifted.sum(axis=-1, keepdims=True)
+
+
+def predict_batch(questions, chunk_size=CATEGORIZE_BATCH_CHUNK_SIZE):
+    """Classify a list of questions.
+
+    Questions are tokenized once, sorted by token length and run in padded
+    chunks of ``chunk_size`` so short questions aren't padded up to long
+    ones. Returns one ``(probabilities, token_count)`` tuple per question, in
+    input order.
+    """
+    clf = classifier.get()
+    with stage_seconds.timer(stage="categorize.tokenize"):
+        encoded = clf.tokenizer(questions, truncation=True, max_length=MAX_LENGTH)
+    lengths = [len(ids) for ids in encoded["input_ids"]]
+    order = sorted(range(len(questions)), key=lengths.__getitem__)
+
+    results = [None] * len(questions)
+    for start in range(0, len(order), chunk_size):
+        chunk = order[start:start + chunk_size]
+        features = [{k: encoded[k][i] for k in encoded.keys()} for i in chunk]
+        with stage_seconds.timer(stage="categorize.pad"):
+            inputs = clf.tokenizer.pad(features, return_tensors="np")
+        with stage_seconds.timer(stage="categorize.forward"):
+            probabilities = _softmax(clf.compute_logits(dict(inputs)))
+        for i, probs in zip(chunk, probabilities):
+            results[i] = (probs, lengths[i])
+    return results
+
+
+def format_prediction(prediction, top_k=1):
+    id2label = classifier.get().id2label
+    probs, token_count = prediction
+    top = np.argsort(probs)[::-1][:top_k]
+    return {
+        "category": id2label[int(top[0])],
+        "top_k": [{"label": id2label[int(i)], "probability": round(float(probs[i]), 4)} for i in top],
+        "token_count": token_count,
+    }
+
+
+# Inference runs on the batcher's worker threads, so the event loop stays free
+# for the OpenAI-backed routes while the model is busy.
+batcher = MicroBatcher(
+    predict_batch,
+    max_batch_size=CATEGORIZE_MAX_BATCH_SIZE,
+    max_wait_ms=CATEGORIZE_MAX_WAIT_MS,
+    num_workers=CATEGORIZE_WORKERS,
+    name="categorize",
+)
+
+# Keyed on the backend too, since quantized backends may disagree at the margin
+prediction_cache = LRUCache(CATEGORIZE_CACHE_SIZE)
+
+
+def _cache_key(question):
+    return text_key(question, namespace=CLASSIFIER_BACKEND)
 
 
 router = APIRouter()
 
 @router.post("/categorize")
 async def categorize_question(question: str = Body(..., embed=True)):
-    print("Question:", question)
-    inputs = tokenizer(question, return_tensors="pt", truncation=True, padding=True, max_length=MAX_LENGTH)
-    with torch.no_grad():
-        outputs = model(**inputs)
-    logits = outputs.logits
-    prediction = torch.argmax(logits, dim=-1).item()
-    label = model.config.id2label[prediction]
-    
-    return {"category": label, "response": "Hi, looks like you are dealing with a " + label + " issue. How can I help you today?"}
\ No newline at end of file
+    logger.debug("Question: %s", question)
+    await classifier.aget()
+    key = _cache_key(question)
+    prediction = prediction_cache.get(key)
+    if prediction is None:
+        prediction = await batcher.run(question)
+        prediction_cache.put(key, prediction)
+    label = format_prediction(prediction)["category"]
+
+    return {"category": label, "response": "Hi, looks like you are dealing with a " + label + " issue. How can I help you today?"}
+
+
+@router.post("/categorize/batch")
+async def categorize_batch(
+    questions: List[str] = Body(..., embed=True),
+    top_k: int = Body(3, embed=True),
+):
+    """Classify many questions in one call.
+
+    Cached questions are answered directly; the rest are de-duplicated and run
+    in length-sorted chunks on a worker thread.
+    """
+    if len(questions) > CATEGORIZE_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {CATEGORIZE_BATCH_MAX_QUESTIONS} questions per request",
+        )
+    clf = await classifier.aget()
+    top_k = max(1, min(top_k, len(clf.id2label)))
+
+    keys = [_cache_key(q) for q in questions]
+    predictions = {}
+    missing = {}
+    for question, key in zip(questions, keys):
+        if key in predictions or key in missing:
+            continue
+        cached = prediction_cache.get(key)
+        if cached is None:
+            missing[key] = question
+        else:
+            predictions[key] = cached
+
+    if missing:
+        computed = await run_in_threadpool(predict_batch, list(missing.values()))
+        for key, prediction in zip(missing, computed):
+            prediction_cache.put(key, prediction)
+            predictions[key] = prediction
+
+    return {"results": [format_prediction(predictions[key], top_k) for key in keys]}
+
+
+@router.get("/categorize/stats")
+async def categorize_stats():
+    return {
+        "backend": CLASSIFIER_BACKEND,
+        "batcher": batcher.stats(),
+        "cache": prediction_cache.stats(),
+    }
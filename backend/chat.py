@@ -1,78 +1,247 @@
 from fastapi import APIRouter, Body, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import json
-import os
-from openai import OpenAI
+import logging
+import time
+from conversation_store import (
+    ChatContext,
+    Turn,
+    UnknownSession,
+    append_messages,
+    assemble_context,
+    create_conversation,
+    open_conversation,
+    schedule_summary,
+    turns_from_history,
+    validate_session_id,
+)
+from metrics import Histogram
+from openai_client import chat_completion, stream_chat_completion
+from starlette.concurrency import run_in_threadpool
+from tokens import count_tokens
 from typing import List, Dict, Any
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+CHAT_MODEL = "gpt-4o-mini"
+CHAT_MAX_TOKENS = 500
+CHAT_TEMPERATURE = 0.7
+
+# Time until the counselor sees the first words of the answer: the first
+# streamed token, or the whole answer for the non-streaming route
+chat_ttft = Histogram(
+    "chat_time_to_first_token_seconds",
+    "Time from receiving a chat request to sending the first answer token",
+    labelnames=("mode",),
+)
+
+# Prompt size per turn as sent, and as it would be with the whole history
+chat_prompt_tokens = Histogram(
+    "chat_prompt_tokens",
+    "Prompt tokens per chat turn",
+    labelnames=("context",),
+    buckets=(250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 16000, 32000, 64000, 128000),
+)
+
+
+def system_prompt_for(category: str) -> str:
+    return f"""You are an AI assistant providing guidance to a mental health counselor about how to respond to their patient.
+    The patient's issue is related to the category: {category}.
+    The counselor is describing their patient's situation and seeking advice on how to approach it.
+    The first question is copy pasted from the patient's message.
+    Provide professional recommendations for the counselor on:
+    - How to frame responses to the patient
+    - Therapeutic approaches that might be helpful for this category of issue
+    - Questions the counselor might ask to better understand the patient's situation
+    - Potential resources or techniques to suggest to the patient
+    
+    Focus on evidence-based approaches while being empathetic and supportive.
+    Avoid making specific diagnoses or suggesting medications.
+    Keep responses concise, to the point, and professional in tone."""
+
+
+async def prepare_chat(body: bytes):
+    """Parse a chat request body into (category, ChatContext).
+
+    ``new_session: true`` starts a server-side conversation seeded with the
+    client's ``history``; its ``session_id`` comes back with the answer, and
+    later turns send that id with just the new message. An id the server
+    didn't issue raises UnknownSession. Without either, the client's
+    ``history`` is used as before. Either way the prompt is cut to the token
+    budget.
+    """
+    # Parse the JSON manually
+    data = json.loads(body)
+
+    message = data.get("message", "")
+    category = data.get("category", "")
+    history = data.get("history") or []
+    session_id = data.get("session_id")
+    new_session = data.get("new_session") is True
+
+    logger.debug("Extracted message: %s, category: %s, session: %s", message, category, session_id)
+    logger.debug("Chat history length: %d", len(history))
+
+    if session_id is None:
+        turns = await run_in_threadpool(turns_from_history, history)
+        context = assemble_context(system_prompt_for(category), None, turns, message)
+        if new_session:
+            context.seed = turns
+    else:
+        session_id = validate_session_id(session_id)
+        stored = await run_in_threadpool(open_conversation, session_id)
+        category = category or stored.category or ""
+        context = assemble_context(
+            system_prompt_for(category), stored.summary, stored.turns, message,
+            older_tokens=stored.summarized_tokens,
+        )
+        context.session_id = session_id
+
+    chat_prompt_tokens.observe(context.report["prompt_tokens"], context="sent")
+    chat_prompt_tokens.observe(context.report["full_history_tokens"], context="full_history")
+    logger.debug("Sending %d messages to OpenAI: %s", len(context.messages), context.report)
+    return category, context
+
+
+async def finish_chat(context: ChatContext, category: str, reply: str):
+    """Store the turn of a server-side conversation and refresh its summary in the background.
+
+    The answer has been paid for by then, so a failed write is logged and
+    reported as ``saved: false`` rather than failing the request. A new
+    conversation that couldn't be stored gets no session id; the client
+    starts it again on its next turn.
+    """
+    if context.session_id is None and context.seed is None:
+        return
+    message = context.messages[-1]["content"]
+    turns = [Turn("user", message, count_tokens(message)), Turn("assistant", reply, count_tokens(reply))]
+    try:
+        if context.session_id is None:
+            context.session_id = await run_in_threadpool(create_conversation, category, context.seed + turns)
+        else:
+            await run_in_threadpool(append_messages, context.session_id, turns)
+    except Exception:
+        logger.exception("Storing a chat turn failed")
+        context.saved = False
+        return
+    schedule_summary(context.session_id, CHAT_MODEL)
+
+
+def _response_extras(context: ChatContext) -> Dict[str, Any]:
+    extras = {"context": context.report}
+    if context.session_id is not None:
+        extras["session_id"] = context.session_id
+    if context.session_id is not None or context.seed is not None:
+        extras["saved"] = context.saved
+    return extras
+
+
+def _invalid_request(e: Exception) -> JSONResponse:
+    if isinstance(e, UnknownSession):
+        return JSONResponse(status_code=404, content={"error": "Unknown session_id; start a new session"})
+    logger.warning("Error processing request: %s", e)
+    return JSONResponse(status_code=400, content={"error": f"Bad request: {str(e)}"})
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 
 @router.post("/chat")
 async def chat(request: Request):
-    # Print raw request body for debugging
+    start = time.perf_counter()
     body = await request.body()
-    print(f"Raw request body: {body}")
-    
     try:
-        # Parse the JSON manually
-        data = json.loads(body)
-        print(f"Parsed request data: {data}")
-        
-        message = data.get("message", "")
-        category = data.get("category", "")
-        history = data.get("history", [])
-        
-        print(f"Extracted message: {message}, category: {category}")
-        print(f"Chat history length: {len(history)}")
-        print(f"History: {history}")
-        
-        # Create a system prompt based on the category
-        system_prompt = f"""You are an AI assistant providing guidance to a mental health counselor about how to respond to their patient.
-        The patient's issue is related to the category: {category}.
-        The counselor is describing their patient's situation and seeking advice on how to approach it.
-        The first question is copy pasted from the patient's message.
-        Provide professional recommendations for the counselor on:
-        - How to frame responses to the patient
-        - Therapeutic approaches that might be helpful for this category of issue
-        - Questions the counselor might ask to better understand the patient's situation
-        - Potential resources or techniques to suggest to the patient
-        
-        Focus on evidence-based approaches while being empathetic and supportive.
-        Avoid making specific diagnoses or suggesting medications.
-        Keep responses concise, to the point, and professional in tone."""
-        
-        # Prepare messages for the API call
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # Add chat history - converting from {id, content, sender, timestamp} format
-        for entry in history:
-            if isinstance(entry, dict) and "sender" in entry and "content" in entry:
-                role = "user" if entry.get("sender") == "user" else "assistant"
-                messages.append({"role": role, "content": entry.get("content", "")})
-        
-        # Add the current message
-        messages.append({"role": "user", "content": message})
-        
-        print(f"Sending {len(messages)} messages to OpenAI")
-        
+        category, context = await prepare_chat(body)
+    except Exception as e:
+        return _invalid_request(e)
+
+    try:
         # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            max_tokens=500,
-            temperature=0.7
+        response = await chat_completion(
+            model=CHAT_MODEL,
+            messages=context.messages,
+            max_tokens=CHAT_MAX_TOKENS,
+            temperature=CHAT_TEMPERATURE
         )
         
         # Extract the assistant's response
         ai_response = response.choices[0].message.content
-        
-        return {"response": ai_response, "category": category}
+        chat_ttft.observe(time.perf_counter() - start, mode="blocking")
     except Exception as e:
-        print(f"Error processing request: {str(e)}")
+        logger.warning("Error processing request: %s", e)
         return JSONResponse(
             status_code=400,
             content={"error": f"Bad request: {str(e)}"}
-        ) 
\ No newline at end of file
+        )
+
+    await finish_chat(context, category, ai_response)
+    return {"response": ai_response, "category": category, **_response_extras(context)}
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: Request):
+    """Same request as /chat, answered as server-sent events.
+
+    ``token`` events carry pieces of the answer as OpenAI produces them; a
+    final ``done`` event carries the full response, the category, token
+    usage, time to first token and the same ``context`` report (and
+    ``session_id`` / ``saved``) as /chat. A failure after the stream has started
+    is reported as an ``error`` event.
+    """
+    start = time.perf_counter()
+    body = await request.body()
+    try:
+        category, context = await prepare_chat(body)
+    except Exception as e:
+        return _invalid_request(e)
+
+    async def events():
+        parts, usage, ttft = [], None, None
+        try:
+            async for chunk in stream_chat_completion(
+                model=CHAT_MODEL,
+                messages=context.messages,
+                max_tokens=CHAT_MAX_TOKENS,
+                temperature=CHAT_TEMPERATURE,
+                stream_options={"include_usage": True},
+            ):
+                if chunk.usage is not None:
+                    usage = chunk.usage.model_dump()
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                content = chunk.choices[0].delta.content
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                    chat_ttft.observe(ttft, mode="stream")
+                parts.append(content)
+                yield _sse("token", {"content": content})
+        except Exception as e:
+            logger.warning("Error streaming chat response: %s", e)
+            yield _sse("error", {"error": str(e)})
+            return
+        response = "".join(parts)
+        await finish_chat(context, category, response)
+        yield _sse("done", {
+            "response": response,
+            "category": category,
+            "usage": usage,
+            "ttft_ms": None if ttft is None else round(ttft * 1000, 1),
+            **_response_extras(context),
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # X-Accel-Buffering stops nginx from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/chat/stats")
+async def chat_stats():
+    return {
+        "time_to_first_token_seconds": chat_ttft.summary(),
+        "prompt_tokens": chat_prompt_tokens.summary(),
+    }
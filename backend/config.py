@@ -0,0 +1,201 @@
+import os
+
+# ==== Categorization inference ====
+# Requests to /api/categorize are grouped into micro-batches: a worker thread
+# waits at most CATEGORIZE_MAX_WAIT_MS for up to CATEGORIZE_MAX_BATCH_SIZE
+# questions, then runs a single forward pass for all of them.
+CATEGORIZE_MAX_BATCH_SIZE = int(os.getenv("CATEGORIZE_MAX_BATCH_SIZE", "16"))
+CATEGORIZE_MAX_WAIT_MS = float(os.getenv("CATEGORIZE_MAX_WAIT_MS", "5"))
+CATEGORIZE_WORKERS = int(os.getenv("CATEGORIZE_WORKERS", "1"))
+# 0 keeps torch's default (one thread per physical core)
+CATEGORIZE_TORCH_THREADS = int(os.getenv("CATEGORIZE_TORCH_THREADS", "0"))
+# /api/categorize/batch sorts questions by token length and pads them in
+# chunks of this size; lists longer than the max are rejected.
+CATEGORIZE_BATCH_CHUNK_SIZE = int(os.getenv("CATEGORIZE_BATCH_CHUNK_SIZE", "32"))
+CATEGORIZE_BATCH_MAX_QUESTIONS = int(os.getenv("CATEGORIZE_BATCH_MAX_QUESTIONS", "1000"))
+# Predictions cached by normalized question text (0 disables the cache)
+CATEGORIZE_CACHE_SIZE = int(os.getenv("CATEGORIZE_CACHE_SIZE", "10000"))
+
+# ==== Classifier backend ====
+# "torch" (eager fp32), "onnx" (ONNX Runtime fp32) or "onnx-int8" (ONNX Runtime
+# with dynamically quantized int8 weights). Run export_onnx.py before picking
+# one of the ONNX backends.
+CLASSIFIER_BACKEND = os.getenv("CLASSIFIER_BACKEND", "torch")
+
+# ==== Startup ====
+# Load the classifier, FAISS indexes, texts and clients in a background task
+# right after startup. With 0 they are loaded by the first request using them.
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+
+# ==== Application logs ====
+# Level of the app's own log messages. DEBUG adds per-request details such as
+# chat messages and questions, which contain client information; keep it off
+# in production.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# ==== Query embedding cache ====
+# /api/examples embeddings are cached in memory and in a SQLite file on disk,
+# keyed on a hash of model name and text. A size of 0 disables that tier.
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./.cache/embeddings.sqlite")
+EMBEDDING_CACHE_MEMORY_SIZE = int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "1000"))
+EMBEDDING_CACHE_DISK_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_DISK_MAX_ENTRIES", "20000"))
+
+# ==== Query embedding provider ====
+# "openai" (hosted API), "local" (sentence-embedding model on CPU) or "hashing"
+# (offline stand-in). Each provider searches its own index, built with
+# data_exploration/generating_embeddings.py --provider <name>.
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+# Hugging Face id or local directory of the "local" provider's model
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# Dynamic int8 quantization of the local model's linear layers
+LOCAL_EMBEDDING_QUANTIZE = os.getenv("LOCAL_EMBEDDING_QUANTIZE", "0") == "1"
+LOCAL_EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_MAX_BATCH_SIZE", "16"))
+LOCAL_EMBEDDING_MAX_WAIT_MS = float(os.getenv("LOCAL_EMBEDDING_MAX_WAIT_MS", "5"))
+
+# ==== Similar-conversation search ====
+# Query-time knobs for IVF (nprobe) and HNSW (efSearch) index types
+EXAMPLES_NPROBE = int(os.getenv("EXAMPLES_NPROBE", "8"))
+EXAMPLES_EF_SEARCH = int(os.getenv("EXAMPLES_EF_SEARCH", "64"))
+# Matches below this cosine similarity are dropped (requests may override it)
+EXAMPLES_MIN_SIMILARITY = float(os.getenv("EXAMPLES_MIN_SIMILARITY", "0"))
+EXAMPLES_MAX_K = int(os.getenv("EXAMPLES_MAX_K", "10"))
+# Memory-map the index so uvicorn workers share it through the page cache
+EXAMPLES_MMAP = os.getenv("EXAMPLES_MMAP", "1") == "1"
+# Folder with the index, meta and transcript store of each embedding provider
+EXAMPLES_CORPUS_DIR = os.getenv("EXAMPLES_CORPUS_DIR", "./conversation_embeddings")
+
+# ==== Admin ====
+# Required in the X-Admin-Token header of admin routes; unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# ==== Database ====
+# Two pooled engines share these settings: the synchronous one (schema setup,
+# request-log writer thread, log maintenance) and the async one
+# (asyncpg/aiosqlite) behind database.get_session. Each holds up to
+# DB_POOL_SIZE idle connections plus DB_MAX_OVERFLOW under load, per uvicorn
+# worker, so keep (size + overflow) x 2 x workers under Postgres'
+# max_connections. Connections are recycled after DB_POOL_RECYCLE_S and
+# checked with a cheap ping before use (DB_POOL_PRE_PING), so a restarted
+# database or an idle-timeout proxy doesn't fail the next query. SQLite URLs
+# keep SQLAlchemy's default pools.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT_S = float(os.getenv("DB_POOL_TIMEOUT_S", "30"))
+DB_POOL_RECYCLE_S = int(os.getenv("DB_POOL_RECYCLE_S", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# Startup waits for the database with exponential backoff between attempts,
+# starting at DB_CONNECT_RETRY_S and capped at 30 s
+DB_CONNECT_RETRIES = int(os.getenv("DB_CONNECT_RETRIES", "10"))
+DB_CONNECT_RETRY_S = float(os.getenv("DB_CONNECT_RETRY_S", "1"))
+
+# ==== Request logging ====
+# Request logs are queued in memory and inserted in bulk by a background
+# thread: a batch is written once it has LOG_BATCH_SIZE rows or
+# LOG_FLUSH_INTERVAL_MS after its first row. When the queue is full (the
+# database is down or falling behind) new logs are dropped and counted.
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "200"))
+LOG_FLUSH_INTERVAL_MS = float(os.getenv("LOG_FLUSH_INTERVAL_MS", "1000"))
+
+# ==== Request log retention and rollups ====
+# On Postgres request_logs is partitioned by day; partitions older than
+# LOG_RETENTION_DAYS are dropped, or detached (left as standalone tables to
+# archive) with LOG_RETENTION_ACTION=detach. 0 keeps logs forever. Hourly
+# per-endpoint rollups are refreshed every LOG_MAINTENANCE_INTERVAL_S and
+# kept for LOG_ROLLUP_RETENTION_DAYS.
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "30"))
+LOG_RETENTION_ACTION = os.getenv("LOG_RETENTION_ACTION", "drop")
+LOG_PARTITIONS_AHEAD = int(os.getenv("LOG_PARTITIONS_AHEAD", "3"))
+LOG_ROLLUP_RETENTION_DAYS = int(os.getenv("LOG_ROLLUP_RETENTION_DAYS", "365"))
+LOG_MAINTENANCE_INTERVAL_S = float(os.getenv("LOG_MAINTENANCE_INTERVAL_S", "300"))
+
+# ==== OpenAI client ====
+# One AsyncOpenAI client is shared by every router. OPENAI_BASE_URL points it
+# at another endpoint (e.g. benchmarks/mock_openai.py).
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_CONNECT_TIMEOUT_S = float(os.getenv("OPENAI_CONNECT_TIMEOUT_S", "5"))
+# Read timeouts per operation
+OPENAI_CHAT_TIMEOUT_S = float(os.getenv("OPENAI_CHAT_TIMEOUT_S", "60"))
+OPENAI_EMBEDDING_TIMEOUT_S = float(os.getenv("OPENAI_EMBEDDING_TIMEOUT_S", "15"))
+OPENAI_TRANSCRIPTION_TIMEOUT_S = float(os.getenv("OPENAI_TRANSCRIPTION_TIMEOUT_S", "300"))
+# Rate limits, timeouts, connection errors and 5xx are retried with full
+# jitter: sleep uniform(0, min(MAX, BASE * 2**attempt)), or Retry-After
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_RETRY_BASE_S = float(os.getenv("OPENAI_RETRY_BASE_S", "0.5"))
+OPENAI_RETRY_MAX_S = float(os.getenv("OPENAI_RETRY_MAX_S", "8"))
+# Concurrent requests per model, as "model=limit,..."; others get the default
+OPENAI_MODEL_CONCURRENCY = os.getenv(
+    "OPENAI_MODEL_CONCURRENCY", "gpt-4o-mini=64,text-embedding-3-small=64,whisper-1=8"
+)
+OPENAI_DEFAULT_CONCURRENCY = int(os.getenv("OPENAI_DEFAULT_CONCURRENCY", "32"))
+
+# ==== Advice cache ====
+# Opt-in cache of /api/advice answers. An exact match on the normalized
+# problem text is tried first, then a FAISS search over embeddings of
+# previously answered problems (the query embedding provider above); a
+# cosine similarity of at least ADVICE_CACHE_SIMILARITY returns the stored
+# answer. Entries expire after ADVICE_CACHE_TTL_S and the least recently used
+# go past ADVICE_CACHE_MAX_ENTRIES. Requests with an X-Cache-Bypass header or
+# Cache-Control: no-cache skip the cache.
+ADVICE_CACHE_ENABLED = os.getenv("ADVICE_CACHE_ENABLED", "0") == "1"
+ADVICE_CACHE_MAX_ENTRIES = int(os.getenv("ADVICE_CACHE_MAX_ENTRIES", "500"))
+ADVICE_CACHE_TTL_S = float(os.getenv("ADVICE_CACHE_TTL_S", "86400"))
+ADVICE_CACHE_SIMILARITY = float(os.getenv("ADVICE_CACHE_SIMILARITY", "0.95"))
+
+# ==== Chat context ====
+# /api/chat requests that carry a session_id keep the conversation in the
+# database; the client sends only the new message. Each prompt is held to
+# CHAT_CONTEXT_TOKEN_BUDGET tokens (counted with tiktoken): the system prompt,
+# a running summary of older turns and as many recent turns as fit, verbatim.
+# Once the turns not yet summarized exceed CHAT_RECENT_TOKENS, the oldest are
+# folded into the summary (at most CHAT_SUMMARY_MAX_TOKENS) until they fit in
+# half of it, so the summary is updated every few turns rather than every turn.
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "3000"))
+CHAT_RECENT_TOKENS = int(os.getenv("CHAT_RECENT_TOKENS", "1500"))
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "300"))
+
+# ==== Transcript summarization ====
+# Transcripts up to SUMMARY_SINGLE_CALL_TOKENS are summarized in one call.
+# Longer ones are split on speaker turns into chunks of at most
+# SUMMARY_CHUNK_TOKENS, summarized SUMMARY_MAP_CONCURRENCY at a time into
+# notes of at most SUMMARY_CHUNK_NOTES_TOKENS, and the notes are combined
+# into the usual Summary / Key Themes / Clinical Notes. Generation time
+# dominates, so map-reduce is at best as fast as one call (notes + combining
+# call, see benchmarks/bench_summarization.py); it is for transcripts that
+# would crowd the model's 128k context window, not for speeding up an hour.
+SUMMARY_SINGLE_CALL_TOKENS = int(os.getenv("SUMMARY_SINGLE_CALL_TOKENS", "60000"))
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "8000"))
+SUMMARY_CHUNK_NOTES_TOKENS = int(os.getenv("SUMMARY_CHUNK_NOTES_TOKENS", "400"))
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "8"))
+
+# ==== Audio uploads and transcription ====
+# Uploads are parsed off the request stream and written to disk
+# UPLOAD_CHUNK_BYTES at a time; they are rejected with 413 as soon as they
+# pass AUDIO_MAX_UPLOAD_MB (text uploads TEXT_MAX_UPLOAD_MB), or before any
+# reading when Content-Length already says so.
+# Recordings longer than AUDIO_SEGMENT_SECONDS are cut into segments that
+# overlap by AUDIO_SEGMENT_OVERLAP_SECONDS, transcribed
+# AUDIO_TRANSCRIBE_CONCURRENCY at a time and stitched back together.
+# TRANSCRIBER=synthetic swaps Whisper for the local stand-in in
+# transcribers.py (tests and benchmarks only).
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+AUDIO_MAX_UPLOAD_MB = float(os.getenv("AUDIO_MAX_UPLOAD_MB", "500"))
+TEXT_MAX_UPLOAD_MB = float(os.getenv("TEXT_MAX_UPLOAD_MB", "10"))
+AUDIO_SEGMENT_SECONDS = float(os.getenv("AUDIO_SEGMENT_SECONDS", "600"))
+AUDIO_SEGMENT_OVERLAP_SECONDS = float(os.getenv("AUDIO_SEGMENT_OVERLAP_SECONDS", "10"))
+AUDIO_TRANSCRIBE_CONCURRENCY = int(os.getenv("AUDIO_TRANSCRIBE_CONCURRENCY", "4"))
+TRANSCRIBER = os.getenv("TRANSCRIBER", "whisper")
+
+# ==== Summarization jobs ====
+# /api/summarization/jobs/* return a job id at once; SUMMARY_JOB_WORKERS jobs
+# run at a time and up to SUMMARY_JOB_QUEUE_SIZE wait (more get a 503).
+# Audio uploads wait in SUMMARY_JOB_UPLOAD_DIR, so jobs interrupted by a
+# restart are picked up again. A running job holds a lease that its worker
+# renews every third of SUMMARY_JOB_LEASE_SECONDS; jobs whose lease ran out
+# (their process died) can be claimed by another worker.
+SUMMARY_JOB_WORKERS = int(os.getenv("SUMMARY_JOB_WORKERS", "2"))
+SUMMARY_JOB_QUEUE_SIZE = int(os.getenv("SUMMARY_JOB_QUEUE_SIZE", "100"))
+SUMMARY_JOB_UPLOAD_DIR = os.getenv("SUMMARY_JOB_UPLOAD_DIR", "./job_uploads")
+SUMMARY_JOB_LEASE_SECONDS = float(os.getenv("SUMMARY_JOB_LEASE_SECONDS", "120"))
@@ -0,0 +1,282 @@
+import asyncio
+import logging
+import secrets
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select, update
+from starlette.concurrency import run_in_threadpool
+
+from config import CHAT_CONTEXT_TOKEN_BUDGET, CHAT_RECENT_TOKENS, CHAT_SUMMARY_MAX_TOKENS
+from database import SessionLocal, database
+from tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+MAX_SESSION_ID_LENGTH = 64
+
+# Chat format overhead, as counted in OpenAI's cookbook: every message is
+# wrapped in a few tokens, and the reply is primed with three more
+TOKENS_PER_MESSAGE = 3
+REPLY_PRIMING_TOKENS = 3
+
+SUMMARY_PROMPT = """You keep a running summary of a conversation between a mental-health
+counselor and an AI assistant that advises them about a client.
+Update the summary with the new messages. Keep the client's presenting
+issues, relevant facts, advice already given and open questions; drop
+pleasantries. Write at most 200 words, in plain prose. Reply with the
+summary only."""
+
+
+# ==== Token counting ====
+
+def message_tokens(message: Dict[str, str]) -> int:
+    return TOKENS_PER_MESSAGE + count_tokens(message["content"])
+
+
+def prompt_tokens(messages: List[Dict[str, str]]) -> int:
+    return REPLY_PRIMING_TOKENS + sum(message_tokens(m) for m in messages)
+
+
+# ==== Context assembly ====
+
+@dataclass
+class Turn:
+    role: str
+    content: str
+    tokens: int  # content only
+    id: int = 0
+
+    @property
+    def message(self):
+        return {"role": self.role, "content": self.content}
+
+
+@dataclass
+class ChatContext:
+    """The prompt for one chat turn and how it was assembled."""
+    messages: List[Dict[str, str]]
+    session_id: Optional[str] = None
+    report: dict = field(default_factory=dict)
+    # Client history of a conversation to be stored once this turn is answered
+    seed: Optional[List[Turn]] = None
+    saved: bool = True
+
+
+def assemble_context(system_prompt: str, summary: Optional[str], turns: List[Turn], message: str,
+                     older_tokens: int = 0, budget: int = CHAT_CONTEXT_TOKEN_BUDGET) -> ChatContext:
+    """Fit the system prompt, summary, newest turns and new message into ``budget`` tokens.
+
+    Turns are kept verbatim from the newest backwards while they fit; older
+    ones are left out (for stored conversations they are, or will be, in the
+    summary). ``older_tokens`` is the size of turns already summarized, so
+    the report can compare against sending the whole history.
+    """
+    head = [{"role": "system", "content": system_prompt}]
+    if summary:
+        head.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+    tail = [{"role": "user", "content": message}]
+    used = prompt_tokens(head + tail)
+
+    kept = []
+    for turn in reversed(turns):
+        cost = TOKENS_PER_MESSAGE + turn.tokens
+        if used + cost > budget:
+            break
+        kept.append(turn.message)
+        used += cost
+    kept.reverse()
+
+    history_tokens = older_tokens + sum(TOKENS_PER_MESSAGE + t.tokens for t in turns)
+    full = prompt_tokens([head[0]] + tail) + history_tokens
+    return ChatContext(
+        messages=head + kept + tail,
+        report={
+            "prompt_tokens": used,
+            "full_history_tokens": full,
+            "turns_verbatim": len(kept),
+            "turns_left_out": len(turns) - len(kept),
+            "summary_tokens": count_tokens(summary) if summary else 0,
+            "budget": budget,
+        },
+    )
+
+
+def turns_from_history(history) -> List[Turn]:
+    """Client-sent history ({id, content, sender, timestamp} entries) as turns."""
+    turns = []
+    for entry in history:
+        if isinstance(entry, dict) and "sender" in entry and "content" in entry:
+            role = "user" if entry.get("sender") == "user" else "assistant"
+            content = entry.get("content") or ""
+            turns.append(Turn(role, content, count_tokens(content)))
+    return turns
+
+
+# ==== Storage ====
+
+@dataclass
+class StoredConversation:
+    category: Optional[str]
+    summary: Optional[str]
+    turns: List[Turn]  # not yet summarized, oldest first
+    summarized_through: int
+    summarized_tokens: int
+
+
+class UnknownSession(LookupError):
+    """A session id the server never issued (or whose conversation is gone)."""
+
+
+def validate_session_id(session_id) -> str:
+    if not isinstance(session_id, str) or not 0 < len(session_id) <= MAX_SESSION_ID_LENGTH:
+        raise ValueError(f"session_id must be a string of 1 to {MAX_SESSION_ID_LENGTH} characters")
+    return session_id
+
+
+def create_conversation(category: str, turns: List[Turn]) -> str:
+    """Store a new conversation and return its id.
+
+    Ids are issued here, 256 random bits each, so a client can only continue
+    conversations it was handed the id of.
+    """
+    from models import ChatConversation, ChatMessage
+
+    database.get()
+    session_id = secrets.token_urlsafe(32)
+    db = SessionLocal()
+    try:
+        db.add(ChatConversation(id=session_id, category=category or None, summarized_through=0))
+        db.add_all(
+            ChatMessage(conversation_id=session_id, role=t.role, content=t.content, tokens=t.tokens)
+            for t in turns
+        )
+        db.commit()
+        return session_id
+    finally:
+        db.close()
+
+
+def open_conversation(session_id: str) -> StoredConversation:
+    """Load a stored conversation; raises UnknownSession if there is none under ``session_id``."""
+    from models import ChatConversation, ChatMessage
+
+    database.get()
+    db = SessionLocal()
+    try:
+        conversation = db.get(ChatConversation, session_id)
+        if conversation is None:
+            raise UnknownSession(session_id)
+
+        rows = db.execute(
+            select(ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.tokens)
+            .where(ChatMessage.conversation_id == session_id, ChatMessage.id > conversation.summarized_through)
+            .order_by(ChatMessage.id)
+        ).all()
+        count, tokens = db.execute(
+            select(func.count(), func.coalesce(func.sum(ChatMessage.tokens), 0))
+            .where(ChatMessage.conversation_id == session_id, ChatMessage.id <= conversation.summarized_through)
+        ).one()
+        return StoredConversation(
+            category=conversation.category,
+            summary=conversation.summary,
+            turns=[Turn(role, content, n, id=id_) for id_, role, content, n in rows],
+            summarized_through=conversation.summarized_through,
+            summarized_tokens=int(tokens) + TOKENS_PER_MESSAGE * count,
+        )
+    finally:
+        db.close()
+
+
+def append_messages(session_id: str, turns: List[Turn]):
+    from models import ChatConversation, ChatMessage
+
+    db = SessionLocal()
+    try:
+        db.add_all(
+            ChatMessage(conversation_id=session_id, role=t.role, content=t.content, tokens=t.tokens)
+            for t in turns
+        )
+        db.execute(update(ChatConversation).where(ChatConversation.id == session_id).values(updated_at=func.now()))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _save_summary(session_id: str, summary: str, previous_through: int, through: int) -> bool:
+    """Store a new summary unless another worker summarized the conversation meanwhile."""
+    from models import ChatConversation
+
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            update(ChatConversation)
+            .where(ChatConversation.id == session_id, ChatConversation.summarized_through == previous_through)
+            .values(summary=summary, summarized_through=through)
+        )
+        db.commit()
+        return result.rowcount == 1
+    finally:
+        db.close()
+
+
+# ==== Running summary ====
+
+_summarizing = set()
+_background = set()
+
+
+def turns_to_fold(turns: List[Turn], limit: int = CHAT_RECENT_TOKENS) -> List[Turn]:
+    """Oldest turns to fold into the summary: none until ``turns`` exceed ``limit``, then down to half of it."""
+    total = sum(TOKENS_PER_MESSAGE + t.tokens for t in turns)
+    if total <= limit:
+        return []
+    folded = []
+    for turn in turns:
+        if total <= limit // 2:
+            break
+        folded.append(turn)
+        total -= TOKENS_PER_MESSAGE + turn.tokens
+    return folded
+
+
+async def update_summary(session_id: str, model: str):
+    """Fold turns that fell out of the recent window into the conversation's summary."""
+    from openai_client import chat_completion
+
+    if session_id in _summarizing:
+        return
+    _summarizing.add(session_id)
+    try:
+        conversation = await run_in_threadpool(open_conversation, session_id)
+        folded = turns_to_fold(conversation.turns)
+        if not folded:
+            return
+        transcript = "\n".join(
+            f"{'Counselor' if t.role == 'user' else 'Assistant'}: {t.content}" for t in folded
+        )
+        response = await chat_completion(
+            model=model,
+            temperature=0.2,
+            max_tokens=CHAT_SUMMARY_MAX_TOKENS,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": (
+                    f"Current summary:\n{conversation.summary or '(none yet)'}\n\nNew messages:\n{transcript}"
+                )},
+            ],
+        )
+        summary = response.choices[0].message.content.strip()
+        await run_in_threadpool(_save_summary, session_id, summary, conversation.summarized_through, folded[-1].id)
+    except Exception as e:
+        # The turns stay unsummarized and are folded on a later turn
+        logger.warning("Updating the summary of conversation %s failed: %s", session_id, e)
+    finally:
+        _summarizing.discard(session_id)
+
+
+def schedule_summary(session_id: str, model: str):
+    """Update the summary after the response has gone out, off the request path."""
+    task = asyncio.get_running_loop().create_task(update_summary(session_id, model))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
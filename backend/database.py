@@ -1,27 +1,128 @@
+import logging
 import time
-from sqlalchemy import create_engine
+from datetime import datetime
+from typing import AsyncIterator
+from sqlalchemy import create_engine, inspect, make_url, text
 from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from config import (
+    DB_CONNECT_RETRIES, DB_CONNECT_RETRY_S, DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE_S,
+    DB_POOL_SIZE, DB_POOL_TIMEOUT_S,
+)
+from resources import LazyResource
 import os
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = os.getenv("DATABASE_URL")
-print("DATABASE_URL:", DATABASE_URL)
-print("sadasdasdasdasdasdasdasdasdasdasdasdasssssssssssssssssssssss")
-
-max_tries = 10
-wait_seconds = 2
-
-for i in range(max_tries):
-    try:
-        engine = create_engine(DATABASE_URL)
-        engine.connect()
-        break
-    except OperationalError:
-        print(f"Database not ready, retrying ({i+1}/{max_tries})...")
-        time.sleep(wait_seconds)
-else:
-    raise Exception("Failed to connect to database after multiple tries.")
+logger.info("DATABASE_URL: %s", make_url(DATABASE_URL).render_as_string(hide_password=True))
+
+# Async driver for each backend of DATABASE_URL
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def async_database_url(url):
+    """``url`` with its driver swapped for the async one, e.g. postgresql+asyncpg://."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend} databases")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
 
+def pool_options(url):
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT_S,
+        "pool_recycle": DB_POOL_RECYCLE_S,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+# Neither engine connects until first used; see wait_for_database()
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine(async_database_url(DATABASE_URL), **pool_options(DATABASE_URL))
+# expire_on_commit=False: attributes stay readable after commit without another (async) load
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
+
+
+def wait_for_database():
+    delay = DB_CONNECT_RETRY_S
+    for i in range(DB_CONNECT_RETRIES):
+        try:
+            with engine.connect():
+                return
+        except OperationalError:
+            if i == DB_CONNECT_RETRIES - 1:
+                break
+            logger.warning("Database not ready, retrying in %.0fs (%d/%d)...", delay, i + 1, DB_CONNECT_RETRIES)
+            time.sleep(delay)
+            delay = min(delay * 2, 30.0)
+    raise Exception("Failed to connect to database after multiple tries.")
+
+
+def add_missing_columns_and_indexes():
+    """Add nullable columns and indexes that were added to a model after its table was created.
+
+    ``create_all`` only creates missing tables, so this keeps existing
+    databases in step with additive model changes.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    logger.info("Adding column %s.%s (%s)", table.name, column.name, column_type)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+def init_database():
+    """Wait for the database to accept connections, then create missing tables and columns."""
+    import models  # registers the tables on Base.metadata
+    from log_storage import prepare_request_logs, create_partitions
+    from config import LOG_PARTITIONS_AHEAD
+
+    wait_for_database()
+    with engine.begin() as conn:
+        prepare_request_logs(conn)
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns_and_indexes()
+    if engine.dialect.name == "postgresql":
+        # Before the first log is written, so today's rows don't land in DEFAULT
+        create_partitions(datetime.utcnow().date(), LOG_PARTITIONS_AHEAD + 1)
+    return engine
+
+
+# Run by the startup warm-up task instead of at import time, so a slow
+# database doesn't keep /health from answering.
+database = LazyResource("database", init_database)
+
+
+async def get_session() -> AsyncIterator[AsyncSession]:
+    """FastAPI dependency: a session on the async engine, closed after the request.
+
+    Waits for ``database`` first, so tables exist before the first query.
+    Callers commit their own writes.
+    """
+    await database.aget()
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+async def dispose_engines():
+    """Close pooled connections on shutdown."""
+    await async_engine.dispose()
+    engine.dispose()
@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from cache import LRUCache, text_key
+
+
+class EmbeddingCache:
+    """Two-tier cache of embedding vectors keyed on (model name, text).
+
+    The first tier is an in-process LRU. The second is a SQLite file holding
+    raw float32 bytes, so the cache survives restarts and is shared by every
+    worker on the host. The disk tier is capped at ``disk_max_entries`` and
+    evicts the least recently used rows once it grows past the cap; the row
+    count is read in the same transaction as the insert, so inserts from
+    other workers count against the cap too. Either tier can be disabled by
+    giving it a size of 0.
+    """
+
+    def __init__(self, path: str, memory_size: int, disk_max_entries: int):
+        self.memory = LRUCache(memory_size)
+        self.disk_max_entries = max(0, disk_max_entries)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+
+        if self.disk_max_entries:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL,"
+                " vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        key = text_key(text, namespace=model)
+        vector = self.memory.get(key)
+        if vector is not None:
+            return vector
+
+        if self._conn is not None:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT dim, vector FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key)
+                    )
+                    self.disk_hits += 1
+            if row is not None:
+                dim, blob = row
+                vector = np.frombuffer(blob, dtype=np.float32, count=dim)
+                self.memory.put(key, vector)
+                return vector
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, model: str, text: str, vector: np.ndarray) -> None:
+        key = text_key(text, namespace=model)
+        vector = np.ascontiguousarray(vector, dtype=np.float32)
+        self.memory.put(key, vector)
+        if self._conn is None:
+            return
+
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so no other worker
+            # inserts between our COUNT(*) and the eviction
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                inserted = self._conn.execute(
+                    "INSERT OR IGNORE INTO embeddings (key, model, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, model, vector.shape[0], vector.tobytes(), time.time()),
+                ).rowcount
+                if inserted:
+                    size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                    overflow = size - self.disk_max_entries
+                    if overflow > 0:
+                        # Evict a little extra so we don't run a DELETE on every insert
+                        overflow += self.disk_max_entries // 100
+                        self.disk_evictions += self._conn.execute(
+                            "DELETE FROM embeddings WHERE key IN"
+                            " (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                            (overflow,),
+                        ).rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def disk_size(self) -> int:
+        if self._conn is None:
+            return 0
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self) -> dict:
+        memory = self.memory.stats()
+        lookups = memory["hits"] + self.disk_hits + self.misses
+        hits = memory["hits"] + self.disk_hits
+        return {
+            "memory": memory,
+            "disk": {
+                "enabled": self._conn is not None,
+                "size": self.disk_size(),
+                "max_entries": self.disk_max_entries,
+                "hits": self.disk_hits,
+                "evictions": self.disk_evictions,
+            },
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
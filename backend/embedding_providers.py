@@ -0,0 +1,233 @@
+"""Embedding providers shared by /api/examples and the index build script.
+
+A provider turns a list of texts into one float32 vector per text. Its
+``name`` identifies the vector space: it is stored in the index meta file
+and used as the embedding-cache namespace, so vectors from different
+providers are never mixed.
+"""
+import hashlib
+import os
+import random
+import shutil
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from batching import MicroBatcher
+
+
+class EmbeddingProvider:
+    name = ""
+    dim = 0
+
+    def embed(self, texts: List[str]) -> List[np.ndarray]:
+        raise NotImplementedError
+
+    def embed_one(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+    async def aembed_one(self, text: str) -> np.ndarray:
+        """``embed_one`` for request handlers, off the event loop."""
+        return await run_in_threadpool(self.embed_one, text)
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """The hosted embeddings API; one request per ``embed`` call.
+
+    ``embed`` uses the synchronous client returned by ``get_client`` (the
+    build script); ``aembed_one`` goes through the server's shared async
+    client.
+    """
+
+    dim = 1536
+
+    def __init__(self, get_client: Optional[Callable] = None, model: str = "text-embedding-3-small"):
+        self.get_client = get_client
+        self.name = model
+
+    def embed(self, texts):
+        response = self.get_client().embeddings.create(input=texts, model=self.name)
+        ordered = sorted(response.data, key=lambda item: item.index)
+        return [np.array(item.embedding, dtype=np.float32) for item in ordered]
+
+    async def aembed_one(self, text):
+        from openai_client import create_embeddings
+
+        (embedding,) = await create_embeddings(self.name, [text])
+        return np.array(embedding, dtype=np.float32)
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """A sentence-embedding transformer run on CPU.
+
+    Mean-pools the last hidden state over real tokens and L2-normalizes, the
+    recipe sentence-transformers models are trained for. Single queries go
+    through a MicroBatcher like the classifier, so concurrent /api/examples
+    requests share forward passes. ``quantize`` applies torch dynamic int8
+    quantization to the linear layers.
+    """
+
+    def __init__(self, model_name, max_length=256, quantize=False,
+                 max_batch_size=16, max_wait_ms=5.0, num_threads=0):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+        self._torch = torch
+        # Quantization only perturbs the vectors slightly, so both variants
+        # share a name and can search the same index
+        self.name = f"local:{model_name}"
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name)
+        model.eval()
+        if quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+        self.dim = model.config.hidden_size
+        self.batcher = MicroBatcher(
+            self.embed, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, name="local-embed"
+        )
+
+    def embed(self, texts):
+        torch = self._torch
+        inputs = self.tokenizer(texts, return_tensors="pt", truncation=True, padding=True,
+                                max_length=self.max_length)
+        with torch.no_grad():
+            hidden = self.model(**inputs).last_hidden_state
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        pooled = torch.nn.functional.normalize(pooled, dim=-1)
+        return list(pooled.numpy().astype(np.float32))
+
+    def embed_one(self, text):
+        return self.batcher.submit(text).result()
+
+    async def aembed_one(self, text):
+        return await self.batcher.run(text)
+
+
+class TransientEmbeddingError(Exception):
+    """Simulated API failure raised by HashingEmbeddingProvider."""
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Deterministic offline stand-in with no model and no network.
+
+    Hashes lowercased words into ``dim`` signed buckets and L2-normalizes,
+    so texts sharing vocabulary land close together. ``latency_s`` and
+    ``error_rate`` simulate a slow or flaky API for tests and benchmarks.
+    """
+
+    name = "local-hashing-v1"
+
+    def __init__(self, dim=1536, latency_s=0.0, error_rate=0.0):
+        self.dim = dim
+        self.latency_s = latency_s
+        self.error_rate = error_rate
+
+    def embed(self, texts):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        if self.error_rate and random.random() < self.error_rate:
+            raise TransientEmbeddingError("simulated embeddings API failure")
+        vectors = []
+        for text in texts:
+            vector = np.zeros(self.dim, dtype=np.float32)
+            for token in text.lower().split():
+                digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+            norm = np.linalg.norm(vector)
+            vectors.append(vector / norm if norm else vector)
+        return vectors
+
+
+PROVIDERS = ("openai", "local", "hashing")
+
+
+def create_provider(name, get_client=None, fake_latency_s=0.0, fake_error_rate=0.0):
+    """Build the provider called ``name``; ``get_client`` returns a synchronous OpenAI client."""
+    from config import (
+        LOCAL_EMBEDDING_MODEL,
+        LOCAL_EMBEDDING_QUANTIZE,
+        LOCAL_EMBEDDING_MAX_BATCH_SIZE,
+        LOCAL_EMBEDDING_MAX_WAIT_MS,
+    )
+
+    if name == "openai":
+        return OpenAIEmbeddingProvider(get_client)
+    if name == "local":
+        return LocalEmbeddingProvider(
+            LOCAL_EMBEDDING_MODEL,
+            quantize=LOCAL_EMBEDDING_QUANTIZE,
+            max_batch_size=LOCAL_EMBEDDING_MAX_BATCH_SIZE,
+            max_wait_ms=LOCAL_EMBEDDING_MAX_WAIT_MS,
+        )
+    if name == "hashing":
+        return HashingEmbeddingProvider(latency_s=fake_latency_s, error_rate=fake_error_rate)
+    raise ValueError(f"Unknown embedding provider {name!r}, expected one of {PROVIDERS}")
+
+
+def _corpus_stem(provider):
+    return "conversations" if provider == "openai" else f"conversations.{provider}"
+
+
+def _corpus_paths(stem, directory):
+    return (
+        os.path.join(directory, f"{stem}.index"),
+        os.path.join(directory, f"{stem}_meta.json"),
+        os.path.join(directory, f"{stem}.sqlite"),
+    )
+
+
+def corpus_files(provider, folder="./conversation_embeddings"):
+    """(index, meta, store) paths of the live corpus built with ``provider``.
+
+    The OpenAI corpus keeps the original file names; other providers get a
+    parallel set with the provider name in it. Each build has its own
+    directory under ``<stem>.builds`` and the ``<stem>.current`` file names
+    the live one (see ``publish_corpus``), so paths resolved once all belong
+    to the same build. Corpora built before that are read from ``folder``.
+    """
+    stem = _corpus_stem(provider)
+    pointer = os.path.join(folder, f"{stem}.current")
+    if os.path.exists(pointer):
+        with open(pointer, "r", encoding="utf-8") as f:
+            version = f.read().strip()
+        return _corpus_paths(stem, os.path.join(folder, f"{stem}.builds", version))
+    return _corpus_paths(stem, folder)
+
+
+def new_corpus_build(provider, folder="./conversation_embeddings"):
+    """Create the directory of a new build; returns (version, (index, meta, store) paths in it)."""
+    stem = _corpus_stem(provider)
+    version = f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{os.getpid()}"
+    directory = os.path.join(folder, f"{stem}.builds", version)
+    os.makedirs(directory)
+    return version, _corpus_paths(stem, directory)
+
+
+def publish_corpus(provider, version, folder="./conversation_embeddings", keep=3):
+    """Make ``version`` the live build and remove all but the ``keep`` newest builds.
+
+    The pointer file is replaced with one ``os.replace``, so readers see
+    either the old build or the new one. Servers pick it up on
+    POST /api/examples/reload; one still searching a removed build keeps
+    its open files.
+    """
+    stem = _corpus_stem(provider)
+    pointer = os.path.join(folder, f"{stem}.current")
+    with open(f"{pointer}.tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f"{pointer}.tmp", pointer)
+
+    builds = os.path.join(folder, f"{stem}.builds")
+    for old in sorted(os.listdir(builds))[:-keep]:
+        if old != version:
+            shutil.rmtree(os.path.join(builds, old), ignore_errors=True)
@@ -1,54 +1,188 @@
-from fastapi import APIRouter, Body
+from fastapi import APIRouter, Header, HTTPException
+from starlette.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 import faiss
 import json
+import logging
 import numpy as np
 import markdown
-from openai import OpenAI
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from config import (
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MEMORY_SIZE,
+    EMBEDDING_CACHE_DISK_MAX_ENTRIES,
+    EMBEDDING_PROVIDER,
+    EXAMPLES_NPROBE,
+    EXAMPLES_EF_SEARCH,
+    EXAMPLES_MIN_SIMILARITY,
+    EXAMPLES_MAX_K,
+    EXAMPLES_MMAP,
+    EXAMPLES_CORPUS_DIR,
+    ADMIN_TOKEN,
+)
+from embedding_cache import EmbeddingCache
+from embedding_providers import LocalEmbeddingProvider, corpus_files, create_provider
+from transcript_store import TranscriptStore, InMemoryTranscriptStore
+from metrics import stage_seconds
+from resources import LazyResource
+from pydantic import BaseModel, Field
+import vector_index
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-# ==== Load everything once ====
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
+# Unified layout written by data_exploration/generating_embeddings.py: one
+# index over all transcripts, build parameters in the meta file, and ids,
+# quality labels and texts in a SQLite store whose rows match the index rows.
+# Each embedding provider has its own set of files, in a directory per build;
+# corpus_files resolves the live one at every (re)load.
 
+# Legacy layout (OpenAI embeddings only): one flat index and text list per
+# quality tier
 HIGH_INDEX_FILE = "./conversation_embeddings/high_quality.index"
 LOW_INDEX_FILE = "./conversation_embeddings/low_quality.index"
 HIGH_TEXTS_FILE = "./conversation_embeddings/high_texts.json"
 LOW_TEXTS_FILE = "./conversation_embeddings/low_texts.json"
-
-# Load FAISS indexes
-high_index = faiss.read_index(HIGH_INDEX_FILE)
-low_index = faiss.read_index(LOW_INDEX_FILE)
-
-# Load texts
-with open(HIGH_TEXTS_FILE, "r", encoding="utf-8") as f:
-    high_texts = json.load(f)
-
-with open(LOW_TEXTS_FILE, "r", encoding="utf-8") as f:
-    low_texts = json.load(f)
+EMBEDDING_MODEL = "text-embedding-3-small"
+QUALITIES = ("high", "low")
+
+# ==== Load everything once, on first use or during warm-up ====
+
+class ConversationCorpus:
+    """A single FAISS index over all transcripts plus the matching transcript store."""
+
+    def __init__(self, index, store, model=None):
+        if index.ntotal != len(store):
+            raise ValueError(f"Index has {index.ntotal} rows but the transcript store has {len(store)}")
+        self.index = index
+        self.store = store
+        self.model = model
+        self.metric = vector_index.index_metric(index)
+        vector_index.configure_search(index, nprobe=EXAMPLES_NPROBE, ef_search=EXAMPLES_EF_SEARCH)
+
+    def search(self, query_embedding, k=1, min_similarity=None):
+        """Top ``k`` matches per quality tier from one search.
+
+        Asks the index for a few times ``k`` candidates and widens the search
+        only if a tier is still short and the cutoff hasn't been reached.
+        Texts are read from the store for the selected rows only.
+        """
+        ntotal = self.index.ntotal
+        fetch = min(ntotal, max(4 * k * len(QUALITIES), 16))
+        while True:
+            with stage_seconds.timer(stage="examples.faiss_search"):
+                distances, idxs = vector_index.search(self.index, query_embedding, fetch)
+            selected = {quality: [] for quality in QUALITIES}
+            below_cutoff = False
+            for distance, i in zip(distances[0], idxs[0]):
+                if i < 0:
+                    continue
+                score = vector_index.similarity(distance, self.metric)
+                if min_similarity is not None and score < min_similarity:
+                    below_cutoff = True
+                    break
+                tier = selected[self.store.qualities[i]]
+                if len(tier) < k:
+                    tier.append((int(i), float(distance), round(score, 4)))
+            complete = all(len(tier) >= k for tier in selected.values())
+            if complete or below_cutoff or fetch >= ntotal:
+                break
+            fetch = min(ntotal, fetch * 4)
+
+        results = {}
+        for quality, hits in selected.items():
+            with stage_seconds.timer(stage="examples.store_read"):
+                transcripts = self.store.get_many([row for row, _, _ in hits])
+            results[quality] = [
+                {"id": transcript_id, "text": text, "distance": distance, "similarity": score}
+                for (transcript_id, text), (_, distance, score) in zip(transcripts, hits)
+            ]
+        return results
+
+
+def _load_unified_corpus(index_file, meta_file, store_file):
+    index = vector_index.read_index(index_file, mmap=EXAMPLES_MMAP)
+    model = None
+    if os.path.exists(meta_file):
+        with open(meta_file, "r", encoding="utf-8") as f:
+            model = json.load(f).get("model")
+    return ConversationCorpus(index, TranscriptStore(store_file), model=model)
+
+
+def _load_legacy_corpus():
+    """Merge the two per-quality flat indexes into one flat index in memory."""
+    vectors, entries, texts = [], [], []
+    for quality, index_file, texts_file in (
+        ("high", HIGH_INDEX_FILE, HIGH_TEXTS_FILE),
+        ("low", LOW_INDEX_FILE, LOW_TEXTS_FILE),
+    ):
+        with open(texts_file, "r", encoding="utf-8") as f:
+            tier_texts = json.load(f)
+        vectors.append(vector_index.vectors_from_index(faiss.read_index(index_file)))
+        entries += [{"id": f"{quality}_{i}", "quality": quality} for i in range(len(tier_texts))]
+        texts += tier_texts
+    index = vector_index.build_index(np.concatenate(vectors), "flat", "l2")
+    return ConversationCorpus(index, InMemoryTranscriptStore(entries, texts), model=EMBEDDING_MODEL)
+
+
+def _load_corpus():
+    index_file, meta_file, store_file = corpus_files(EMBEDDING_PROVIDER, EXAMPLES_CORPUS_DIR)
+    if os.path.exists(index_file) and os.path.exists(store_file):
+        return _load_unified_corpus(index_file, meta_file, store_file)
+    if EMBEDDING_PROVIDER != "openai":
+        raise FileNotFoundError(
+            f"{index_file} / {store_file} not found; build them with "
+            f"generating_embeddings.py --provider {EMBEDDING_PROVIDER}"
+        )
+    logger.warning("%s / %s not found, falling back to the per-quality indexes", index_file, store_file)
+    return _load_legacy_corpus()
+
+
+def _warm_corpus(corpus):
+    corpus.search(np.zeros(corpus.index.d, dtype=np.float32), k=1)
+
+
+def _warm_provider(provider):
+    # A dummy forward pass for the local model; the hosted API isn't called
+    if isinstance(provider, LocalEmbeddingProvider):
+        provider.embed_one("warm-up query")
+
+
+conversation_corpus = LazyResource("conversation_corpus", _load_corpus, warmup=_warm_corpus)
+embedding_provider = LazyResource(
+    "embedding_provider",
+    lambda: create_provider(EMBEDDING_PROVIDER),
+    warmup=_warm_provider,
+)
+embedding_cache = LazyResource(
+    "embedding_cache",
+    lambda: EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MEMORY_SIZE, EMBEDDING_CACHE_DISK_MAX_ENTRIES),
+)
 
 # ==== Helper functions ====
 
-def embed_query(text):
-    response = client.embeddings.create(
-        input=text,
-        model="text-embedding-3-small"
-    )
-    return np.array(response.data[0].embedding, dtype=np.float32)
-
-def search_conversations(user_query, k=1):
-    query_embedding = embed_query(user_query).reshape(1, -1)
-
-    # Search top k in both indexes
-    _, high_idxs = high_index.search(query_embedding, k)
-    _, low_idxs = low_index.search(query_embedding, k)
-
-    high_results = [high_texts[i] for i in high_idxs[0]]
-    low_results = [low_texts[i] for i in low_idxs[0]]
-
-    return high_results, low_results
+async def embed_query(text):
+    provider = await embedding_provider.aget()
+    cache = await embedding_cache.aget()
+    with stage_seconds.timer(stage="examples.embed_query"):
+        # The disk tier is SQLite, so lookups and writes stay off the event loop
+        cached = await run_in_threadpool(cache.get, provider.name, text)
+        if cached is not None:
+            return cached
+
+        embedding = await provider.aembed_one(text)
+        await run_in_threadpool(cache.put, provider.name, text, embedding)
+        return embedding
+
+async def search_conversations(user_query, k=1, min_similarity=EXAMPLES_MIN_SIMILARITY):
+    """Top ``k`` high- and low-quality matches as lists of {id, text, distance, similarity}."""
+    corpus = await conversation_corpus.aget()
+    model = (await embedding_provider.aget()).name
+    if corpus.model is not None and corpus.model != model:
+        raise RuntimeError(f"Conversation index was built with {corpus.model}, queries use {model}")
+    query_embedding = await embed_query(user_query)
+    results = await run_in_threadpool(corpus.search, query_embedding, k, min_similarity)
+    return results["high"], results["low"]
 
 def format_message_history(message_history: List[Dict[str, Any]]) -> str:
     """Convert message history to a single text string for embedding."""
@@ -60,17 +194,55 @@ def format_message_history(message_history: List[Dict[str, Any]]) -> str:
     return formatted_text.strip()
 
 
+def _match_info(hits):
+    return [{k: hit[k] for k in ("id", "distance", "similarity")} for hit in hits]
+
+
 # ==== API Route ====
 
+class ExamplesRequest(BaseModel):
+    history: List[Dict[str, Any]] = []
+    # Values above EXAMPLES_MAX_K are capped rather than rejected
+    k: int = Field(1, ge=1)
+    minSimilarity: float = EXAMPLES_MIN_SIMILARITY
+
+
 @router.post("/examples")
-async def get_examples(request: Dict[str, Any] = Body(...)):
-    message_history = request.get("history", [])
-    query_text = format_message_history(message_history)
-    
-    high, low = search_conversations(query_text)
+async def get_examples(request: ExamplesRequest):
+    query_text = format_message_history(request.history)
+    k = min(request.k, EXAMPLES_MAX_K)
+    min_similarity = request.minSimilarity
+    high, low = await search_conversations(query_text, k=k, min_similarity=min_similarity)
 
     # Return JSON response with camelCase keys and array values
     return {
-        "highQuality": high,
-        "lowQuality": low
+        "highQuality": [hit["text"] for hit in high],
+        "lowQuality": [hit["text"] for hit in low],
+        "highQualityMatches": _match_info(high),
+        "lowQualityMatches": _match_info(low),
     }
+
+
+@router.get("/examples/stats")
+async def examples_stats():
+    provider = await embedding_provider.aget()
+    stats = {"provider": provider.name, "embedding_cache": (await embedding_cache.aget()).stats()}
+    if isinstance(provider, LocalEmbeddingProvider):
+        stats["batcher"] = provider.batcher.stats()
+    return stats
+
+
+@router.post("/examples/reload")
+async def reload_examples(x_admin_token: Optional[str] = Header(None)):
+    """Swap in the build the corpus pointer now names, without a restart.
+
+    Requests already searching keep the old pair until they finish. If the
+    new files fail to load (or don't match each other) the old pair stays.
+    """
+    if not ADMIN_TOKEN or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+    try:
+        corpus = await run_in_threadpool(conversation_corpus.reload)
+    except Exception as e:
+        raise HTTPException(status_code=409, detail=f"Reload failed, keeping the current corpus: {e}")
+    return {"status": "reloaded", "conversations": corpus.index.ntotal}
@@ -0,0 +1,92 @@
+"""Export the fine-tuned topic classifier to ONNX.
+
+Run from the backend directory:
+
+    python export_onnx.py            # writes model.onnx and model.int8.onnx
+    python export_onnx.py --no-int8  # fp32 only
+
+The files land in categorize.ONNX_DIR, where ``CLASSIFIER_BACKEND=onnx`` or
+``CLASSIFIER_BACKEND=onnx-int8`` will pick them up. Check the result with
+``python -m benchmarks.onnx_parity`` before switching backends.
+"""
+import argparse
+import os
+
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+from categorize import MODEL_DIR, MODEL_NAME, ONNX_DIR, ONNX_FILES
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Return a plain logits tensor so the graph has a single named output."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+
+def export_fp32(model_dir, output_path, opset):
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+    model.eval()
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    sample = tokenizer(
+        ["I feel anxious all the time.", "My partner and I argue about everything lately."],
+        return_tensors="pt",
+        padding=True,
+    )
+
+    torch.onnx.export(
+        _LogitsOnly(model),
+        (sample["input_ids"], sample["attention_mask"]),
+        output_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"},
+        },
+        opset_version=opset,
+        do_constant_folding=True,
+        dynamo=False,
+    )
+
+
+def quantize_int8(input_path, output_path):
+    """Dynamic quantization: int8 weights, activations quantized per batch at runtime."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(input_path, output_path, weight_type=QuantType.QInt8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the topic classifier to ONNX")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--output-dir", default=ONNX_DIR)
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--no-int8", action="store_true", help="skip the quantized variant")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    fp32_path = os.path.join(args.output_dir, ONNX_FILES["onnx"])
+
+    print(f"Exporting {args.model_dir} to {fp32_path}...")
+    export_fp32(args.model_dir, fp32_path, args.opset)
+
+    if not args.no_int8:
+        int8_path = os.path.join(args.output_dir, ONNX_FILES["onnx-int8"])
+        print(f"Quantizing to {int8_path}...")
+        quantize_int8(fp32_path, int8_path)
+
+    for name in sorted(os.listdir(args.output_dir)):
+        size_mb = os.path.getsize(os.path.join(args.output_dir, name)) / 1e6
+        print(f"  {name}: {size_mb:.1f} MB")
+    print("All done ✅")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+"""Request-log storage: daily partitions, retention and hourly rollups.
+
+On Postgres ``request_logs`` is a table range-partitioned by day on
+``timestamp``, with a DEFAULT partition catching anything outside the
+prepared range. A maintenance pass (``run_maintenance``) refreshes the
+``request_log_rollups`` table, creates the next few daily partitions and
+drops or detaches expired ones. Other databases (SQLite in development and
+benchmarks) get a plain table; retention there deletes rows.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+from fastapi import APIRouter, Query
+from sqlalchemy import delete, func, insert, inspect, select, text
+from sqlalchemy.schema import CreateColumn
+from starlette.concurrency import run_in_threadpool
+
+from config import (
+    LOG_MAINTENANCE_INTERVAL_S,
+    LOG_PARTITIONS_AHEAD,
+    LOG_RETENTION_ACTION,
+    LOG_RETENTION_DAYS,
+    LOG_ROLLUP_RETENTION_DAYS,
+)
+from database import async_engine, database, engine
+from log_writer import request_log_writer
+from models import RequestLog, RequestLogRollup
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = "request_logs_p"
+ID_SEQUENCE = "request_logs_id_seq"
+
+router = APIRouter()
+_last_maintenance: Optional[datetime] = None
+
+
+def _is_postgres(conn) -> bool:
+    return conn.dialect.name == "postgresql"
+
+
+# ==== Partitioning (Postgres) ====
+
+def prepare_request_logs(conn):
+    """Create ``request_logs`` as a partitioned table; run before ``create_all``.
+
+    A pre-existing unpartitioned table is renamed to
+    ``request_logs_legacy_<timestamp>`` (with its indexes and id sequence)
+    and its rows within the retention window are copied into the new table
+    (see ``_copy_legacy_rows``); the legacy table is kept for archiving.
+    On any database, rollups from before they were grouped by route are
+    dropped to be rebuilt.
+    """
+    _drop_path_rollups(conn)
+    if not _is_postgres(conn):
+        return
+    legacy = None
+    if inspect(conn).has_table("request_logs"):
+        partitioned = conn.execute(text(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = 'request_logs'"
+        )).first()
+        if partitioned:
+            return
+        legacy = _rename_legacy_table(conn)
+
+    # Identity columns on partitioned tables need Postgres 17, so ids come
+    # from a plain sequence
+    conn.execute(text(f"CREATE SEQUENCE IF NOT EXISTS {ID_SEQUENCE} AS bigint"))
+    columns = ",\n  ".join(
+        f"id BIGINT NOT NULL DEFAULT nextval('{ID_SEQUENCE}')" if c.name == "id"
+        else str(CreateColumn(c).compile(dialect=conn.dialect))
+        for c in RequestLog.__table__.columns
+    )
+    # The partition key has to be part of the primary key
+    conn.execute(text(
+        f'CREATE TABLE request_logs (\n  {columns},\n  PRIMARY KEY (id, "timestamp")\n) '
+        'PARTITION BY RANGE ("timestamp")'
+    ))
+    conn.execute(text(f"ALTER SEQUENCE {ID_SEQUENCE} OWNED BY request_logs.id"))
+    conn.execute(text("CREATE TABLE request_logs_default PARTITION OF request_logs DEFAULT"))
+    logger.info("Created partitioned request_logs table")
+    if legacy:
+        _copy_legacy_rows(conn, legacy)
+
+
+def _drop_path_rollups(conn):
+    """Drop a ``request_log_rollups`` table still grouped by raw path instead of route.
+
+    Rollups are derived data: ``create_all`` recreates the table and the
+    next refresh recomputes it from the raw logs still kept.
+    """
+    inspector = inspect(conn)
+    if inspector.has_table("request_log_rollups") and \
+            "route" not in {c["name"] for c in inspector.get_columns("request_log_rollups")}:
+        conn.execute(text("DROP TABLE request_log_rollups"))
+        logger.warning("Dropped request_log_rollups grouped by path; it is rebuilt by route")
+
+
+def _rename_legacy_table(conn) -> str:
+    legacy = f"request_logs_legacy_{datetime.utcnow():%Y%m%d%H%M%S}"
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence('request_logs', 'id')")).scalar()
+    indexes = conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = 'request_logs'")).scalars().all()
+    conn.execute(text(f"ALTER TABLE request_logs RENAME TO {legacy}"))
+    for index in indexes:
+        conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{(legacy + "_" + index)[:63]}"'))
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO {legacy}_id_seq"))
+    logger.warning("Renamed the unpartitioned request_logs table to %s", legacy)
+    return legacy
+
+
+# Legacy bodies are text: JSON where they parse, else a JSON string, as log_writer stores them
+_LEGACY_BODY_FUNCTION = """
+CREATE FUNCTION pg_temp.request_log_body(body text) RETURNS jsonb AS $$
+BEGIN
+    RETURN body::jsonb;
+EXCEPTION WHEN others THEN
+    RETURN to_jsonb(body);
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def _copy_legacy_rows(conn, legacy):
+    """Copy a legacy table's rows within LOG_RETENTION_DAYS into ``request_logs``.
+
+    Daily partitions for the copied days are created first, so the rows
+    don't end up in DEFAULT (which would keep those days' partitions from
+    being created). Older rows and rows without a timestamp stay in the
+    legacy table only.
+    """
+    legacy_types = dict(conn.execute(text(
+        "SELECT column_name, data_type FROM information_schema.columns WHERE table_name = :table"
+    ), {"table": legacy}).all())
+    window = 'WHERE "timestamp" IS NOT NULL'
+    params = {}
+    if LOG_RETENTION_DAYS > 0:
+        window += ' AND "timestamp" >= :since'
+        params["since"] = datetime.combine(
+            (datetime.utcnow() - timedelta(days=LOG_RETENTION_DAYS)).date(), datetime.min.time()
+        )
+    first, last = conn.execute(text(f'SELECT min("timestamp"), max("timestamp") FROM {legacy} {window}'), params).one()
+    if first is None:
+        return
+
+    day = first.date()
+    while day <= last.date():
+        conn.execute(text(_partition_ddl(day)[1]))
+        day += timedelta(days=1)
+
+    names, values = [], []
+    for column in RequestLog.__table__.columns:
+        if column.name not in legacy_types:
+            continue
+        names.append(f'"{column.name}"')
+        if column.name in ("request_body", "response_body") and legacy_types[column.name] != "jsonb":
+            values.append(f'pg_temp.request_log_body("{column.name}"::text)')
+        else:
+            values.append(f'"{column.name}"')
+    conn.execute(text(_LEGACY_BODY_FUNCTION))
+    copied = conn.execute(text(
+        f"INSERT INTO request_logs ({', '.join(names)}) SELECT {', '.join(values)} FROM {legacy} {window}"
+    ), params).rowcount
+    conn.execute(text("DROP FUNCTION pg_temp.request_log_body(text)"))
+    conn.execute(text(f"SELECT setval('{ID_SEQUENCE}', (SELECT max(id) FROM request_logs))"))
+    logger.info("Copied %d rows from %s into request_logs", copied, legacy)
+
+
+def _partition_ddl(day):
+    name = f"{PARTITION_PREFIX}{day:%Y%m%d}"
+    return name, (
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF request_logs "
+        f"FOR VALUES FROM ('{day:%Y-%m-%d}') TO ('{day + timedelta(days=1):%Y-%m-%d}')"
+    )
+
+
+def _partition_day(name):
+    try:
+        return datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def daily_partitions(conn):
+    """{day: table name} of the attached daily partitions."""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'request_logs'"
+    )).scalars().all()
+    return {day: name for name in names if (day := _partition_day(name)) is not None}
+
+
+def create_partitions(first_day, days):
+    """Daily partitions from ``first_day`` on; each in its own transaction.
+
+    Creating a partition fails if the DEFAULT partition already holds rows
+    for that day. That day's rows then stay in DEFAULT and the error is
+    reported.
+    """
+    with engine.connect() as conn:
+        existing = daily_partitions(conn)
+    for i in range(days):
+        day = first_day + timedelta(days=i)
+        if day in existing:
+            continue
+        name, ddl = _partition_ddl(day)
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(ddl))
+        except Exception as e:
+            logger.error("Could not create partition %s: %s: %s", name, type(e).__name__, e)
+
+
+# ==== Retention ====
+
+def apply_retention(now):
+    if LOG_RETENTION_DAYS > 0:
+        cutoff = (now - timedelta(days=LOG_RETENTION_DAYS)).date()
+        with engine.begin() as conn:
+            if _is_postgres(conn):
+                for day, name in sorted(daily_partitions(conn).items()):
+                    if day >= cutoff:
+                        continue
+                    if LOG_RETENTION_ACTION == "detach":
+                        conn.execute(text(f"ALTER TABLE request_logs DETACH PARTITION {name}"))
+                        logger.info("Detached expired log partition %s; archive it and drop it when done", name)
+                    else:
+                        conn.execute(text(f"DROP TABLE {name}"))
+                        logger.info("Dropped expired log partition %s", name)
+            else:
+                cutoff_time = datetime.combine(cutoff, datetime.min.time())
+                conn.execute(delete(RequestLog).where(RequestLog.timestamp < cutoff_time))
+
+    if LOG_ROLLUP_RETENTION_DAYS > 0:
+        with engine.begin() as conn:
+            conn.execute(delete(RequestLogRollup).where(
+                RequestLogRollup.hour < now - timedelta(days=LOG_ROLLUP_RETENTION_DAYS)
+            ))
+
+
+# ==== Hourly rollups ====
+
+_POSTGRES_ROLLUP = """
+INSERT INTO request_log_rollups
+    (hour, method, route, count, error_count, avg_ms, p50_ms, p95_ms, p99_ms, max_ms, response_bytes)
+SELECT date_trunc('hour', "timestamp"), method, route,
+       count(*),
+       count(*) FILTER (WHERE status_code >= 500),
+       avg(duration_ms),
+       percentile_cont(0.5) WITHIN GROUP (ORDER BY duration_ms),
+       percentile_cont(0.95) WITHIN GROUP (ORDER BY duration_ms),
+       percentile_cont(0.99) WITHIN GROUP (ORDER BY duration_ms),
+       max(duration_ms),
+       sum(response_bytes)
+FROM request_logs
+WHERE "timestamp" >= :start AND method IS NOT NULL AND route IS NOT NULL
+GROUP BY 1, 2, 3
+ON CONFLICT (hour, method, route) DO UPDATE SET
+    count = EXCLUDED.count, error_count = EXCLUDED.error_count, avg_ms = EXCLUDED.avg_ms,
+    p50_ms = EXCLUDED.p50_ms, p95_ms = EXCLUDED.p95_ms, p99_ms = EXCLUDED.p99_ms,
+    max_ms = EXCLUDED.max_ms, response_bytes = EXCLUDED.response_bytes
+"""
+
+
+def refresh_rollups():
+    """Recompute rollups from the last rolled-up hour (which may have been partial) on."""
+    with engine.begin() as conn:
+        start = conn.execute(select(func.max(RequestLogRollup.hour))).scalar()
+        if start is None:
+            start = conn.execute(select(func.min(RequestLog.timestamp))).scalar()
+            if start is None:
+                return
+        start = start.replace(minute=0, second=0, microsecond=0)
+        if _is_postgres(conn):
+            conn.execute(text(_POSTGRES_ROLLUP), {"start": start})
+        else:
+            _refresh_rollups_generic(conn, start)
+
+
+def _refresh_rollups_generic(conn, start):
+    """Same aggregation in Python, for databases without percentile_cont."""
+    groups = defaultdict(lambda: {"count": 0, "errors": 0, "durations": [], "bytes": 0})
+    rows = conn.execute(
+        select(RequestLog.timestamp, RequestLog.method, RequestLog.route, RequestLog.status_code,
+               RequestLog.duration_ms, RequestLog.response_bytes)
+        .where(RequestLog.timestamp >= start, RequestLog.method.isnot(None), RequestLog.route.isnot(None))
+    )
+    for timestamp, method, route, status_code, duration_ms, response_bytes in rows:
+        group = groups[(timestamp.replace(minute=0, second=0, microsecond=0), method, route)]
+        group["count"] += 1
+        group["errors"] += int((status_code or 0) >= 500)
+        group["bytes"] += response_bytes or 0
+        if duration_ms is not None:
+            group["durations"].append(duration_ms)
+
+    conn.execute(delete(RequestLogRollup).where(RequestLogRollup.hour >= start))
+    records = []
+    for (hour, method, route), group in groups.items():
+        durations = np.array(group["durations"])
+        p50, p95, p99 = np.percentile(durations, [50, 95, 99]).tolist() if len(durations) else (None,) * 3
+        records.append({
+            "hour": hour, "method": method, "route": route,
+            "count": group["count"], "error_count": group["errors"],
+            "avg_ms": float(durations.mean()) if len(durations) else None,
+            "p50_ms": p50, "p95_ms": p95, "p99_ms": p99,
+            "max_ms": float(durations.max()) if len(durations) else None,
+            "response_bytes": group["bytes"],
+        })
+    if records:
+        conn.execute(insert(RequestLogRollup), records)
+
+
+# ==== Maintenance ====
+
+def run_maintenance(now=None):
+    """Refresh rollups, prepare upcoming partitions and apply retention.
+
+    Rollups run first so expiring rows are aggregated before they go.
+    """
+    global _last_maintenance
+    now = now or datetime.utcnow()
+    refresh_rollups()
+    if engine.dialect.name == "postgresql":
+        create_partitions(now.date(), LOG_PARTITIONS_AHEAD + 1)
+    apply_retention(now)
+    _last_maintenance = now
+
+
+async def maintenance_loop():
+    """Run ``run_maintenance`` every LOG_MAINTENANCE_INTERVAL_S once the database is up."""
+    while True:
+        if database.ready:
+            try:
+                await run_in_threadpool(run_maintenance)
+            except Exception:
+                logger.exception("Request log maintenance failed")
+        await asyncio.sleep(LOG_MAINTENANCE_INTERVAL_S if database.ready else 5)
+
+
+# ==== API Route ====
+
+async def _rollup_rows(since, route):
+    query = select(RequestLogRollup).where(RequestLogRollup.hour >= since)
+    if route:
+        query = query.where(RequestLogRollup.route == route)
+    query = query.order_by(RequestLogRollup.hour, RequestLogRollup.route, RequestLogRollup.method)
+    async with async_engine.connect() as conn:
+        return [dict(row._mapping) for row in await conn.execute(query)]
+
+
+@router.get("/logs/stats")
+async def log_stats(hours: int = Query(24, ge=1, le=24 * 366), route: Optional[str] = None):
+    """Log writer counters plus hourly per-route rollups for the last ``hours``.
+
+    Rollups are grouped by route template (``/api/summarization/jobs/{job_id}``),
+    so ``route`` filters on a template rather than a concrete path. They are
+    as fresh as the last maintenance run (``refreshed_at``).
+    """
+    stats = {
+        "writer": request_log_writer.stats(),
+        "refreshed_at": _last_maintenance.isoformat() if _last_maintenance else None,
+    }
+    if not database.ready:
+        return {**stats, "hourly": [], "endpoints": []}
+
+    since = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=hours - 1)
+    hourly = await _rollup_rows(since, route)
+
+    endpoints = defaultdict(lambda: {"count": 0, "error_count": 0, "max_p99_ms": None})
+    for row in hourly:
+        row.pop("id", None)
+        endpoint = endpoints[(row["method"], row["route"])]
+        endpoint["count"] += row["count"]
+        endpoint["error_count"] += row["error_count"]
+        if row["p99_ms"] is not None:
+            endpoint["max_p99_ms"] = max(endpoint["max_p99_ms"] or 0.0, row["p99_ms"])
+        row["hour"] = row["hour"].isoformat()
+
+    return {
+        **stats,
+        "since": since.isoformat(),
+        "endpoints": [{"method": method, "route": r, **totals} for (method, r), totals in endpoints.items()],
+        "hourly": hourly,
+    }
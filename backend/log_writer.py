@@ -0,0 +1,197 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from config import LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL_MS, LOG_QUEUE_SIZE
+from database import SessionLocal, database
+from metrics import Counter, Histogram
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+log_write_seconds = Histogram(
+    "log_writer_batch_write_seconds",
+    "Time to insert one batch of queued records",
+    labelnames=("writer",),
+)
+log_records = Counter(
+    "log_writer_records_total",
+    "Records handed to a background writer",
+    labelnames=("writer", "outcome"),  # outcome: written | dropped | failed
+)
+
+
+class LogWriter:
+    """Writes records to the database in bulk from a background thread.
+
+    ``submit`` never blocks: it puts the record on a bounded queue, or drops
+    and counts it when the queue is full. The worker thread takes the first
+    queued record, keeps gathering until ``batch_size`` records are collected
+    or ``flush_interval_ms`` has passed, and hands the batch to
+    ``write_batch``. A batch that fails to write is counted and discarded.
+    """
+
+    def __init__(
+        self,
+        write_batch: Callable[[List[Dict[str, Any]]], None],
+        max_queue_size: int = 10000,
+        batch_size: int = 200,
+        flush_interval_ms: float = 1000.0,
+        name: str = "log-writer",
+    ):
+        self.write_batch = write_batch
+        self.max_queue_size = max(1, max_queue_size)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval_ms) / 1000.0
+        self.name = name
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=self.max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+        self._submitted = 0
+        self._dropped = 0
+        self._written = 0
+        self._failed = 0
+        self._batches = 0
+        self._last_write_ms = 0.0
+
+    # ==== Public API ====
+
+    def submit(self, record: Dict[str, Any]) -> bool:
+        """Queue one record; False if it was dropped because the queue is full."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+            log_records.inc(writer=self.name, outcome="dropped")
+            return False
+        with self._lock:
+            self._submitted += 1
+        return True
+
+    def stats(self) -> dict:
+        batches = self._batches
+        return {
+            "submitted": self._submitted,
+            "written": self._written,
+            "dropped": self._dropped,
+            "failed": self._failed,
+            "batches": batches,
+            "avg_batch_size": round(self._written / batches, 2) if batches else 0.0,
+            "last_write_ms": round(self._last_write_ms, 2),
+            "queue_depth": self._queue.qsize(),
+            "max_queue_size": self.max_queue_size,
+            "batch_size": self.batch_size,
+            "flush_interval_ms": self.flush_interval * 1000.0,
+        }
+
+    def close(self, timeout: float = 10.0):
+        """Write everything still queued, then stop the worker thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stopping.set()
+        try:
+            self._queue.put_nowait(_STOP)  # wake the worker if it's idle
+        except queue.Full:
+            pass
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.error("%s: gave up waiting for the final flush, %d logs unwritten", self.name, self._queue.qsize())
+
+    # ==== Worker ====
+
+    def _ensure_started(self):
+        if self._thread is not None or self._stopping.is_set():
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._worker, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # When stopping, take only what's already queued
+                if remaining > 0 and not self._stopping.is_set():
+                    entry = self._queue.get(timeout=remaining)
+                else:
+                    entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not _STOP:
+                batch.append(entry)
+        return batch
+
+    def _worker(self):
+        while True:
+            if self._stopping.is_set() and self._queue.empty():
+                return
+            try:
+                first = self._queue.get(timeout=max(self.flush_interval, 0.1))
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+            if first is _STOP:
+                continue
+            self._write(self._collect(first))
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        try:
+            self.write_batch(batch)
+        except Exception as e:
+            logger.error("%s: failed to write %d logs: %s: %s", self.name, len(batch), type(e).__name__, e)
+            with self._lock:
+                self._failed += len(batch)
+            log_records.inc(len(batch), writer=self.name, outcome="failed")
+            return
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._written += len(batch)
+            self._batches += 1
+            self._last_write_ms = elapsed * 1000
+        log_write_seconds.observe(elapsed, writer=self.name)
+        log_records.inc(len(batch), writer=self.name, outcome="written")
+
+
+def write_request_logs(records):
+    """One multi-row INSERT into request_logs.
+
+    ``database.get()`` waits for the startup connection check and table
+    creation, so logs of requests served while the database warms up are
+    held in the queue instead of being lost.
+    """
+    from models import RequestLog
+
+    database.get()
+    db = SessionLocal()
+    try:
+        db.execute(insert(RequestLog), records)
+        db.commit()
+    finally:
+        db.close()
+
+
+request_log_writer = LogWriter(
+    write_request_logs,
+    max_queue_size=LOG_QUEUE_SIZE,
+    batch_size=LOG_BATCH_SIZE,
+    flush_interval_ms=LOG_FLUSH_INTERVAL_MS,
+    name="request-log-writer",
+)
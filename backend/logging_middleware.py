@@ -1,69 +1,98 @@
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
-from sqlalchemy.orm import Session
-from database import SessionLocal
-from models import RequestLog
 import json
+import time
+from datetime import datetime
+from log_writer import request_log_writer
+from request_metrics import route_label
 
 EXCLUDED_PATHS = {"/openapi.json", "/docs", "/docs/oauth2-redirect", "/redoc", "/favicon.ico"}
-MAX_BODY_LENGTH = 1000  # Limit request/response body size for logging
+MAX_BODY_LENGTH = 1000  # Bytes of each request/response body kept in the log
 
-class DBLoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Skip logging certain paths
-        if request.url.path in EXCLUDED_PATHS:
-            return await call_next(request)
 
-        # Capture request body
-        body_bytes = await request.body()
-        try:
-            body_text = body_bytes.decode('utf-8')
-            # Pretty print if JSON
-            body_json = json.loads(body_text)
-            body_text = json.dumps(body_json, indent=2)
-        except (UnicodeDecodeError, json.JSONDecodeError):
-            body_text = body_bytes.decode('utf-8', errors='ignore')
-
-        # Truncate if too big
-        if len(body_text) > MAX_BODY_LENGTH:
-            body_text = body_text[:MAX_BODY_LENGTH] + "... [TRUNCATED]"
-
-        # Process the actual request
-        response = await call_next(request)
-
-        # Capture response body if possible
-        response_body = b""
-        async for chunk in response.body_iterator:
-            response_body += chunk
-        response.body_iterator = iterate_in_memory(response_body)
+class BodyTee:
+    """Keeps the first ``limit`` bytes of a body passing through and counts the rest."""
 
-        try:
-            response_text = response_body.decode('utf-8')
-            response_json = json.loads(response_text)
-            response_text = json.dumps(response_json, indent=2)
-        except (UnicodeDecodeError, json.JSONDecodeError):
-            response_text = response_body.decode('utf-8', errors='ignore')
+    def __init__(self, limit: int = MAX_BODY_LENGTH):
+        self.limit = limit
+        self.head = bytearray()
+        self.size = 0
 
-        if len(response_text) > MAX_BODY_LENGTH:
-            response_text = response_text[:MAX_BODY_LENGTH] + "... [TRUNCATED]"
+    def add(self, chunk: bytes):
+        self.size += len(chunk)
+        room = self.limit - len(self.head)
+        if room > 0:
+            self.head += chunk[:room]
 
-        # Save to DB
-        db: Session = SessionLocal()
+    def value(self):
+        """The body as parsed JSON if it is JSON and fit entirely, else as text.
+
+        NUL characters are removed because Postgres JSONB can't store them.
+        """
+        text = self.head.decode("utf-8", errors="ignore").replace("\x00", "")
+        if self.size > self.limit:
+            return text + "... [TRUNCATED]"
         try:
-            log = RequestLog(
-                method=request.method,
-                path=str(request.url.path),
-                request_body=body_text,
-                response_body=response_text,
-                status_code=response.status_code,
-            )
-            db.add(log)
-            db.commit()
-        finally:
-            db.close()
+            return json.loads(text)
+        except ValueError:
+            return text
+
+
+class DBLoggingMiddleware:
+    """Pure ASGI middleware that logs every request to the database.
+
+    Request and response chunks are forwarded as soon as they arrive, so
+    streaming responses stay streamed; only the first MAX_BODY_LENGTH bytes
+    of each direction are copied for the log. Also records time to first
+    response byte, total duration and response size.
+    """
 
-        return response
+    def __init__(self, app):
+        self.app = app
 
-async def iterate_in_memory(data: bytes):
-    yield data
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXCLUDED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        # Stamped now rather than by the database, which may insert it seconds later
+        timestamp = datetime.utcnow()
+        start = time.perf_counter()
+        request_body = BodyTee()
+        response_body = BodyTee()
+        status_code = 500
+        first_byte = None
+
+        async def logged_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                request_body.add(message.get("body", b""))
+            return message
+
+        async def logged_send(message):
+            nonlocal status_code, first_byte
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                if first_byte is None and (body or not message.get("more_body", False)):
+                    first_byte = time.perf_counter()
+                response_body.add(body)
+            await send(message)
+
+        try:
+            await self.app(scope, logged_receive, logged_send)
+        finally:
+            end = time.perf_counter()
+            # Queued for the background writer; the response doesn't wait for the DB
+            request_log_writer.submit({
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route_label(scope),
+                "request_body": request_body.value(),
+                "response_body": response_body.value(),
+                "status_code": status_code,
+                "timestamp": timestamp,
+                "ttfb_ms": None if first_byte is None else (first_byte - start) * 1000,
+                "duration_ms": (end - start) * 1000,
+                "request_bytes": request_body.size,
+                "response_bytes": response_body.size,
+            })
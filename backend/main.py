@@ -1,23 +1,72 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from categorize import router as categorize_router
-from examples import router as examples_router
-from advice import router as advice_router
-from chat import router as chat_router
-from summarization import router as summarization_router
-from database import Base, engine
-from logging_middleware import DBLoggingMiddleware
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from config import LOG_LEVEL
+
+# Before the imports below, so messages logged while loading them are shown
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+# A line per OpenAI request and per faiss import attempt is too much at INFO
+for noisy in ("httpx", "httpcore", "faiss.loader"):
+    logging.getLogger(noisy).setLevel(max(logging.getLogger().level, logging.WARNING))
+
+from resources import timed_import, warm_up_all, readiness, all_ready, startup_report
+
+with timed_import("fastapi"):
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse
+with timed_import("database"):
+    from database import database, dispose_engines
+with timed_import("categorize"):
+    from categorize import router as categorize_router
+with timed_import("examples"):
+    from examples import router as examples_router
+with timed_import("advice"):
+    from advice import router as advice_router
+with timed_import("chat"):
+    from chat import router as chat_router
+with timed_import("summarization"):
+    from summarization import router as summarization_router
+with timed_import("summarization_jobs"):
+    from summarization_jobs import job_queue, router as summarization_jobs_router
+with timed_import("openai_client"):
+    from openai_client import router as openai_router
+with timed_import("logging_middleware"):
+    from logging_middleware import DBLoggingMiddleware
+    from log_writer import request_log_writer
+    from log_storage import maintenance_loop, router as logs_router
+    from request_metrics import RequestMetricsMiddleware, router as metrics_router
+from config import WARMUP_ON_STARTUP
+from starlette.concurrency import run_in_threadpool
 import os
 
 # Load environment
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-print("Starting FastAPI...")
+logging.getLogger(__name__).info("Starting FastAPI...")
 
-# Create tables
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Heavy resources (DB, classifier, FAISS indexes, OpenAI client) load in the
+    # background so /health answers immediately; /ready reports progress.
+    warmup_task = asyncio.create_task(warm_up_all()) if WARMUP_ON_STARTUP else None
+    # Request-log rollups, partitions and retention
+    maintenance_task = asyncio.create_task(maintenance_loop())
+    # Summarization workers; re-queues jobs left unfinished by the last run
+    jobs_task = asyncio.create_task(job_queue.start())
+    yield
+    maintenance_task.cancel()
+    jobs_task.cancel()
+    await job_queue.stop()
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    # Write the request logs still queued before the process exits
+    await run_in_threadpool(request_log_writer.close)
+    await dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 # Middlewares
@@ -29,6 +78,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so in-flight counts and durations cover the other middlewares too
+app.add_middleware(RequestMetricsMiddleware)
 
 # Routes
 app.include_router(categorize_router, prefix="/api")
@@ -36,6 +87,11 @@ app.include_router(examples_router, prefix="/api")
 app.include_router(advice_router, prefix="/api")
 app.include_router(chat_router, prefix="/api")
 app.include_router(summarization_router, prefix="/api")
+app.include_router(summarization_jobs_router, prefix="/api")
+app.include_router(logs_router, prefix="/api")
+app.include_router(openai_router, prefix="/api")
+# Prometheus scrapes /metrics by default, so it is not under /api
+app.include_router(metrics_router)
 
 # Optional root route
 @app.get("/")
@@ -46,3 +102,22 @@ def read_root():
 @app.head("/health")
 def health_check():
     return {"status": "healthy"}
+
+@app.get("/ready")
+def ready_check():
+    """503 until every heavy resource has loaded, with per-resource state."""
+    resources = readiness()
+    if all_ready():
+        status = "ready"
+    elif any(r["state"] == "failed" for r in resources.values()):
+        status = "failed"
+    else:
+        status = "loading"
+    return JSONResponse(
+        status_code=200 if status == "ready" else 503,
+        content={
+            "status": status,
+            "resources": resources,
+            "startup": startup_report(),
+        },
+    )
@@ -0,0 +1,202 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+# Seconds; roughly log-spaced from 5 ms to a minute
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Seconds, for in-process stages (tokenizing, index search) that take well under a millisecond
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+REGISTRY: List[object] = []  # Histograms, Gauges and Counters, in creation order
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set, Prometheus-style.
+
+    ``observe(value, **labels)`` is thread-safe. ``summary()`` estimates
+    percentiles by interpolating inside the bucket the rank falls in, the
+    same way Prometheus' histogram_quantile does.
+    """
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], dict] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            # First bucket whose upper bound is >= value; the extra last slot is +Inf
+            series["counts"][bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def timer(self, **labels):
+        """Observe the seconds spent inside the ``with`` block, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def series(self):
+        """[(labels, cumulative bucket counts incl. +Inf, sum, count)]"""
+        with self._lock:
+            items = [(key, list(s["counts"]), s["sum"], s["count"]) for key, s in self._series.items()]
+        result = []
+        for key, counts, total, count in items:
+            cumulative, running = [], 0
+            for c in counts:
+                running += c
+                cumulative.append(running)
+            result.append((dict(zip(self.labelnames, key)), cumulative, total, count))
+        return result
+
+    def quantile(self, q: float, cumulative: List[int]) -> float:
+        count = cumulative[-1]
+        if not count:
+            return 0.0
+        rank = q * count
+        lower = 0.0
+        previous = 0
+        for bound, running in zip(self.buckets, cumulative):
+            if running >= rank:
+                in_bucket = running - previous
+                return lower + (bound - lower) * ((rank - previous) / in_bucket if in_bucket else 0.0)
+            lower, previous = bound, running
+        return self.buckets[-1]  # in the +Inf bucket
+
+    def summary(self) -> list:
+        return [
+            {
+                "labels": labels,
+                "count": count,
+                "avg": round(total / count, 4) if count else 0.0,
+                **{f"p{int(q * 100)}": round(self.quantile(q, cumulative), 4) for q in (0.5, 0.95, 0.99)},
+            }
+            for labels, cumulative, total, count in self.series()
+        ]
+
+
+class Gauge:
+    """A value per label set that goes up and down (queue depth, requests in flight)."""
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def series(self):
+        """[(labels, value)]"""
+        with self._lock:
+            items = list(self._values.items())
+        return [(dict(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Counter:
+    """A per-label-set total that only goes up (requests, errors, tokens)."""
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def series(self):
+        """[(labels, value)]"""
+        with self._lock:
+            items = list(self._values.items())
+        return [(dict(zip(self.labelnames, key)), value) for key, value in items]
+
+
+# Time spent in internal stages of a request: tokenizing, model forward pass,
+# query embedding, index search, rendering, database writes
+stage_seconds = Histogram(
+    "app_stage_duration_seconds",
+    "Time spent in internal stages of request handling",
+    labelnames=("stage",),
+    buckets=STAGE_BUCKETS,
+)
+
+
+# ==== Prometheus text format ====
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: dict, **extra) -> str:
+    pairs = [*labels.items(), *extra.items()]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render_prometheus(metrics: Sequence[object] = None) -> str:
+    """Every registered metric in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for metric in REGISTRY if metrics is None else metrics:
+        kind = {Histogram: "histogram", Gauge: "gauge", Counter: "counter"}[type(metric)]
+        lines.append(f"# HELP {metric.name} {_escape(metric.description)}")
+        lines.append(f"# TYPE {metric.name} {kind}")
+        if kind == "histogram":
+            for labels, cumulative, total, count in metric.series():
+                for bound, running in zip((*metric.buckets, float("inf")), cumulative):
+                    lines.append(f"{metric.name}_bucket{_labels(labels, le=_number(bound))} {running}")
+                lines.append(f"{metric.name}_sum{_labels(labels)} {_number(total)}")
+                lines.append(f"{metric.name}_count{_labels(labels)} {count}")
+        else:
+            for labels, value in metric.series():
+                lines.append(f"{metric.name}{_labels(labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
@@ -1,13 +1,113 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, func
+from sqlalchemy import (
+    JSON, BigInteger, Column, DateTime, Float, ForeignKey, Index, Integer, String, Text,
+    UniqueConstraint, func,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from database import Base
 
+# JSONB on Postgres, plain JSON (text) elsewhere
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
+
 class RequestLog(Base):
+    """One row per request, written in bulk by log_writer.
+
+    On Postgres the table is range-partitioned by day on ``timestamp`` (see
+    log_storage.py), so retention drops whole partitions instead of
+    deleting rows.
+    """
     __tablename__ = "request_logs"
+    __table_args__ = (
+        Index("ix_request_logs_path_timestamp", "path", "timestamp"),
+        Index("ix_request_logs_status_code", "status_code"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    # On Postgres the default is nextval() of a sequence made by log_storage
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
     method = Column(String(10))
     path = Column(String(255))
-    request_body = Column(Text)
-    response_body = Column(Text)
+    # Template of the matched route (/api/summarization/jobs/{job_id}), which rollups group by
+    route = Column(String(255))
+    # Parsed JSON when the body was valid JSON and fit in the log, else a string
+    request_body = Column(JSONType)
+    response_body = Column(JSONType)
     status_code = Column(Integer)
-    timestamp = Column(DateTime, default=func.now())  # <-- DB server will auto-set the current timestamp
+    timestamp = Column(DateTime, nullable=False, server_default=func.now())
+    # Timings measured by DBLoggingMiddleware; ttfb is time to the first response body byte
+    ttfb_ms = Column(Float)
+    duration_ms = Column(Float)
+    request_bytes = Column(Integer)
+    response_bytes = Column(Integer)
+
+
+class RequestLogRollup(Base):
+    """Per-route hourly counts and latency percentiles, kept after raw logs expire."""
+    __tablename__ = "request_log_rollups"
+    __table_args__ = (UniqueConstraint("hour", "method", "route", name="uq_request_log_rollups_hour_endpoint"),)
+
+    id = Column(Integer, primary_key=True)
+    hour = Column(DateTime, nullable=False, index=True)
+    method = Column(String(10), nullable=False)
+    route = Column(String(255), nullable=False)
+    count = Column(Integer, nullable=False)
+    error_count = Column(Integer, nullable=False)  # status >= 500
+    avg_ms = Column(Float)
+    p50_ms = Column(Float)
+    p95_ms = Column(Float)
+    p99_ms = Column(Float)
+    max_ms = Column(Float)
+    response_bytes = Column(BigInteger)
+
+
+class ChatConversation(Base):
+    """A /api/chat conversation kept server-side under a session id the server issues.
+
+    Messages older than the recent window are folded into ``summary``;
+    ``summarized_through`` is the id of the last message folded in.
+    """
+    __tablename__ = "chat_conversations"
+
+    id = Column(String(64), primary_key=True)
+    category = Column(String(255))
+    summary = Column(Text)
+    summarized_through = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+
+
+class ChatMessage(Base):
+    __tablename__ = "chat_messages"
+    __table_args__ = (Index("ix_chat_messages_conversation_id_id", "conversation_id", "id"),)
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    conversation_id = Column(String(64), ForeignKey("chat_conversations.id", ondelete="CASCADE"), nullable=False)
+    role = Column(String(16), nullable=False)  # user | assistant
+    content = Column(Text, nullable=False)
+    tokens = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class SummarizationJob(Base):
+    """A queued /api/summarization job, its result and how long each stage took.
+
+    Text jobs keep their input in ``transcript``; audio jobs point
+    ``input_path`` at the saved upload until they finish.
+    """
+    __tablename__ = "summarization_jobs"
+    __table_args__ = (Index("ix_summarization_jobs_status_created_at", "status", "created_at"),)
+
+    id = Column(String(36), primary_key=True)
+    kind = Column(String(16), nullable=False)  # text | file | audio
+    status = Column(String(16), nullable=False)  # uploaded | transcribing | summarizing | done | failed
+    filename = Column(String(255))
+    input_path = Column(String(1024))
+    transcript = Column(Text)
+    summary = Column(Text)
+    notes = Column(Text)
+    error = Column(Text)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    started_at = Column(DateTime)  # the running worker's lease, renewed while it works
+    finished_at = Column(DateTime)
+    queue_ms = Column(Float)
+    transcription_ms = Column(Float)
+    summarization_ms = Column(Float)
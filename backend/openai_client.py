@@ -0,0 +1,305 @@
+import asyncio
+import logging
+import os
+import random
+import time
+import weakref
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi import APIRouter
+
+from config import (
+    OPENAI_BASE_URL,
+    OPENAI_MAX_CONNECTIONS,
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+    OPENAI_CONNECT_TIMEOUT_S,
+    OPENAI_CHAT_TIMEOUT_S,
+    OPENAI_EMBEDDING_TIMEOUT_S,
+    OPENAI_TRANSCRIPTION_TIMEOUT_S,
+    OPENAI_MAX_RETRIES,
+    OPENAI_RETRY_BASE_S,
+    OPENAI_RETRY_MAX_S,
+    OPENAI_MODEL_CONCURRENCY,
+    OPENAI_DEFAULT_CONCURRENCY,
+)
+from metrics import Counter, Gauge, Histogram
+from resources import LazyResource
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+OPERATION_TIMEOUTS = {
+    "chat": OPENAI_CHAT_TIMEOUT_S,
+    "embeddings": OPENAI_EMBEDDING_TIMEOUT_S,
+    "transcription": OPENAI_TRANSCRIPTION_TIMEOUT_S,
+}
+
+
+def _parse_concurrency(spec):
+    limits = {}
+    for item in spec.split(","):
+        if "=" in item:
+            model, limit = item.split("=", 1)
+            limits[model.strip()] = max(1, int(limit))
+    return limits
+
+
+MODEL_CONCURRENCY = _parse_concurrency(OPENAI_MODEL_CONCURRENCY)
+
+
+def _create_client():
+    import httpx
+    from openai import AsyncOpenAI
+
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(OPENAI_CHAT_TIMEOUT_S, connect=OPENAI_CONNECT_TIMEOUT_S),
+    )
+    # Retries are done by call_openai so they can back off outside the model semaphore
+    return AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=OPENAI_BASE_URL,
+        max_retries=0,
+        http_client=http_client,
+    )
+
+
+# Shared by every router; importing the openai package is deferred until the
+# warm-up task (or the first OpenAI-backed request) needs it.
+openai_client = LazyResource("openai_client", _create_client)
+
+
+# ==== Metrics ====
+# operation: chat | chat_stream | embeddings | transcription. A streamed
+# chat is timed from opening the stream until it is consumed or closed.
+
+openai_request_seconds = Histogram(
+    "openai_request_duration_seconds",
+    "Duration of each OpenAI API attempt",
+    labelnames=("operation", "model", "outcome"),  # outcome: ok | error
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0),
+)
+openai_tokens = Counter(
+    "openai_tokens_total",
+    "Tokens billed, from the usage OpenAI reports",
+    labelnames=("operation", "model", "kind"),  # kind: prompt | completion
+)
+openai_retries = Counter("openai_retries_total", "OpenAI attempts retried after an error", ("operation", "model"))
+openai_errors = Counter(
+    "openai_errors_total",
+    "OpenAI calls that failed for good",
+    labelnames=("operation", "model", "error"),
+)
+openai_in_flight = Gauge("openai_requests_in_flight", "OpenAI calls holding a concurrency slot", ("model",))
+openai_waiting = Gauge("openai_requests_waiting", "OpenAI calls waiting for a concurrency slot", ("model",))
+
+# Chat and embeddings report prompt/completion tokens, newer transcription
+# models input/output tokens
+_USAGE_FIELDS = {"prompt_tokens": "prompt", "completion_tokens": "completion",
+                 "input_tokens": "prompt", "output_tokens": "completion"}
+
+
+def record_usage(operation, model, usage):
+    if usage is None:
+        return
+    for field, kind in _USAGE_FIELDS.items():
+        value = getattr(usage, field, None)
+        if isinstance(value, int) and value:
+            openai_tokens.inc(value, operation=operation, model=model, kind=kind)
+
+
+# ==== Per-model concurrency and retries ====
+
+# asyncio primitives belong to one event loop, so semaphores are kept per loop
+_semaphores: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_stats = {}
+
+
+def _model_stats(model):
+    if model not in _stats:
+        _stats[model] = {
+            "limit": MODEL_CONCURRENCY.get(model, OPENAI_DEFAULT_CONCURRENCY),
+            "in_flight": 0, "waiting": 0, "calls": 0, "retries": 0, "errors": 0,
+        }
+    return _stats[model]
+
+
+def _semaphore(model):
+    per_loop = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    if model not in per_loop:
+        per_loop[model] = asyncio.Semaphore(MODEL_CONCURRENCY.get(model, OPENAI_DEFAULT_CONCURRENCY))
+    return per_loop[model]
+
+
+def _retryable():
+    import openai
+
+    return (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+
+def _retry_delay(error, attempt):
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(OPENAI_RETRY_MAX_S, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(OPENAI_RETRY_MAX_S, OPENAI_RETRY_BASE_S * 2 ** attempt))
+
+
+@asynccontextmanager
+async def _slot(model):
+    """Hold one of the model's concurrency slots, keeping the counters up to date."""
+    stats = _model_stats(model)
+    stats["waiting"] += 1
+    openai_waiting.inc(model=model)
+    try:
+        await _semaphore(model).acquire()
+    finally:
+        stats["waiting"] -= 1
+        openai_waiting.dec(model=model)
+    stats["in_flight"] += 1
+    stats["calls"] += 1
+    openai_in_flight.inc(model=model)
+    try:
+        yield
+    finally:
+        stats["in_flight"] -= 1
+        openai_in_flight.dec(model=model)
+        _semaphore(model).release()
+
+
+def _failed(model, operation, error):
+    _model_stats(model)["errors"] += 1
+    openai_errors.inc(operation=operation, model=model, error=type(error).__name__)
+
+
+async def _back_off(model, operation, error, attempt):
+    _model_stats(model)["retries"] += 1
+    openai_retries.inc(operation=operation, model=model)
+    delay = _retry_delay(error, attempt)
+    logger.warning("OpenAI %s call to %s failed (%s), retrying in %.2fs", operation, model, type(error).__name__, delay)
+    await asyncio.sleep(delay)
+
+
+async def call_openai(model, operation, make_call):
+    """Run ``make_call(client, timeout)`` under the model's semaphore, with retries.
+
+    The semaphore is released while backing off, so a retrying request
+    doesn't hold a slot other requests could use.
+    """
+    client = await openai_client.aget()
+    timeout = OPERATION_TIMEOUTS[operation]
+    retryable = _retryable()
+    for attempt in range(OPENAI_MAX_RETRIES + 1):
+        try:
+            async with _slot(model):
+                start, outcome = time.perf_counter(), "error"
+                try:
+                    response = await make_call(client, timeout)
+                    outcome = "ok"
+                finally:
+                    openai_request_seconds.observe(
+                        time.perf_counter() - start, operation=operation, model=model, outcome=outcome
+                    )
+            record_usage(operation, model, getattr(response, "usage", None))
+            return response
+        except retryable as e:
+            if attempt == OPENAI_MAX_RETRIES:
+                _failed(model, operation, e)
+                raise
+            error = e
+        except Exception as e:
+            _failed(model, operation, e)
+            raise
+        await _back_off(model, operation, error, attempt)
+
+
+# ==== Operations ====
+
+async def chat_completion(model, messages, **kwargs):
+    return await call_openai(
+        model, "chat",
+        lambda client, timeout: client.chat.completions.create(
+            model=model, messages=messages, timeout=timeout, **kwargs
+        ),
+    )
+
+
+async def stream_chat_completion(model, messages, **kwargs):
+    """Chat completion chunks as they arrive.
+
+    The model's slot is held until the stream is consumed or closed. Only
+    opening the stream is retried; an error midway is raised to the caller,
+    which may already have forwarded part of the answer.
+    """
+    client = await openai_client.aget()
+    retryable = _retryable()
+    for attempt in range(OPENAI_MAX_RETRIES + 1):
+        async with _slot(model):
+            start, outcome = time.perf_counter(), "error"
+            try:
+                stream = await client.chat.completions.create(
+                    model=model, messages=messages, stream=True, timeout=OPERATION_TIMEOUTS["chat"], **kwargs
+                )
+            except retryable as e:
+                openai_request_seconds.observe(
+                    time.perf_counter() - start, operation="chat_stream", model=model, outcome=outcome
+                )
+                if attempt == OPENAI_MAX_RETRIES:
+                    _failed(model, "chat_stream", e)
+                    raise
+                error = e
+            except Exception as e:
+                _failed(model, "chat_stream", e)
+                raise
+            else:
+                try:
+                    async for chunk in stream:
+                        record_usage("chat_stream", model, getattr(chunk, "usage", None))
+                        yield chunk
+                    outcome = "ok"
+                except Exception as e:
+                    _failed(model, "chat_stream", e)
+                    raise
+                finally:
+                    openai_request_seconds.observe(
+                        time.perf_counter() - start, operation="chat_stream", model=model, outcome=outcome
+                    )
+                    await stream.close()
+                return
+        await _back_off(model, "chat_stream", error, attempt)
+
+
+async def create_embeddings(model, texts):
+    """One float list per text, in order."""
+    response = await call_openai(
+        model, "embeddings",
+        lambda client, timeout: client.embeddings.create(input=texts, model=model, timeout=timeout),
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+async def transcribe(path, model="whisper-1", **kwargs):
+    """Transcription text of the audio file at ``path`` (re-read on every attempt)."""
+    response = await call_openai(
+        model, "transcription",
+        lambda client, timeout: client.audio.transcriptions.create(
+            file=Path(path), model=model, timeout=timeout, **kwargs
+        ),
+    )
+    return response.text
+
+
+def stats():
+    return {model: dict(values) for model, values in _stats.items()}
+
+
+@router.get("/openai/stats")
+async def openai_stats():
+    return {"models": stats()}
@@ -0,0 +1,95 @@
+"""Per-route request metrics and the Prometheus ``/metrics`` endpoint.
+
+Requests are labelled with their route template (``/api/summarization/jobs/{job_id}``)
+rather than the raw path, so ids in URLs don't create a series per request.
+"""
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from metrics import Counter, Gauge, Histogram, render_prometheus
+
+http_request_seconds = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response",
+    labelnames=("method", "route"),
+)
+http_requests = Counter(
+    "http_requests_total",
+    "Requests answered, by status code",
+    labelnames=("method", "route", "status"),
+)
+http_exceptions = Counter(
+    "http_request_exceptions_total",
+    "Requests that raised an unhandled exception",
+    labelnames=("method", "route", "exception"),
+)
+http_in_flight = Gauge("http_requests_in_flight", "Requests being handled")
+
+UNMATCHED = "unmatched"
+
+
+def route_label(scope) -> str:
+    """The path template of the route that handled the request, once routing has run.
+
+    Rebuilt from the path and its matched parameters, since the route object
+    of an included router doesn't carry the router's prefix.
+    """
+    if scope.get("route") is None:
+        return UNMATCHED
+    path = scope["path"]
+    for name, value in scope.get("path_params", {}).items():
+        value = str(value)
+        head, found, tail = path.rpartition(value) if value else ("", "", "")
+        if found:
+            path = f"{head}{{{name}}}{tail}"
+    return path
+
+
+class RequestMetricsMiddleware:
+    """Pure ASGI middleware recording duration, status and in-flight count per route.
+
+    Costs two clock reads and a few dictionary updates per request, so it
+    stays on in production; streaming responses are timed to their end.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+        exception = None
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception as e:
+            exception = type(e).__name__
+            raise
+        finally:
+            http_in_flight.dec()
+            route, method = route_label(scope), scope["method"]
+            http_request_seconds.observe(time.perf_counter() - start, method=method, route=route)
+            http_requests.inc(method=method, route=route, status=status_code)
+            if exception is not None:
+                http_exceptions.inc(method=method, route=route, exception=exception)
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+# Registration order is warm-up order
+REGISTRY: List["LazyResource"] = []
+IMPORT_TIMINGS: Dict[str, float] = {}
+_process_start = time.perf_counter()
+
+logger = logging.getLogger(__name__)
+
+
+class LazyResource:
+    """A heavy object (model, index, client) built on first use.
+
+    ``get()`` loads the value once, thread-safely, and records how long it
+    took. ``warm()`` additionally runs ``warmup(value)`` - a dummy forward
+    pass or search - so the first real request doesn't pay for cold caches.
+    A failed load is retried on the next ``get()``.
+    """
+
+    def __init__(self, name: str, loader: Callable[[], Any], warmup: Optional[Callable[[Any], None]] = None):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.state = PENDING
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self._value: Any = None
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def get(self) -> Any:
+        if self.state == READY:
+            return self._value
+        with self._lock:
+            if self.state != READY:
+                self.state = LOADING
+                start = time.perf_counter()
+                try:
+                    self._value = self.loader()
+                except Exception as e:
+                    self.state = FAILED
+                    self.error = f"{type(e).__name__}: {e}"
+                    raise
+                self.load_seconds = time.perf_counter() - start
+                self.error = None
+                self.state = READY
+        return self._value
+
+    def reload(self) -> Any:
+        """Build a fresh value and swap it in.
+
+        The old value is replaced in one assignment; requests that already
+        hold it finish with it, new ones get the new value. If loading
+        fails the old value stays in place.
+        """
+        start = time.perf_counter()
+        value = self.loader()
+        if self.warmup is not None:
+            self.warmup(value)
+        with self._lock:
+            self._value = value
+            self.load_seconds = time.perf_counter() - start
+            self.error = None
+            self.state = READY
+        return value
+
+    async def aget(self) -> Any:
+        """``get()`` for request handlers: loads on a worker thread if needed."""
+        if self.state == READY:
+            return self._value
+        return await run_in_threadpool(self.get)
+
+    def warm(self) -> None:
+        value = self.get()
+        if self.warmup is not None and self.warmup_seconds is None:
+            start = time.perf_counter()
+            self.warmup(value)
+            self.warmup_seconds = time.perf_counter() - start
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "load_seconds": _round(self.load_seconds),
+            "warmup_seconds": _round(self.warmup_seconds),
+            "error": self.error,
+        }
+
+
+def _round(seconds):
+    return None if seconds is None else round(seconds, 3)
+
+
+@contextmanager
+def timed_import(name: str):
+    """Record how long the imports inside the block take."""
+    start = time.perf_counter()
+    yield
+    IMPORT_TIMINGS[name] = time.perf_counter() - start
+
+
+async def warm_up_all() -> None:
+    """Load and warm every registered resource, one at a time, off the event loop."""
+    for resource in REGISTRY:
+        try:
+            await run_in_threadpool(resource.warm)
+        except Exception:
+            logger.exception("Warm-up of %s failed", resource.name)
+    logger.info("Startup timing report:")
+    for section, timings in startup_report().items():
+        logger.info("  %s: %s", section, timings)
+
+
+def readiness() -> dict:
+    return {resource.name: resource.status() for resource in REGISTRY}
+
+
+def all_ready() -> bool:
+    return all(resource.ready for resource in REGISTRY)
+
+
+def startup_report() -> dict:
+    return {
+        "imports_seconds": {name: _round(t) for name, t in IMPORT_TIMINGS.items()},
+        "load_seconds": {r.name: _round(r.load_seconds) for r in REGISTRY},
+        "warmup_seconds": {r.name: _round(r.warmup_seconds) for r in REGISTRY},
+        "uptime_seconds": _round(time.perf_counter() - _process_start),
+    }
@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from cache import text_key
+
+
+class _Entry:
+    __slots__ = ("id", "key", "value", "created", "cost_s")
+
+    def __init__(self, entry_id, key, value, cost_s):
+        self.id = entry_id
+        self.key = key
+        self.value = value
+        self.created = time.monotonic()
+        self.cost_s = cost_s
+
+
+class SemanticCache:
+    """Two-tier cache of generated answers keyed on the question.
+
+    The exact tier is a hash of the normalized text. The semantic tier is a
+    flat inner-product FAISS index over normalized embeddings of the cached
+    questions, so a reworded question whose cosine similarity reaches
+    ``similarity_threshold`` gets the stored answer. Entries expire after
+    ``ttl_s`` and the least recently used entry is evicted past
+    ``max_entries``; evicted vectors are removed from the index by id.
+    Each entry remembers how long its answer took to generate, so hits can
+    report the latency they saved.
+    """
+
+    def __init__(self, max_entries: int = 500, ttl_s: float = 86400.0, similarity_threshold: float = 0.95):
+        self.max_entries = max(1, max_entries)
+        self.ttl_s = ttl_s
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_id = {}
+        self._index = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.saved_seconds = 0.0
+
+    # ==== Lookups ====
+
+    def get_exact(self, text: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(text_key(text))
+            if entry is None or self._expire_if_stale(entry):
+                return None
+            return self._hit(entry, semantic=False)
+
+    def get_similar(self, vector: Optional[np.ndarray]) -> Optional[Tuple[Any, float]]:
+        """(value, similarity) of the closest cached question above the threshold, else a miss.
+
+        A ``vector`` of None (no embedding available) counts as a miss.
+        """
+        query = _normalized(vector) if vector is not None else None
+        with self._lock:
+            while query is not None and self._index is not None and self._index.ntotal:
+                similarities, ids = self._index.search(query, 1)
+                if ids[0][0] < 0 or similarities[0][0] < self.similarity_threshold:
+                    break
+                entry = self._by_id[int(ids[0][0])]
+                if self._expire_if_stale(entry):
+                    continue  # look again without the expired entry
+                return self._hit(entry, semantic=True), float(similarities[0][0])
+            self.misses += 1
+            return None
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypasses += 1
+
+    # ==== Updates ====
+
+    def put(self, text: str, vector: Optional[np.ndarray], value: Any, cost_s: float = 0.0):
+        key = text_key(text)
+        with self._lock:
+            if key in self._entries:
+                self._remove(self._entries[key])
+            entry = _Entry(self._next_id, key, value, cost_s)
+            self._next_id += 1
+            self._entries[key] = entry
+            self._by_id[entry.id] = entry
+            if vector is not None:
+                query = _normalized(vector)
+                if self._index is None:
+                    self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(query.shape[1]))
+                if query.shape[1] == self._index.d:
+                    self._index.add_with_ids(query, np.array([entry.id], dtype=np.int64))
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries.values())))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_id.clear()
+            self._index = None
+
+    # ==== Internals (lock held) ====
+
+    def _hit(self, entry, semantic):
+        self._entries.move_to_end(entry.key)
+        if semantic:
+            self.semantic_hits += 1
+        else:
+            self.exact_hits += 1
+        self.saved_seconds += entry.cost_s
+        return entry.value
+
+    def _expire_if_stale(self, entry):
+        if time.monotonic() - entry.created <= self.ttl_s:
+            return False
+        self._remove(entry)
+        self.expirations += 1
+        return True
+
+    def _remove(self, entry):
+        self._entries.pop(entry.key, None)
+        self._by_id.pop(entry.id, None)
+        if self._index is not None:
+            self._index.remove_ids(np.array([entry.id], dtype=np.int64))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "similarity_threshold": self.similarity_threshold,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "latency_saved_s": round(self.saved_seconds, 3),
+        }
+
+
+def _normalized(vector):
+    query = np.array(vector, dtype=np.float32).reshape(1, -1).copy()
+    faiss.normalize_L2(query)
+    return query
@@ -0,0 +1,480 @@
+"""Summarization as background jobs.
+
+Submitting returns a job id straight away; a fixed pool of workers takes
+jobs from a bounded queue, moving each through uploaded → transcribing →
+summarizing → done (or failed). Status, result and stage timings live in
+the summarization_jobs table, so they survive the client disconnecting and
+can be read from any worker process. A worker holds a job through a lease
+(its ``started_at``, renewed while it runs), so a job is only run by one
+worker at a time and is taken over once a dead worker's lease runs out.
+Clients poll ``/summarization/jobs/{id}`` or follow
+``/summarization/jobs/{id}/events``.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import (
+    SUMMARY_JOB_LEASE_SECONDS,
+    SUMMARY_JOB_QUEUE_SIZE,
+    SUMMARY_JOB_UPLOAD_DIR,
+    SUMMARY_JOB_WORKERS,
+)
+from database import AsyncSessionLocal, database, get_session
+from metrics import Gauge, Histogram
+from summarization import read_text_upload, save_audio_upload, summarize_transcript, transcribe_audio
+from uploads import upload_openapi
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+UPLOADED = "uploaded"
+TRANSCRIBING = "transcribing"
+SUMMARIZING = "summarizing"
+DONE = "done"
+FAILED = "failed"
+FINISHED = (DONE, FAILED)
+
+job_queue_depth = Gauge("summarization_job_queue_depth", "Summarization jobs waiting for a worker")
+jobs_running = Gauge("summarization_jobs_running", "Summarization jobs being processed")
+job_seconds = Histogram(
+    "summarization_job_seconds",
+    "Time summarization jobs spend in each stage",
+    labelnames=("kind", "stage"),  # stage: queued | transcription | summarization | total
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0),
+)
+
+
+# ==== Persistence ====
+
+async def _create_job(job_id, kind, filename=None, transcript=None, input_path=None):
+    from models import SummarizationJob
+
+    await database.aget()
+    async with AsyncSessionLocal() as db:
+        db.add(SummarizationJob(
+            id=job_id, kind=kind, status=UPLOADED, filename=filename,
+            transcript=transcript, input_path=input_path,
+        ))
+        await db.commit()
+
+
+async def _update_job(job_id, **values):
+    from models import SummarizationJob
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(SummarizationJob).where(SummarizationJob.id == job_id).values(**values))
+        await db.commit()
+
+
+def _lease_expired(now):
+    from models import SummarizationJob
+
+    return or_(SummarizationJob.started_at.is_(None),
+               SummarizationJob.started_at < now - timedelta(seconds=SUMMARY_JOB_LEASE_SECONDS))
+
+
+async def _claim_job(job_id, now) -> bool:
+    """Take the job's lease unless it is finished or another worker's lease is still live."""
+    from models import SummarizationJob
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(SummarizationJob)
+            .where(SummarizationJob.id == job_id, SummarizationJob.status.notin_(FINISHED), _lease_expired(now))
+            .values(started_at=now)
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+
+async def _update_leased_job(job_id, lease, **values) -> bool:
+    """Update an unfinished job as long as ``lease`` is still its started_at."""
+    from models import SummarizationJob
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(SummarizationJob)
+            .where(SummarizationJob.id == job_id, SummarizationJob.status.notin_(FINISHED),
+                   SummarizationJob.started_at == lease)
+            .values(**values)
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+
+async def _load_job(db: AsyncSession, job_id) -> Optional[dict]:
+    from models import SummarizationJob
+
+    job = await db.get(SummarizationJob, job_id)
+    if job is None:
+        return None
+    return {column.name: getattr(job, column.name) for column in SummarizationJob.__table__.columns}
+
+
+async def _fetch_job(job_id) -> Optional[dict]:
+    await database.aget()
+    async with AsyncSessionLocal() as db:
+        return await _load_job(db, job_id)
+
+
+async def _orphaned_jobs():
+    """Unfinished jobs that no worker holds a live lease on."""
+    from models import SummarizationJob
+
+    await database.aget()
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(
+            select(SummarizationJob.id)
+            .where(SummarizationJob.status.notin_(FINISHED), _lease_expired(datetime.utcnow()))
+            .order_by(SummarizationJob.created_at)
+        )).scalars().all()
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+# ==== Worker pool ====
+
+class _Lease:
+    """A worker's hold on a job: the started_at it claimed or last renewed it with."""
+
+    def __init__(self, job_id, started_at):
+        self.job_id = job_id
+        self.started_at = started_at
+        self.lost = False
+        self._lock = asyncio.Lock()
+
+    async def update(self, **values) -> bool:
+        """Update the job while the lease holds; a new ``started_at`` renews it."""
+        async with self._lock:
+            if not self.lost:
+                self.lost = not await _update_leased_job(self.job_id, self.started_at, **values)
+                if not self.lost:
+                    self.started_at = values.get("started_at", self.started_at)
+            return not self.lost
+
+
+class JobQueue:
+    """A bounded asyncio queue of job ids and the worker tasks that drain it.
+
+    ``start()`` (from the app lifespan) also re-queues unfinished jobs whose
+    lease has run out, i.e. that a dead process left behind; interrupted
+    jobs start over from their saved input. Without it, workers start on the
+    first submission.
+    """
+
+    def __init__(self, workers: int, max_queued: int):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._changed: Dict[str, Set[asyncio.Event]] = {}
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queued)
+            self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def start(self):
+        """Start the workers and re-queue unfinished jobs that nobody holds a lease on."""
+        if self._queue is not None:
+            return
+        self._ensure_workers()
+        try:
+            leftover = await _orphaned_jobs()
+        except Exception as e:
+            logger.error("Couldn't re-queue unfinished summarization jobs: %s", e)
+            return
+        for job_id in leftover:
+            if self._queue.full():
+                break
+            self._queue.put_nowait(job_id)
+        if leftover:
+            logger.info("Re-queued %d unfinished summarization jobs", min(len(leftover), self.max_queued))
+        job_queue_depth.set(self._queue.qsize())
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def submit(self, job_id: str):
+        self._ensure_workers()
+        try:
+            self._queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many summarization jobs queued; try again shortly",
+                headers={"Retry-After": "30"},
+            )
+        self.submitted += 1
+        job_queue_depth.set(self._queue.qsize())
+
+    # ---- progress notifications (this process only; other processes poll) ----
+
+    def _notify(self, job_id):
+        for event in self._changed.get(job_id, ()):
+            event.set()
+
+    def subscribe(self, job_id: str) -> asyncio.Event:
+        """An event of the caller's own, set on every change to the job until ``forget``."""
+        event = asyncio.Event()
+        self._changed.setdefault(job_id, set()).add(event)
+        return event
+
+    @staticmethod
+    async def wait_for_change(event: asyncio.Event, timeout: float):
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        event.clear()
+
+    def forget(self, job_id: str, event: asyncio.Event):
+        subscribers = self._changed.get(job_id)
+        if subscribers is not None:
+            subscribers.discard(event)
+            if not subscribers:
+                del self._changed[job_id]
+
+    async def _set(self, lease: _Lease, **values) -> bool:
+        updated = await lease.update(**values)
+        self._notify(lease.job_id)
+        return updated
+
+    # ---- processing ----
+
+    async def _worker(self, number):
+        while True:
+            job_id = await self._queue.get()
+            job_queue_depth.set(self._queue.qsize())
+            jobs_running.inc()
+            try:
+                await self._process(job_id)
+            except Exception:
+                logger.exception("Summarization worker %d crashed on job %s", number, job_id)
+            finally:
+                jobs_running.dec()
+                self._queue.task_done()
+
+    async def _process(self, job_id):
+        job = await _fetch_job(job_id)
+        if job is None or job["status"] in FINISHED:
+            return
+        lease = _Lease(job_id, datetime.utcnow())
+        if not await _claim_job(job_id, lease.started_at):
+            return
+        work = asyncio.create_task(self._run(job, lease))
+        renewing = asyncio.create_task(self._renew(lease, work))
+        try:
+            await asyncio.wait({work})
+        finally:
+            renewing.cancel()
+            work.cancel()
+        if work.cancelled():
+            logger.warning("Stopped summarization job %s: its lease was taken over", job_id)
+        else:
+            work.result()
+
+    @staticmethod
+    async def _renew(lease: _Lease, work: asyncio.Task):
+        """Renew the lease while ``work`` runs; stop the work if another worker took the job over."""
+        while not work.done():
+            await asyncio.sleep(SUMMARY_JOB_LEASE_SECONDS / 3)
+            try:
+                renewed = await lease.update(started_at=datetime.utcnow())
+            except Exception as e:
+                # Tried again next time; the job is only lost if this goes on past the lease
+                logger.warning("Couldn't renew the lease on summarization job %s: %s", lease.job_id, e)
+                continue
+            if not renewed:
+                work.cancel()
+                return
+
+    async def _run(self, job, lease: _Lease):
+        kind = job["kind"]
+        queued_s = (lease.started_at - job["created_at"]).total_seconds()
+        job_seconds.observe(queued_s, kind=kind, stage="queued")
+        timings = {"queue_ms": _ms(queued_s)}
+        start = time.perf_counter()
+        try:
+            transcript = job["transcript"]
+            if kind == "audio":
+                await self._set(lease, status=TRANSCRIBING, **timings)
+                if not job["input_path"] or not os.path.exists(job["input_path"]):
+                    raise RuntimeError("The uploaded audio is no longer available")
+                stage = time.perf_counter()
+                transcript = await transcribe_audio(job["input_path"])
+                elapsed = time.perf_counter() - stage
+                job_seconds.observe(elapsed, kind=kind, stage="transcription")
+                timings = {"transcript": transcript, "transcription_ms": _ms(elapsed)}
+
+            await self._set(lease, status=SUMMARIZING, **timings)
+            stage = time.perf_counter()
+            result = await summarize_transcript(transcript)
+            elapsed = time.perf_counter() - stage
+            job_seconds.observe(elapsed, kind=kind, stage="summarization")
+
+            finished = await self._set(
+                lease, status=DONE, summary=result["summary"], notes=result["notes"],
+                summarization_ms=_ms(elapsed), finished_at=datetime.utcnow(),
+            )
+            if finished:
+                self.completed += 1
+        except Exception as e:
+            finished = await self._set(
+                lease, status=FAILED, error=str(getattr(e, "detail", None) or e),
+                finished_at=datetime.utcnow(),
+            )
+            if finished:
+                self.failed += 1
+        finally:
+            job_seconds.observe(time.perf_counter() - start + queued_s, kind=kind, stage="total")
+        # Only the run that finished the job drops its input; one that was
+        # interrupted or lost its lease leaves it for the next run
+        if finished and job["input_path"] and os.path.exists(job["input_path"]):
+            os.remove(job["input_path"])
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "running": int(jobs_running.value()),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+job_queue = JobQueue(SUMMARY_JOB_WORKERS, SUMMARY_JOB_QUEUE_SIZE)
+
+
+# ==== API Routes ====
+
+def _public(job: dict) -> dict:
+    result = {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "filename": job["filename"],
+        "created_at": job["created_at"].isoformat() if job["created_at"] else None,
+        "finished_at": job["finished_at"].isoformat() if job["finished_at"] else None,
+        "timings_ms": {
+            "queue": job["queue_ms"],
+            "transcription": job["transcription_ms"],
+            "summarization": job["summarization_ms"],
+        },
+    }
+    if job["status"] == DONE:
+        result.update(transcript=job["transcript"], summary=job["summary"], notes=job["notes"])
+    elif job["status"] == FAILED:
+        result["error"] = job["error"]
+    return result
+
+
+async def _submit(kind, **values):
+    job_id = str(uuid.uuid4())
+    await _create_job(job_id, kind, **values)
+    try:
+        await job_queue.submit(job_id)
+    except HTTPException as e:
+        await _update_job(job_id, status=FAILED, error=e.detail, finished_at=datetime.utcnow())
+        raise
+    return JSONResponse(status_code=202, content={
+        "job_id": job_id,
+        "status": UPLOADED,
+        "status_url": f"/api/summarization/jobs/{job_id}",
+        "events_url": f"/api/summarization/jobs/{job_id}/events",
+    })
+
+
+@router.post("/summarization/jobs/text", status_code=202)
+async def submit_text_job(text: dict):
+    transcript = text.get("text", "")
+    if not transcript:
+        raise HTTPException(status_code=400, detail="No transcript text provided")
+    return await _submit("text", transcript=transcript)
+
+
+@router.post("/summarization/jobs/file", status_code=202, openapi_extra=upload_openapi("file"))
+async def submit_file_job(request: Request):
+    filename, transcript = await read_text_upload(request)
+    return await _submit("file", filename=filename, transcript=transcript)
+
+
+@router.post("/summarization/jobs/audio", status_code=202, openapi_extra=upload_openapi("audio"))
+async def submit_audio_job(request: Request):
+    os.makedirs(SUMMARY_JOB_UPLOAD_DIR, exist_ok=True)
+    filename, path = await save_audio_upload(request, folder=SUMMARY_JOB_UPLOAD_DIR)
+    try:
+        return await _submit("audio", filename=filename, input_path=os.path.abspath(path))
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+@router.get("/summarization/jobs/stats")
+async def job_stats():
+    return {
+        **job_queue.stats(),
+        "seconds": job_seconds.summary(),
+    }
+
+
+@router.get("/summarization/jobs/{job_id}")
+async def get_job(job_id: str, db: AsyncSession = Depends(get_session)):
+    job = await _load_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _public(job)
+
+
+@router.get("/summarization/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent ``status`` events on every stage change, then ``done`` or ``failed`` with the result."""
+    job = await _fetch_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        current, last = job, None
+        changed = job_queue.subscribe(job_id)
+        try:
+            while True:
+                if current["status"] != last:
+                    last = current["status"]
+                    event = last if last in FINISHED else "status"
+                    yield f"event: {event}\ndata: {json.dumps(_public(current))}\n\n"
+                    if last in FINISHED:
+                        return
+                # Woken by this process's workers; the timeout covers jobs running elsewhere
+                await job_queue.wait_for_change(changed, timeout=2.0)
+                current = await _fetch_job(job_id)
+        finally:
+            job_queue.forget(job_id, changed)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
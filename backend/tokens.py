@@ -0,0 +1,29 @@
+import logging
+
+from resources import LazyResource
+
+logger = logging.getLogger(__name__)
+
+# The chat and summarization routes both use gpt-4o-mini
+TOKENIZER_MODEL = "gpt-4o-mini"
+
+
+def _load_encoding():
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+    except Exception as e:
+        # The encoding is downloaded on first use; without it, estimate
+        logger.warning("tiktoken encoding unavailable, estimating token counts: %s", e)
+        return None
+
+
+tokenizer = LazyResource("tokenizer", _load_encoding)
+
+
+def count_tokens(text: str) -> int:
+    encoding = tokenizer.get()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
@@ -0,0 +1,218 @@
+"""Speech-to-text for /api/summarization/audio.
+
+A transcriber turns one audio file into text. ``transcribe_long`` splits a
+long recording into overlapping segments (see audio_segments.py),
+transcribes them concurrently and stitches the texts back together, dropping
+the words the overlaps repeat.
+"""
+import asyncio
+import difflib
+import re
+import tempfile
+import wave
+from typing import List
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from audio_segments import split_audio
+
+
+class Transcriber:
+    name = ""
+
+    async def transcribe(self, path: str) -> str:
+        raise NotImplementedError
+
+
+class WhisperTranscriber(Transcriber):
+    """The hosted Whisper API, through the shared OpenAI client."""
+
+    def __init__(self, model: str = "whisper-1", language: str = "en"):
+        self.name = model
+        self.language = language
+
+    async def transcribe(self, path):
+        from openai_client import transcribe
+
+        return await transcribe(path, model=self.name, language=self.language)
+
+
+class SyntheticTranscriber(Transcriber):
+    """A local stand-in that "hears" audio written by ``synthesize_speech``.
+
+    Each word is a pure tone of WORD_SECONDS; the transcriber reads the WAV
+    and maps every block's dominant frequency back to its word. Like a real
+    model it garbles words cut by a segment boundary, so the overlap
+    stitching gets exercised. ``latency_s`` plus ``seconds_per_audio_second``
+    of the segment's duration simulate the API's response time.
+    """
+
+    name = "synthetic"
+
+    def __init__(self, latency_s: float = 0.0, seconds_per_audio_second: float = 0.0):
+        self.latency_s = latency_s
+        self.seconds_per_audio_second = seconds_per_audio_second
+
+    async def transcribe(self, path):
+        words, duration = await run_in_threadpool(_decode_tones, path)
+        await asyncio.sleep(self.latency_s + duration * self.seconds_per_audio_second)
+        return " ".join(words)
+
+
+TRANSCRIBERS = ("whisper", "synthetic")
+
+
+def create_transcriber(name: str) -> Transcriber:
+    if name == "whisper":
+        return WhisperTranscriber()
+    if name == "synthetic":
+        return SyntheticTranscriber()
+    raise ValueError(f"Unknown transcriber {name!r}; choose from {', '.join(TRANSCRIBERS)}")
+
+
+# ==== Long recordings ====
+
+_PUNCTUATION = re.compile(r"[^\w']+")
+# Words cut by a segment boundary, which transcribers often garble
+EDGE_WORDS = 2
+
+
+def _normalized(word: str) -> str:
+    return _PUNCTUATION.sub("", word.lower())
+
+
+def _longest_run(tail: List[str], head: List[str], overlap: int):
+    """(start in tail, length) of the longest run of equal words if ``head`` starts ``overlap`` words before ``tail`` ends."""
+    offset = len(tail) - overlap
+    best_start = best_size = run = 0
+    for i in range(offset, len(tail)):
+        run = run + 1 if tail[i] == head[i - offset] else 0
+        if run > best_size:
+            best_start, best_size = i - run + 1, run
+    return best_start, best_size
+
+
+def stitch(texts: List[str], overlap_words: List[int], min_match_words: int = 3) -> str:
+    """Join consecutive segment transcripts, keeping the words their overlaps share once.
+
+    ``overlap_words[i]`` is about how many words segments i and i + 1 share,
+    estimated from the overlap's duration. Alignments within half of that
+    (at least 3 words) of the estimate are tried; the closest one whose
+    words all match but for EDGE_WORDS garbled ones (else the one with the
+    longest run of equal words) marks the seam. The text so far is cut where
+    the run starts and the next segment continues from there. Anchoring the
+    alignment to the overlap keeps repeated phrases from lining up with an
+    earlier or later repeat. Without a run of ``min_match_words`` the texts
+    are simply concatenated.
+    """
+    result: List[str] = []
+    for text, expected in zip(texts, [0] + list(overlap_words)):
+        words = text.split()
+        if not result:
+            result = words
+            continue
+        slack = max(3, expected // 2)
+        window = min(len(result), len(words), expected + slack)
+        tail = [_normalized(w) for w in result[len(result) - window:]]
+        head = [_normalized(w) for w in words[:window]]
+        best = None
+        for overlap in range(max(1, expected - slack), window + 1):
+            start, size = _longest_run(tail, head, overlap)
+            # Alignments matching all but the edge words, the closest to the
+            # estimate first (a repeated phrase matches at several); else the
+            # longest run
+            full = overlap - size <= EDGE_WORDS
+            key = (full, -abs(overlap - expected) if full else size)
+            if best is None or key > best[0]:
+                best = (key, overlap, start, size)
+        if best is not None and best[3] >= min_match_words:
+            _, overlap, start, _ = best
+            cut = len(result) - window + start
+            result = result[:cut] + words[start - (window - overlap):]
+        else:
+            result += words
+    return " ".join(result)
+
+
+async def transcribe_long(transcriber: Transcriber, path: str, segment_s: float, overlap_s: float,
+                          concurrency: int) -> str:
+    """Transcribe ``path`` in overlapping segments, at most ``concurrency`` at a time."""
+    with tempfile.TemporaryDirectory(prefix="segments-") as folder:
+        segments = await run_in_threadpool(split_audio, path, segment_s, overlap_s, folder)
+        if len(segments) == 1:
+            return await transcriber.transcribe(segments[0].path)
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def one(segment):
+            async with semaphore:
+                return await transcriber.transcribe(segment.path)
+
+        texts = await asyncio.gather(*(one(segment) for segment in segments))
+    # Each segment's own word rate turns the overlap's duration into words
+    overlap_words = [
+        round(len(text.split()) * (current.end_s - following.start_s) / max(current.end_s - current.start_s, 1e-6))
+        for text, current, following in zip(texts, segments, segments[1:])
+    ]
+    return stitch(texts, overlap_words)
+
+
+# ==== Synthetic speech ====
+
+SAMPLE_RATE = 8000
+WORD_SECONDS = 0.25
+BASE_HZ = 300.0
+STEP_HZ = 25.0
+VOCABULARY = tuple(dict.fromkeys((
+    "i have been feeling anxious about work and my sleep is bad lately the client "
+    "says she cannot stop worrying we talked about breathing exercises journaling "
+    "family support boundaries with her manager panic attacks at night feeling "
+    "tired every morning what helps you relax maybe walking with friends "
+    "next week try one small step"
+).split()))
+
+
+def synthesize_speech(words: List[str], path: str):
+    """Write ``words`` (from VOCABULARY) as a tone-per-word WAV that SyntheticTranscriber decodes."""
+    index = {word: i for i, word in enumerate(VOCABULARY)}
+    n = int(SAMPLE_RATE * WORD_SECONDS)
+    t = np.arange(n) / SAMPLE_RATE
+    tones = {i: (0.5 * np.sin(2 * np.pi * (BASE_HZ + STEP_HZ * i) * t) * 32767).astype("<i2")
+             for i in set(index[w] for w in words)}
+    with wave.open(path, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(SAMPLE_RATE)
+        for word in words:
+            out.writeframes(tones[index[word]].tobytes())
+
+
+def _tone_purity(block):
+    spectrum = np.abs(np.fft.rfft(block)) ** 2
+    return spectrum.max() / (spectrum.sum() or 1.0)
+
+
+def _decode_tones(path):
+    with wave.open(path, "rb") as audio:
+        rate = audio.getframerate()
+        samples = np.frombuffer(audio.readframes(audio.getnframes()), dtype="<i2").astype(np.float32)
+    n = int(rate * WORD_SECONDS)
+    freqs = np.fft.rfftfreq(n, 1 / rate)
+    # A segment can start mid-word: find where words begin from the offset
+    # at which the first blocks are purest, and decode from there
+    probe = samples[: 16 * n]
+    offsets = range(0, n, max(1, n // 16))
+    offset = max(offsets, key=lambda o: sum(
+        _tone_purity(probe[i:i + n]) for i in range(o, len(probe) - n + 1, n)
+    ))
+    starts = ([0] if offset >= n // 2 else []) + list(range(offset, len(samples) - n // 2, n))
+    words = []
+    for start in starts:
+        block = samples[start:start + (offset if start == 0 and offset else n)]
+        if len(block) < n:
+            block = np.pad(block, (0, n - len(block)))
+        i = int(round((freqs[int(np.argmax(np.abs(np.fft.rfft(block))))] - BASE_HZ) / STEP_HZ))
+        if 0 <= i < len(VOCABULARY):
+            words.append(VOCABULARY[i])
+    return words, len(samples) / rate
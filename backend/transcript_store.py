@@ -0,0 +1,98 @@
+"""Transcript storage read on demand instead of held in every worker's heap.
+
+Row ``i`` of the SQLite ``transcripts`` table belongs to row ``i`` of the
+FAISS index. Only the per-row quality labels are kept in memory; ids and
+texts are fetched for the handful of rows a search returns.
+"""
+import os
+import sqlite3
+import threading
+from typing import List, Sequence, Tuple
+
+QUALITY_CODES = {"high": 0, "low": 1}
+QUALITY_NAMES = {code: name for name, code in QUALITY_CODES.items()}
+
+
+def write_store(path, entries, texts):
+    """Write ``entries`` ({id, quality}) and ``texts`` to a new SQLite file at ``path``.
+
+    The file is built next to ``path`` and moved into place with
+    ``os.replace``, so a server holding the old file open keeps reading a
+    consistent copy until it reloads.
+    """
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute(
+            "CREATE TABLE transcripts ("
+            " row INTEGER PRIMARY KEY, id TEXT NOT NULL, quality INTEGER NOT NULL, text TEXT NOT NULL)"
+        )
+        conn.executemany(
+            "INSERT INTO transcripts (row, id, quality, text) VALUES (?, ?, ?, ?)",
+            (
+                (row, entry["id"], QUALITY_CODES[entry["quality"]], text)
+                for row, (entry, text) in enumerate(zip(entries, texts))
+            ),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+
+
+class TranscriptStore:
+    """Read-only view of a store written by ``write_store``."""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.qualities = [
+            QUALITY_NAMES[code]
+            for (code,) in self._conn.execute("SELECT quality FROM transcripts ORDER BY row")
+        ]
+
+    def __len__(self):
+        return len(self.qualities)
+
+    def get_many(self, rows: Sequence[int]) -> List[Tuple[str, str]]:
+        """(id, text) for each of ``rows``, in the same order."""
+        rows = [int(r) for r in rows]
+        if not rows:
+            return []
+        placeholders = ",".join("?" * len(rows))
+        with self._lock:
+            found = {
+                row: (transcript_id, text)
+                for row, transcript_id, text in self._conn.execute(
+                    f"SELECT row, id, text FROM transcripts WHERE row IN ({placeholders})", rows
+                )
+            }
+        return [found[row] for row in rows]
+
+    def all_rows(self) -> List[Tuple[str, str, str]]:
+        """Every (id, quality, text) in row order, for incremental rebuilds."""
+        with self._lock:
+            return [
+                (transcript_id, QUALITY_NAMES[code], text)
+                for transcript_id, code, text in self._conn.execute(
+                    "SELECT id, quality, text FROM transcripts ORDER BY row"
+                )
+            ]
+
+
+class InMemoryTranscriptStore:
+    """Same interface over lists, for the legacy JSON layout."""
+
+    def __init__(self, entries, texts):
+        self.qualities = [entry["quality"] for entry in entries]
+        self._ids = [entry["id"] for entry in entries]
+        self._texts = texts
+
+    def __len__(self):
+        return len(self.qualities)
+
+    def get_many(self, rows):
+        return [(self._ids[row], self._texts[row]) for row in rows]
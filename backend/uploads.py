@@ -0,0 +1,143 @@
+"""File uploads read straight off the request stream.
+
+FastAPI's ``UploadFile`` parameters are filled only after Starlette has read
+the whole multipart body into a spooled temporary file, so a size limit
+checked afterwards only fires once an oversized file has been uploaded and
+written in full. ``receive_upload`` parses the body as it arrives instead:
+a declared Content-Length over the limit is refused before reading
+anything, and the file part is written to its destination chunk by chunk,
+stopping with 413 as soon as it passes the limit.
+"""
+from typing import Callable, Optional
+
+from fastapi import HTTPException, Request
+from python_multipart import MultipartParser
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+from config import UPLOAD_CHUNK_BYTES
+
+# Room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+def too_large(max_mb: float) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File too large; the limit is {max_mb:g} MB")
+
+
+def upload_openapi(field: str) -> dict:
+    """``openapi_extra`` documenting a multipart body with one file field, as ``File(...)`` would."""
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "required": [field],
+        "properties": {field: {"type": "string", "format": "binary"}},
+    }}}}}
+
+
+class _FilePart:
+    """Parser callbacks collecting the data of the form field called ``field``."""
+
+    def __init__(self, field: str):
+        self.field = field
+        self.filename: Optional[str] = None
+        self.found = False
+        self.received = 0
+        self.pending = []
+        self.pending_bytes = 0
+        self._in_field = False
+        self._header_name = b""
+        self._header_value = b""
+        self._headers = {}
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field,
+            "on_header_value": self._header_value_data,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+
+    def _part_begin(self):
+        self._headers = {}
+        self._in_field = False
+
+    def _header_field(self, data, start, end):
+        self._header_name += data[start:end]
+
+    def _header_value_data(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _header_end(self):
+        self._headers[self._header_name.strip().lower()] = self._header_value.strip()
+        self._header_name = self._header_value = b""
+
+    def _headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition"))
+        if options.get(b"name", b"").decode("latin-1") == self.field and not self.found:
+            self.found = self._in_field = True
+            self.filename = options.get(b"filename", b"").decode("utf-8", "replace")
+
+    def _part_data(self, data, start, end):
+        if self._in_field:
+            self.pending.append(bytes(data[start:end]))
+            self.pending_bytes += end - start
+            self.received += end - start
+
+    def take(self) -> bytes:
+        data, self.pending, self.pending_bytes = b"".join(self.pending), [], 0
+        return data
+
+    def _part_end(self):
+        self._in_field = False
+
+
+async def receive_upload(request: Request, field: str, max_mb: float,
+                         open_destination: Callable[[str], object], write_bytes: int = UPLOAD_CHUNK_BYTES):
+    """Write the file in form field ``field`` to ``open_destination(filename)``, streaming.
+
+    ``open_destination`` is called once the part's headers have arrived and
+    may raise (e.g. 400 for an unsupported file type) before any data is
+    written. Data is written ``write_bytes`` at a time and the size is
+    checked against ``max_mb`` as each network chunk arrives. Returns
+    ``(filename, destination, size in bytes)``. When this raises after the
+    destination was opened, cleaning it up is left to the caller, so
+    ``open_destination`` should keep hold of what it opens.
+    """
+    max_bytes = int(max_mb * 1024 * 1024)
+    content_type, params = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise too_large(max_mb)
+
+    part = _FilePart(field)
+    parser = MultipartParser(params[b"boundary"], part.callbacks())
+    destination = None
+
+    async def flush(final: bool):
+        nonlocal destination
+        if not part.found:
+            return
+        if part.received > max_bytes:
+            raise too_large(max_mb)
+        if destination is None:
+            destination = await run_in_threadpool(open_destination, part.filename or "")
+        if part.pending_bytes >= write_bytes or (final and part.pending):
+            await run_in_threadpool(destination.write, part.take())
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            await flush(final=False)
+        parser.finalize()
+        await flush(final=True)
+    except MultipartParseError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed multipart upload: {e}")
+    if not part.found:
+        raise HTTPException(status_code=422, detail=f"No file in form field '{field}'")
+    return part.filename, destination, part.received
@@ -0,0 +1,140 @@
+"""Building and querying the FAISS index of counseling transcripts.
+
+Shared by examples.py (serving), data_exploration/generating_embeddings.py
+(building) and the index benchmarks, so all of them agree on index types,
+metrics and how distances turn into similarities.
+"""
+import logging
+import math
+import os
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf-flat", "ivf-pq", "hnsw")
+# "l2": squared euclidean distance; "cosine": inner product of L2-normalized vectors
+METRICS = ("l2", "cosine")
+
+
+def default_nlist(n):
+    """IVF cell count: ~4*sqrt(n), keeping at least 39 training points per cell."""
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def default_pq_m(dim):
+    """Largest sub-quantizer count <= 64 that divides ``dim``."""
+    for m in (64, 48, 32, 24, 16, 12, 8, 6, 4, 2, 1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def build_index(vectors, index_type="flat", metric="l2", nlist=None, pq_m=None, pq_nbits=8, hnsw_m=32):
+    """Build and fill an index of ``index_type`` over float32 ``vectors``.
+
+    Row i of ``vectors`` gets id i, so callers keep metadata in a list
+    aligned with the rows.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r}, expected one of {METRICS}")
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if metric == "cosine":
+        vectors = vectors.copy()
+        faiss.normalize_L2(vectors)
+    n, dim = vectors.shape
+    faiss_metric = faiss.METRIC_INNER_PRODUCT if metric == "cosine" else faiss.METRIC_L2
+
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(dim) if metric == "cosine" else faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss_metric)
+    else:
+        nlist = nlist or default_nlist(n)
+        quantizer = faiss.IndexFlatIP(dim) if metric == "cosine" else faiss.IndexFlatL2(dim)
+        if index_type == "ivf-flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss_metric)
+        else:
+            # k-means needs at least 2**nbits points per sub-quantizer
+            pq_nbits = min(pq_nbits, int(math.log2(n)))
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m or default_pq_m(dim), pq_nbits, faiss_metric)
+        index.train(vectors)
+
+    index.add(vectors)
+    return index
+
+
+def read_index(path, mmap=True):
+    """Open an index file, memory-mapped and read-only when ``mmap`` is set.
+
+    Mapped indexes live in the OS page cache, so every worker process on the
+    host shares one copy. IO_FLAG_MMAP only maps IVF inverted lists; flat
+    and HNSW indexes keep their vectors in flat codes, which need
+    IO_FLAG_MMAP_IFC. Falls back to a normal read for index types this
+    faiss build can't map.
+    """
+    if mmap:
+        with open(path, "rb") as f:
+            ivf = f.read(2) == b"Iw"  # fourcc of the IVF index types
+        flags = (faiss.IO_FLAG_MMAP if ivf else faiss.IO_FLAG_MMAP_IFC) | faiss.IO_FLAG_READ_ONLY
+        try:
+            return faiss.read_index(path, flags)
+        except RuntimeError as e:
+            logger.warning("Could not memory-map %s (%s), reading it into memory", path, e)
+    return faiss.read_index(path)
+
+
+def write_index(index, path):
+    """Write via a temporary file and ``os.replace``, so ``path`` never holds a partial index."""
+    tmp_path = f"{path}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def add_vectors(index, vectors):
+    """Append rows to an existing index, normalizing them first for cosine indexes."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if index_metric(index) == "cosine":
+        vectors = vectors.copy()
+        faiss.normalize_L2(vectors)
+    index.add(vectors)
+
+
+def index_metric(index):
+    return "cosine" if index.metric_type == faiss.METRIC_INNER_PRODUCT else "l2"
+
+
+def configure_search(index, nprobe=None, ef_search=None):
+    """Apply query-time knobs; ignored for index types that don't have them."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = nprobe
+    if isinstance(index, faiss.IndexHNSW) and ef_search:
+        index.hnsw.efSearch = ef_search
+
+
+def search(index, queries, k):
+    """Search ``queries`` (n, dim); returns (distances, ids) like ``index.search``."""
+    queries = np.ascontiguousarray(np.atleast_2d(queries), dtype=np.float32)
+    if index_metric(index) == "cosine":
+        queries = queries.copy()
+        faiss.normalize_L2(queries)
+    return index.search(queries, min(k, index.ntotal))
+
+
+def similarity(distance, metric):
+    """Cosine similarity for a returned distance.
+
+    For "l2" this assumes unit-length embeddings (true for OpenAI embedding
+    models), where squared L2 distance d relates to cosine as 1 - d/2.
+    """
+    return float(distance) if metric == "cosine" else 1.0 - float(distance) / 2.0
+
+
+def vectors_from_index(index):
+    """All stored vectors of a flat index, e.g. to rebuild it as another type."""
+    return index.reconstruct_n(0, index.ntotal)
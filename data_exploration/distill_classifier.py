@@ -0,0 +1,318 @@
+"""Distill the topic classifier into a smaller student for CPU serving.
+
+    python distill_classifier.py --teacher runs/deberta-topic/best
+    python distill_classifier.py --student-layers 3 --temperature 3 --alpha 0.3
+
+The student is the teacher with most of its transformer layers dropped:
+same tokenizer, embeddings and classification head, and --student-layers
+evenly spaced encoder layers copied from the teacher as a starting point.
+It is trained on the counsel-chat train split against the teacher's
+temperature-softened probabilities, mixed with the true labels by --alpha.
+The validation split model_training.py holds out of train picks the best
+epoch and stops training early; the test split is only used for the final
+comparison, and neither model saw it during training as long as --seed
+matches the teacher's run.
+
+The student is saved to <output-dir>/student in the same
+AutoModelForSequenceClassification layout as the teacher, so copying it
+over backend/model_weights/roberta_classification is all categorize.py
+needs. <output-dir>/distillation_report.json compares teacher and student:
+test accuracy, agreement with the teacher, CPU latency, parameters, size on
+disk and load time.
+"""
+import os
+import re
+import json
+import time
+import argparse
+
+import numpy as np
+import torch
+from transformers import (
+    AutoTokenizer, AutoModelForSequenceClassification,
+    DataCollatorWithPadding, EarlyStoppingCallback, TrainingArguments, Trainer
+)
+
+from model_training import (
+    DATASET,
+    MAX_LENGTH,
+    TOKENIZED_CACHE_DIR,
+    EpochReport,
+    compute_metrics,
+    load_questions,
+    split_dataset,
+    tokenize_splits,
+    tokenized_cache_key,
+)
+
+# ==== CONFIGURATION ====
+
+TEACHER_DIR = "../backend/model_weights/roberta_classification"
+OUTPUT_DIR = "runs/deberta-topic-distilled"
+REPORT_FILE = "distillation_report.json"
+
+# ==== STUDENT ====
+
+_LAYER_KEY = re.compile(r"\.layer\.(\d+)\.")
+
+
+def make_student(teacher, num_layers):
+    """A copy of ``teacher`` keeping ``num_layers`` evenly spaced encoder layers."""
+    config = teacher.config.__class__.from_dict(teacher.config.to_dict())
+    teacher_layers = config.num_hidden_layers
+    if not 0 < num_layers <= teacher_layers:
+        raise SystemExit(f"--student-layers must be between 1 and {teacher_layers}")
+    keep = np.linspace(0, teacher_layers - 1, num_layers).round().astype(int).tolist()
+    config.num_hidden_layers = num_layers
+    student = AutoModelForSequenceClassification.from_config(config)
+
+    new_index = {old: new for new, old in enumerate(keep)}
+    state = {}
+    for key, value in teacher.state_dict().items():
+        match = _LAYER_KEY.search(key)
+        if match is None:
+            state[key] = value.clone()
+        elif int(match.group(1)) in new_index:
+            start, end = match.span(1)
+            state[f"{key[:start]}{new_index[int(match.group(1))]}{key[end:]}"] = value.clone()
+    student.load_state_dict(state)
+    return student, keep
+
+
+def teacher_logits(teacher, ds_tok, collator, batch_size):
+    """Logits of ``teacher`` for every row of ``ds_tok``, in order."""
+    teacher.eval()
+    columns = [c for c in ds_tok.column_names if c != "label"]
+    rows = ds_tok.select_columns(columns)
+    out = []
+    with torch.no_grad():
+        for start in range(0, len(rows), batch_size):
+            batch = collator([rows[i] for i in range(start, min(start + batch_size, len(rows)))])
+            out.append(teacher(**batch).logits.float().numpy())
+    return np.concatenate(out)
+
+# ==== TRAINING ====
+
+class DistillationTrainer(Trainer):
+    """Cross-entropy on the labels plus KL divergence to the teacher's softened probabilities.
+
+    ``alpha`` weighs the hard-label loss; the soft loss is scaled by T² so
+    its gradients stay comparable across temperatures. Eval batches carry
+    no teacher logits and get the hard-label loss alone.
+    """
+
+    def __init__(self, *args, temperature, alpha, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        labels = inputs.pop("labels", None)
+        if labels is None:
+            labels = inputs.pop("label")
+        soft_targets = inputs.pop("teacher_logits", None)  # not scored for the validation split
+        outputs = model(**inputs)
+        logits = outputs.logits
+        loss = torch.nn.functional.cross_entropy(logits, labels)
+        if soft_targets is not None:
+            t = self.temperature
+            soft_loss = torch.nn.functional.kl_div(
+                torch.log_softmax(logits / t, dim=-1),
+                torch.softmax(soft_targets.to(logits.dtype) / t, dim=-1),
+                reduction="batchmean",
+            ) * t * t
+            loss = self.alpha * loss + (1 - self.alpha) * soft_loss
+        return (loss, outputs) if return_outputs else loss
+
+# ==== COMPARISON ====
+
+def dir_size_mb(path):
+    """Size of the weight files in a saved model folder."""
+    total = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)
+                if f.endswith((".safetensors", ".bin")) and f != "training_args.bin")
+    return round(total / 1e6, 1)
+
+
+def predict(model, tok, texts, batch_size, max_length):
+    """(predicted ids, per-batch seconds) with batches of similar-length questions, like categorize.py."""
+    encoded = tok(texts, truncation=True, max_length=max_length)
+    lengths = [len(ids) for ids in encoded["input_ids"]]
+    order = sorted(range(len(texts)), key=lengths.__getitem__)
+    preds = np.zeros(len(texts), dtype=int)
+    seconds = []
+    model.eval()
+    with torch.no_grad():
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            inputs = tok.pad([{k: encoded[k][i] for k in encoded.keys()} for i in chunk], return_tensors="pt")
+            started = time.perf_counter()
+            logits = model(**inputs).logits
+            seconds.append(time.perf_counter() - started)
+            preds[chunk] = logits.argmax(-1).numpy()
+    return preds, seconds
+
+
+def evaluate_model(path, tok, texts, labels, batch_sizes, max_length, teacher_preds=None):
+    started = time.perf_counter()
+    model = AutoModelForSequenceClassification.from_pretrained(path)
+    load_seconds = time.perf_counter() - started
+    row = {
+        "path": path,
+        "layers": model.config.num_hidden_layers,
+        "parameters_m": round(sum(p.numel() for p in model.parameters()) / 1e6, 1),
+        "size_mb": dir_size_mb(path),
+        "load_seconds": round(load_seconds, 2),
+    }
+    preds = None
+    for batch_size in batch_sizes:
+        predict(model, tok, texts[:batch_size], batch_size, max_length)  # warm-up
+        preds, seconds = predict(model, tok, texts, batch_size, max_length)
+        ms = np.asarray(seconds) * 1000
+        row[f"batch{batch_size}_ms_p50"] = round(float(np.percentile(ms, 50)), 2)
+        row[f"batch{batch_size}_ms_p95"] = round(float(np.percentile(ms, 95)), 2)
+        row[f"batch{batch_size}_questions_per_s"] = round(len(texts) / ms.sum() * 1000, 1)
+    row["accuracy"] = round(float((preds == np.asarray(labels)).mean()), 4)
+    if teacher_preds is not None:
+        row["agreement_with_teacher"] = round(float((preds == teacher_preds).mean()), 4)
+    return row, preds
+
+# ==== MAIN SCRIPT ====
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Distill the topic classifier into a smaller student")
+    parser.add_argument("--teacher", default=TEACHER_DIR, help="fine-tuned teacher (model_training.py's <output-dir>/best)")
+    parser.add_argument("--dataset", default=DATASET,
+                        help="hub dataset or a local .csv/.json/.parquet with questionText and topic columns")
+    parser.add_argument("--max-length", type=int, default=MAX_LENGTH)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--seed", type=int, default=42, help="the teacher's --seed, so both are split the same way and neither trains on the test split")
+    parser.add_argument("--cache-dir", default=TOKENIZED_CACHE_DIR, help="tokenized dataset cache; '' to disable")
+
+    student = parser.add_argument_group("distillation")
+    student.add_argument("--student-layers", type=int, default=2, help="encoder layers kept from the teacher")
+    student.add_argument("--temperature", type=float, default=2.0)
+    student.add_argument("--alpha", type=float, default=0.5, help="weight of the hard-label loss")
+    student.add_argument("--epochs", type=int, default=15)
+    student.add_argument("--patience", type=int, default=3, help="0 trains every epoch")
+    student.add_argument("--batch-size", type=int, default=16)
+    student.add_argument("--eval-batch-size", type=int, default=32)
+    student.add_argument("--learning-rate", type=float, default=5e-5)
+    student.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = torch default)")
+
+    comparison = parser.add_argument_group("comparison")
+    comparison.add_argument("--latency-threads", type=int, default=1,
+                            help="torch threads while timing, like CATEGORIZE_TORCH_THREADS")
+    comparison.add_argument("--latency-batch-sizes", type=int, nargs="+", default=[1, 8])
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    started = time.perf_counter()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    # ------------------------------------------------------------
+    # 1. data, split and tokenized exactly like model_training.py
+    texts, labels = load_questions(args.dataset)
+    ds, label2id, id2label = split_dataset(texts, labels, seed=args.seed)
+    tok = AutoTokenizer.from_pretrained(args.teacher)
+    cache_path = None
+    if args.cache_dir:
+        key = tokenized_cache_key(tok, texts, labels, args.max_length, False, args.seed)
+        cache_path = os.path.join(args.cache_dir, key)
+    ds_tok, _ = tokenize_splits(ds, tok, args.max_length, False, cache_path)
+    data_collator = DataCollatorWithPadding(tok, pad_to_multiple_of=8)
+
+    # ------------------------------------------------------------
+    # 2. teacher soft labels
+    teacher = AutoModelForSequenceClassification.from_pretrained(args.teacher)
+    if teacher.config.label2id != label2id:
+        raise SystemExit(f"{args.teacher} was trained on different topics than {args.dataset}")
+    print(f"Scoring {len(ds_tok['train'])} training questions with the teacher...")
+    logits = teacher_logits(teacher, ds_tok["train"], data_collator, args.eval_batch_size)
+    train_ds = ds_tok["train"].add_column("teacher_logits", logits.tolist())
+
+    # ------------------------------------------------------------
+    # 3. student
+    student, kept = make_student(teacher, args.student_layers)
+    print(f"Student keeps teacher layers {kept} of {teacher.config.num_hidden_layers}")
+    del teacher
+
+    training_args = TrainingArguments(
+        output_dir=args.output_dir,
+        per_device_train_batch_size=args.batch_size,
+        per_device_eval_batch_size=args.eval_batch_size,
+        learning_rate=args.learning_rate,
+        num_train_epochs=args.epochs,
+        weight_decay=0.01,
+        eval_strategy="epoch",
+        save_strategy="epoch",
+        save_total_limit=2,
+        load_best_model_at_end=True,
+        metric_for_best_model="accuracy",
+        train_sampling_strategy="group_by_length",
+        seed=args.seed,
+        remove_unused_columns=False,
+        report_to="none",
+    )
+    epoch_report = EpochReport()
+    callbacks = [epoch_report]
+    if args.patience > 0:
+        callbacks.append(EarlyStoppingCallback(early_stopping_patience=args.patience))
+    trainer = DistillationTrainer(
+        model=student,
+        args=training_args,
+        train_dataset=train_ds,
+        eval_dataset=ds_tok["validation"],
+        processing_class=tok,
+        data_collator=data_collator,
+        compute_metrics=compute_metrics,
+        callbacks=callbacks,
+        temperature=args.temperature,
+        alpha=args.alpha,
+    )
+    train_started = time.perf_counter()
+    trainer.train()
+    train_seconds = time.perf_counter() - train_started
+
+    student_dir = os.path.join(args.output_dir, "student")
+    trainer.save_model(student_dir)
+    tok.save_pretrained(student_dir)
+
+    # ------------------------------------------------------------
+    # 4. teacher vs student on the test split
+    torch.set_num_threads(args.latency_threads)
+    test_texts = list(ds["test"]["text"])
+    test_labels = list(ds["test"]["label"])
+    teacher_row, teacher_preds = evaluate_model(
+        args.teacher, tok, test_texts, test_labels, args.latency_batch_sizes, args.max_length
+    )
+    student_row, _ = evaluate_model(
+        student_dir, tok, test_texts, test_labels, args.latency_batch_sizes, args.max_length, teacher_preds
+    )
+    report = {
+        "settings": vars(args),
+        "student_layers_from_teacher": kept,
+        "train_seconds": round(train_seconds, 1),
+        "epochs": epoch_report.epochs,
+        "teacher": teacher_row,
+        "student": student_row,
+        "speedup": {
+            f"batch{b}": round(teacher_row[f"batch{b}_ms_p50"] / student_row[f"batch{b}_ms_p50"], 2)
+            for b in args.latency_batch_sizes
+        },
+        "total_seconds": round(time.perf_counter() - started, 1),
+    }
+    with open(os.path.join(args.output_dir, REPORT_FILE), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for name, row in (("teacher", teacher_row), ("student", student_row)):
+        b = args.latency_batch_sizes[0]
+        print(f"{name}: accuracy {row['accuracy']}, {row['layers']} layers, {row['parameters_m']}M parameters, "
+              f"{row['size_mb']} MB, loads in {row['load_seconds']}s, batch-{b} p50 {row[f'batch{b}_ms_p50']} ms")
+    print(f"Student agrees with the teacher on {student_row['agreement_with_teacher']:.1%} of test questions")
+    print(f"Student saved to {student_dir}; copy it over backend/model_weights/roberta_classification to serve it")
+
+if __name__ == "__main__":
+    main()
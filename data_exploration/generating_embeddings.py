@@ -1,91 +1,323 @@
 import os
+import sys
 import json
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
 import faiss
 from tqdm import tqdm
+import openai
 from openai import OpenAI
-import os
+
+# Index helpers are shared with the backend so both sides agree on the format
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+import vector_index  # noqa: E402
+from embedding_cache import EmbeddingCache  # noqa: E402
+from transcript_store import TranscriptStore, write_store  # noqa: E402
+from embedding_providers import (  # noqa: E402
+    PROVIDERS,
+    TransientEmbeddingError,
+    corpus_files,
+    create_provider,
+    new_corpus_build,
+    publish_corpus,
+)
 
 # ==== CONFIGURATION ====
 
 # Set your OpenAI API key
 api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key)
 # Folder paths
 TRANSCRIPTS_FOLDER = "./HighLowQualityCounseling/transcripts"
 
-# Output files
+# Output files: one index over every transcript, build parameters in the meta
+# file, and ids / quality labels / texts in a SQLite store in index-row order.
+# Every embedding provider gets its own set, and every build its own
+# directory, see corpus_files.
+
+# Every finished vector is written here, keyed on a hash of model + text, so an
+# interrupted build resumes where it stopped and unchanged texts are never
+# embedded twice
+CHECKPOINT_FILE = "./conversation_embeddings/build_checkpoint.sqlite"
+
+# Legacy per-quality files, readable with --from-legacy
 HIGH_INDEX_FILE = "./conversation_embeddings/high_quality.index"
 LOW_INDEX_FILE = "./conversation_embeddings/low_quality.index"
 HIGH_TEXTS_FILE = "./conversation_embeddings/high_texts.json"
 LOW_TEXTS_FILE = "./conversation_embeddings/low_texts.json"
 
-# OpenAI embedding model
+# Model the legacy per-quality files were embedded with
 EMBEDDING_MODEL = "text-embedding-3-small"
 
-# ==== EMBEDDING FUNCTION ====
+QUALITIES = ("high", "low")
+
+# Index options used when neither a flag nor an --incremental previous build sets them
+BUILD_DEFAULTS = {"index_type": "flat", "metric": "l2", "nlist": None, "pq_m": None, "hnsw_m": 32}
+
+# ==== EMBEDDING ====
+# Texts are embedded with a provider from backend/embedding_providers.py
+
+_client = None
+_client_lock = threading.Lock()
+
+def _openai_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenAI(api_key=api_key, max_retries=0)  # retries are handled below
+        return _client
+
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+    TransientEmbeddingError,
+)
 
-def embed_texts(texts):
-    """Embed a list of texts using OpenAI embeddings."""
-    embeddings = []
-    for text in tqdm(texts, desc="Embedding texts"):
-        response = client.embeddings.create(
-            input=text,
-            model=EMBEDDING_MODEL
-        )
-        embeddings.append(np.array(response.data[0].embedding, dtype=np.float32))
-    return np.array(embeddings)
+
+class RateLimiter:
+    """Spaces out calls so at most ``per_minute`` start in any minute (0 = unlimited)."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+
+def _embed_with_retry(embed_batch, texts, limiter, max_retries):
+    for attempt in range(max_retries + 1):
+        limiter.wait()
+        try:
+            return embed_batch(texts)
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            # exponential backoff with full jitter
+            delay = random.uniform(0, min(60.0, 2 ** attempt))
+            tqdm.write(f"Embedding batch failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def embed_texts(texts, provider, checkpoint, batch_size=64, concurrency=4,
+                requests_per_minute=0, max_retries=6):
+    """Embed ``texts``, skipping any already in ``checkpoint``.
+
+    Uncached texts are sent ``batch_size`` at a time from ``concurrency``
+    threads under a shared rate limit. Each finished batch goes into the
+    checkpoint right away, so a crash loses at most the batches in flight.
+    """
+    model = provider.name
+    pending = list(dict.fromkeys(t for t in texts if checkpoint.get(model, t) is None))
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    print(f"{len(texts) - len(pending)} of {len(texts)} texts already embedded, "
+          f"{len(batches)} batches to go")
+
+    limiter = RateLimiter(requests_per_minute)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            pool.submit(_embed_with_retry, provider.embed, batch, limiter, max_retries): batch
+            for batch in batches
+        }
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Embedding batches"):
+            for text, vector in zip(futures[future], future.result()):
+                checkpoint.put(model, text, vector)
+
+    if not texts:
+        return np.zeros((0, provider.dim), dtype=np.float32)
+    return np.stack([checkpoint.get(model, t) for t in texts])
 
 # ==== LOAD CONVERSATIONS ====
 
 def load_conversations(folder_path, prefix):
-    """Load all .txt files from a folder."""
+    """Load all .txt files from a folder; returns (filenames, texts)."""
     conversations = []
     files = sorted([f for f in os.listdir(folder_path) if f.startswith(prefix)])
     for filename in files:
         with open(os.path.join(folder_path, filename), "r", encoding="utf-8") as f:
             conversations.append(f.read())
-    return conversations
+    return files, conversations
+
+
+def load_transcripts():
+    """Entries ({id, quality}) and texts of every transcript, high quality first."""
+    entries, texts = [], []
+    for quality in QUALITIES:
+        print(f"Loading {quality}-quality conversations...")
+        files, tier_texts = load_conversations(TRANSCRIPTS_FOLDER, f"{quality}_")
+        entries += [{"id": filename, "quality": quality} for filename in files]
+        texts += tier_texts
+    return entries, texts
+
+
+def load_legacy_corpus():
+    """Vectors, entries and texts from the old per-quality flat indexes."""
+    vectors, entries, texts = [], [], []
+    for quality, index_file, texts_file in (
+        ("high", HIGH_INDEX_FILE, HIGH_TEXTS_FILE),
+        ("low", LOW_INDEX_FILE, LOW_TEXTS_FILE),
+    ):
+        with open(texts_file, "r", encoding="utf-8") as f:
+            tier_texts = json.load(f)
+        vectors.append(vector_index.vectors_from_index(faiss.read_index(index_file)))
+        entries += [{"id": f"{quality}_{i}", "quality": quality} for i in range(len(tier_texts))]
+        texts += tier_texts
+    return np.concatenate(vectors), entries, texts
+
+
+def appendable_rows(entries, texts, index_file, meta_file, store_file):
+    """Number of rows of the existing build that are still valid, or None.
+
+    The existing rows must be an unchanged prefix of the new corpus (same
+    ids, qualities and text). Otherwise - or with no previous build - None
+    is returned and the index is rebuilt from the checkpointed vectors.
+    """
+    if not (os.path.exists(index_file) and os.path.exists(store_file) and os.path.exists(meta_file)):
+        return None
+    old_rows = TranscriptStore(store_file).all_rows()
+    new_rows = [(e["id"], e["quality"], t) for e, t in zip(entries, texts)]
+    if new_rows[:len(old_rows)] != old_rows:
+        return None
+    return len(old_rows)
+
+def build_params(args, previous):
+    """Index options: the flags given, else the previous build's meta, else BUILD_DEFAULTS."""
+    params = {}
+    for name, default in BUILD_DEFAULTS.items():
+        value = getattr(args, name)
+        if value is None and previous is not None:
+            value = previous.get(name)
+        params[name] = default if value is None else value
+    return params
+
+
+def conflicting_flags(args, previous):
+    """Index flags given explicitly that differ from the build being appended to."""
+    return [
+        f"--{name.replace('_', '-')}" for name in BUILD_DEFAULTS
+        if getattr(args, name) is not None and name in previous and getattr(args, name) != previous[name]
+    ]
 
 # ==== MAIN SCRIPT ====
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the conversation FAISS index")
+    # Unset index options default to the existing build's under --incremental,
+    # then to BUILD_DEFAULTS
+    parser.add_argument("--index-type", choices=vector_index.INDEX_TYPES, help="default flat")
+    parser.add_argument("--metric", choices=vector_index.METRICS,
+                        help="cosine builds an inner-product index over normalized vectors (default l2)")
+    parser.add_argument("--nlist", type=int, help="IVF cells (default ~4*sqrt(n))")
+    parser.add_argument("--pq-m", type=int, help="IVF-PQ sub-quantizers (must divide the dimension)")
+    parser.add_argument("--hnsw-m", type=int, help="HNSW neighbours per node (default 32)")
+    parser.add_argument("--from-legacy", action="store_true",
+                        help="rebuild from the existing high/low index files instead of re-embedding")
+
+    embedding = parser.add_argument_group("embedding")
+    embedding.add_argument("--provider", choices=PROVIDERS, default="openai",
+                           help="local runs a sentence-embedding model on CPU (use --concurrency 1); "
+                                "hashing is an offline stand-in. Each writes its own index files")
+    embedding.add_argument("--batch-size", type=int, default=64, help="texts per embeddings request")
+    embedding.add_argument("--concurrency", type=int, default=4, help="requests in flight")
+    embedding.add_argument("--requests-per-minute", type=int, default=0, help="0 = no limit")
+    embedding.add_argument("--max-retries", type=int, default=6)
+    embedding.add_argument("--checkpoint", default=CHECKPOINT_FILE)
+    embedding.add_argument("--incremental", action="store_true",
+                           help="append new transcripts to the existing index when nothing else changed")
+    embedding.add_argument("--fake-latency-ms", type=float, default=0.0, help="hashing provider only")
+    embedding.add_argument("--fake-error-rate", type=float, default=0.0, help="hashing provider only")
+    return parser.parse_args()
+
+
 def main():
-    # Load conversations
-    print("Loading high-quality conversations...")
-    high_texts = load_conversations(TRANSCRIPTS_FOLDER, "high_")
-    
-    print("Loading low-quality conversations...")
-    low_texts = load_conversations(TRANSCRIPTS_FOLDER, "low_")
-
-    # Embed conversations
-    print("Embedding high-quality conversations...")
-    high_embeddings = embed_texts(high_texts)
-
-    print("Embedding low-quality conversations...")
-    low_embeddings = embed_texts(low_texts)
-
-    # Build FAISS indexes
-    print("Building FAISS indexes...")
-    dimension = high_embeddings.shape[1]
-    high_index = faiss.IndexFlatL2(dimension)
-    low_index = faiss.IndexFlatL2(dimension)
-
-    high_index.add(high_embeddings)
-    low_index.add(low_embeddings)
-
-    # Save indexes
-    print("Saving FAISS indexes...")
-    faiss.write_index(high_index, HIGH_INDEX_FILE)
-    faiss.write_index(low_index, LOW_INDEX_FILE)
-
-    # Save conversation texts
-    print("Saving conversation texts...")
-    with open(HIGH_TEXTS_FILE, "w", encoding="utf-8") as f:
-        json.dump(high_texts, f, ensure_ascii=False, indent=2)
-
-    with open(LOW_TEXTS_FILE, "w", encoding="utf-8") as f:
-        json.dump(low_texts, f, ensure_ascii=False, indent=2)
+    args = parse_args()
+    started = time.perf_counter()
+
+    index_file, meta_file, store_file = corpus_files(args.provider)
+
+    keep = previous = None
+    if args.incremental and os.path.exists(meta_file):
+        with open(meta_file, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+
+    if args.from_legacy:
+        if args.provider != "openai":
+            raise SystemExit("--from-legacy reuses OpenAI vectors; it only works with --provider openai")
+        print("Reading vectors from the per-quality indexes...")
+        vectors, entries, texts = load_legacy_corpus()
+        model = EMBEDDING_MODEL
+    else:
+        provider = create_provider(
+            args.provider,
+            get_client=_openai_client,
+            fake_latency_s=args.fake_latency_ms / 1000,
+            fake_error_rate=args.fake_error_rate,
+        )
+        model = provider.name
+        if previous is not None and previous["model"] != model:
+            raise SystemExit(f"Existing index was built with {previous['model']}, not {model}; drop --incremental")
+        entries, texts = load_transcripts()
+        if args.incremental:
+            keep = appendable_rows(entries, texts, index_file, meta_file, store_file)
+            if keep is None:
+                print("Existing build missing or changed, rebuilding the index")
+            elif conflicting_flags(args, previous):
+                raise SystemExit(
+                    f"{', '.join(conflicting_flags(args, previous))} don't match the existing index; "
+                    "leave them out to append, or drop --incremental to rebuild"
+                )
+        checkpoint = EmbeddingCache(args.checkpoint, memory_size=0, disk_max_entries=10_000_000)
+        vectors = embed_texts(
+            texts if keep is None else texts[keep:],
+            provider,
+            checkpoint,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            requests_per_minute=args.requests_per_minute,
+            max_retries=args.max_retries,
+        )
+
+    if keep is not None:
+        meta = previous
+        print(f"Appending {len(vectors)} new conversations to the existing {keep}...")
+        index = faiss.read_index(index_file)
+        if len(vectors):
+            vector_index.add_vectors(index, vectors)
+    else:
+        params = build_params(args, previous)
+        meta = {"model": model, **params, "dim": int(vectors.shape[1])}
+        print(f"Building {params['index_type']} ({params['metric']}) index over {len(entries)} conversations...")
+        index = vector_index.build_index(vectors, **params)
+    meta["count"] = len(entries)
+
+    # The new build gets its own directory and goes live when the pointer
+    # file is switched to it; a running server keeps its current build until
+    # POST /api/examples/reload
+    version, (index_file, meta_file, store_file) = new_corpus_build(args.provider)
+    print(f"Saving FAISS index (build {version})...")
+    vector_index.write_index(index, index_file)
+
+    print("Saving conversation store...")
+    write_store(store_file, entries, texts)
+
+    with open(meta_file, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    publish_corpus(args.provider, version)
 
+    print(f"Built {len(entries)} conversations in {time.perf_counter() - started:.1f}s")
     print("All done ✅")
 
 if __name__ == "__main__":
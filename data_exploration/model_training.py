@@ -1,117 +1,340 @@
+"""Fine-tune the topic classifier served by backend/categorize.py.
+
+    python model_training.py
+    python model_training.py --grad-accum 2 --bf16 --patience 3
+    python model_training.py --pad-to-max-length --output-dir runs/deberta-topic-padded   # the old pipeline
+
+Questions are tokenized once and cached under --cache-dir, keyed on the
+tokenizer, max length and data, so later runs skip tokenization. Batches are
+padded only to their longest question, and questions of similar length are
+batched together, so little compute goes to pad tokens; --pad-to-max-length
+brings back fixed 256-token inputs in random order for comparison.
+
+A stratified validation set is split off the train split; it picks the best
+epoch and training stops once its accuracy hasn't improved for --patience
+epochs. The test split is only scored once, on the best model, at the end.
+
+The best model and tokenizer are saved to <output-dir>/best, and
+<output-dir>/training_report.json records the wall-clock time and validation
+accuracy of every epoch, the test accuracy, and the share of pad tokens in
+training batches. --compare prints the differences against the report of an
+earlier run.
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+
 import numpy as np
 import torch
-from datasets import Dataset
+import transformers
+from datasets import ClassLabel, Dataset, load_dataset, load_from_disk
 from transformers import (
     AutoTokenizer, AutoModelForSequenceClassification,
-    DataCollatorWithPadding, TrainingArguments, Trainer
+    DataCollatorWithPadding, EarlyStoppingCallback, TrainerCallback, TrainingArguments, Trainer
 )
-import evaluate
 
-# ------------------------------------------------------------
+# ==== CONFIGURATION ====
 
-from datasets import Dataset, ClassLabel, load_dataset
+DATASET = "nbertagnolli/counsel-chat"
+MODEL_NAME = "microsoft/deberta-v3-small"
+MAX_LENGTH = 256  # must match MAX_LENGTH in backend/categorize.py
+OUTPUT_DIR = "runs/deberta-topic"
+TOKENIZED_CACHE_DIR = ".cache/tokenized"
+REPORT_FILE = "training_report.json"
+TEST_SIZE = 0.20  # of all questions
+VALIDATION_SIZE = 0.10  # of the train split, for early stopping and picking the best epoch
 
+# ==== DATA ====
 
-dataset = load_dataset("nbertagnolli/counsel-chat", cache_dir=".")
-df = dataset["train"].to_pandas()
-df_clean = df.dropna(subset=["questionText"])
+def load_questions(dataset):
+    """(texts, topics) from the hub dataset, or a local .csv/.json/.parquet with the same columns."""
+    extension = os.path.splitext(dataset)[1].lstrip(".")
+    if os.path.isfile(dataset) and extension in ("csv", "json", "parquet"):
+        df = load_dataset(extension, data_files=dataset)["train"].to_pandas()
+    else:
+        df = load_dataset(dataset, cache_dir=".")["train"].to_pandas()
+    df_clean = df.dropna(subset=["questionText"])
+    return df_clean["questionText"].tolist(), df_clean["topic"].tolist()
 
-texts  = df_clean["questionText"].tolist()
-labels = df_clean["topic"].tolist()
 
-# map topics → ids
-label2id = {t:i for i,t in enumerate(sorted(set(labels)))}
-id2label = {v:k for k,v in label2id.items()}
-y = [label2id[t] for t in labels]
+def split_dataset(texts, labels, seed=42):
+    # map topics → ids
+    label2id = {t: i for i, t in enumerate(sorted(set(labels)))}
+    id2label = {v: k for k, v in label2id.items()}
+    raw_ds = Dataset.from_dict({"text": texts, "label": [label2id[t] for t in labels]})
 
-raw_ds = Dataset.from_dict({"text": texts, "label": y})
+    # ➜ turn the int column into ClassLabel so stratification is allowed
+    class_names = [id2label[i] for i in range(len(id2label))]
+    raw_ds = raw_ds.cast_column("label", ClassLabel(num_classes=len(class_names), names=class_names))
+    ds = raw_ds.train_test_split(test_size=TEST_SIZE, stratify_by_column="label", seed=seed)
+    # validation comes out of train, so the test split is the same as without it
+    held_out = ds["train"].train_test_split(test_size=VALIDATION_SIZE, stratify_by_column="label", seed=seed)
+    ds["train"], ds["validation"] = held_out["train"], held_out["test"]
+    return ds, label2id, id2label
 
-# ➜ turn the int column into ClassLabel so stratification is allowed
-class_names = [id2label[i] for i in range(len(id2label))]
-raw_ds = raw_ds.cast_column("label", ClassLabel(num_classes=len(class_names),
-                                                names=class_names))
 
-ds = raw_ds.train_test_split(test_size=0.20,
-                             stratify_by_column="label",
-                             seed=42)
+def tokenized_cache_key(tok, texts, labels, max_length, pad_to_max_length, seed):
+    """Changes whenever the tokenizer, its settings or the data would change the tokenized splits."""
+    h = hashlib.sha256()
+    for part in (tok.name_or_path, type(tok).__name__, len(tok), transformers.__version__,
+                 max_length, pad_to_max_length, seed, TEST_SIZE, VALIDATION_SIZE):
+        h.update(f"{part}\0".encode("utf-8"))
+    for text, label in zip(texts, labels):
+        h.update(f"{text}\0{label}\0".encode("utf-8"))
+    return h.hexdigest()[:16]
 
-# ------------------------------------------------------------
-# 2. tokenizer + dynamic pad collator
-model_name = "microsoft/deberta-v3-small"
-tok = AutoTokenizer.from_pretrained(model_name)
 
-def tokenize(batch):
-    return tok(batch["text"],
-               padding="max_length",
-               truncation=True,
-               max_length=256)
-ds_tok = ds.map(tokenize, batched=True, remove_columns=["text"])
+def tokenize_splits(ds, tok, max_length, pad_to_max_length, cache_path):
+    """Tokenized train/validation/test splits, read from ``cache_path`` when an earlier run saved them.
 
-data_collator = DataCollatorWithPadding(tok, pad_to_multiple_of=8)
+    Questions are only truncated here; padding is left to the collator
+    unless ``pad_to_max_length``.
+    """
+    if cache_path and os.path.isdir(cache_path):
+        return load_from_disk(cache_path), True
 
-# ------------------------------------------------------------
-# 3. class weights (train split only)
-train_labels = np.array(ds_tok["train"]["label"])
-classes, counts = np.unique(train_labels, return_counts=True)
-class_weights = torch.tensor(len(train_labels) / counts, dtype=torch.float)
+    def tokenize(batch):
+        return tok(batch["text"],
+                   padding="max_length" if pad_to_max_length else False,
+                   truncation=True,
+                   max_length=max_length)
 
-# ------------------------------------------------------------
-# 4. model
-model = AutoModelForSequenceClassification.from_pretrained(
-    model_name,
-    num_labels=len(classes),
-    id2label=id2label,
-    label2id=label2id,
-)
+    ds_tok = ds.map(tokenize, batched=True, remove_columns=["text"])
+    if cache_path:
+        # Saved to a temporary folder first so an interrupted run leaves no half-written cache
+        tmp_path = f"{cache_path}.tmp-{os.getpid()}"
+        ds_tok.save_to_disk(tmp_path)
+        os.replace(tmp_path, cache_path)
+    return ds_tok, False
+
+# ==== TRAINING ====
 
-# ------------------------------------------------------------
-# 5. weighted-loss trainer
 class WeightedTrainer(Trainer):
+    """Cross-entropy weighted by inverse class frequency in the train split.
+
+    Also counts the real and padded tokens of the training batches. Counting
+    here rather than in the collator leaves eval batches out and still works
+    when dataloader workers run the collator in other processes.
+    """
+
+    def __init__(self, *args, class_weights, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.class_weights = class_weights
+        self.real_tokens = 0
+        self.padded_tokens = 0
+
     def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
-        labels = inputs.pop("labels", None)          
+        labels = inputs.pop("labels", None)
         if labels is None:
-            labels = inputs.pop("label")             
+            labels = inputs.pop("label")
+        if model.training:
+            mask = inputs["attention_mask"]
+            self.real_tokens += int(mask.sum())
+            self.padded_tokens += mask.numel()
         outputs = model(**inputs)
-        logits  = outputs.logits
-        loss_fct = torch.nn.CrossEntropyLoss(weight=class_weights.to(model.device))
+        logits = outputs.logits
+        loss_fct = torch.nn.CrossEntropyLoss(weight=self.class_weights.to(model.device))
         loss = loss_fct(logits, labels)
         return (loss, outputs) if return_outputs else loss
 
-# ------------------------------------------------------------
-# 6. training args
-args = TrainingArguments(
-    output_dir="runs/deberta-topic",
-    per_device_train_batch_size=16,
-    per_device_eval_batch_size=32,
-    learning_rate=2e-5,
-    num_train_epochs=30,
-    weight_decay=0.01,
-    eval_strategy="epoch",
-    save_strategy="epoch",
-    load_best_model_at_end=True,
-    metric_for_best_model="accuracy",
-    remove_unused_columns=False,   
-    report_to="none",          
-)
+    def pad_share(self):
+        return round(1 - self.real_tokens / self.padded_tokens, 4) if self.padded_tokens else None
+
+
+class EpochReport(TrainerCallback):
+    """Wall-clock time of each training epoch and the eval metrics that follow it."""
+
+    def __init__(self):
+        self.epochs = []
+        self._started = None
+
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self._started = time.perf_counter()
+
+    def on_epoch_end(self, args, state, control, **kwargs):
+        self.epochs.append({"epoch": round(state.epoch), "train_seconds": round(time.perf_counter() - self._started, 2)})
+
+    def on_evaluate(self, args, state, control, metrics=None, **kwargs):
+        # only the evaluation right after each epoch, not the final one on the best model
+        if self.epochs and metrics and "eval_accuracy" not in self.epochs[-1]:
+            self.epochs[-1].update(
+                eval_accuracy=round(metrics.get("eval_accuracy", float("nan")), 4),
+                eval_loss=round(metrics.get("eval_loss", float("nan")), 4),
+                eval_seconds=round(metrics.get("eval_runtime", 0.0), 2),
+            )
+
 
-# ------------------------------------------------------------
-# 7. metrics
-metric_acc = evaluate.load("accuracy")
 def compute_metrics(eval_pred):
     logits, labels = eval_pred
     preds = np.argmax(logits, axis=-1)
-    return metric_acc.compute(predictions=preds, references=labels)
-
-# ------------------------------------------------------------
-# 8. train
-trainer = WeightedTrainer(
-    model=model,
-    args=args,
-    train_dataset=ds_tok["train"],
-    eval_dataset=ds_tok["test"],
-    tokenizer=tok,
-    data_collator=data_collator,
-    compute_metrics=compute_metrics,
-)
+    return {"accuracy": float((preds == labels).mean())}
+
+# ==== REPORT ====
+
+def compare(report, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    for key in ("seconds_per_epoch", "train_seconds", "best_eval_accuracy", "test_accuracy", "pad_share"):
+        before, after = baseline.get(key), report.get(key)
+        if before is not None and after is not None:
+            change = f" ({(after / before - 1) * 100:+.1f}%)" if before else ""
+            print(f"{key}: {before} -> {after}{change}")
+
+# ==== MAIN SCRIPT ====
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fine-tune the counsel-chat topic classifier")
+    parser.add_argument("--dataset", default=DATASET,
+                        help="hub dataset or a local .csv/.json/.parquet with questionText and topic columns")
+    parser.add_argument("--model-name", default=MODEL_NAME)
+    parser.add_argument("--max-length", type=int, default=MAX_LENGTH)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--seed", type=int, default=42)
+
+    data = parser.add_argument_group("batching")
+    data.add_argument("--pad-to-max-length", action="store_true",
+                      help="pad every question to --max-length and batch in random order, like the old script")
+    data.add_argument("--cache-dir", default=TOKENIZED_CACHE_DIR, help="tokenized dataset cache; '' to disable")
+    data.add_argument("--dataloader-workers", type=int, default=0)
+
+    training = parser.add_argument_group("training")
+    training.add_argument("--epochs", type=int, default=30, help="upper bound; early stopping usually ends sooner")
+    training.add_argument("--patience", type=int, default=3,
+                          help="epochs without a validation accuracy gain before stopping; 0 trains every epoch")
+    training.add_argument("--batch-size", type=int, default=16)
+    training.add_argument("--eval-batch-size", type=int, default=32)
+    training.add_argument("--grad-accum", type=int, default=1, help="batches per optimizer step")
+    training.add_argument("--learning-rate", type=float, default=2e-5)
+    training.add_argument("--bf16", action="store_true", help="bfloat16 autocast; also works on recent CPUs")
+    training.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = torch default)")
+    parser.add_argument("--compare", help="training_report.json of an earlier run to compare against")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    started = time.perf_counter()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    # ------------------------------------------------------------
+    # 1. data
+    texts, labels = load_questions(args.dataset)
+    ds, label2id, id2label = split_dataset(texts, labels, seed=args.seed)
+
+    # ------------------------------------------------------------
+    # 2. tokenizer + cached tokenization + dynamic pad collator
+    tok = AutoTokenizer.from_pretrained(args.model_name)
+    cache_path = None
+    if args.cache_dir:
+        key = tokenized_cache_key(tok, texts, labels, args.max_length, args.pad_to_max_length, args.seed)
+        cache_path = os.path.join(args.cache_dir, key)
+    tokenize_started = time.perf_counter()
+    ds_tok, cache_hit = tokenize_splits(ds, tok, args.max_length, args.pad_to_max_length, cache_path)
+    tokenize_seconds = time.perf_counter() - tokenize_started
+    print(f"Tokenized {len(texts)} questions in {tokenize_seconds:.1f}s"
+          + (f" (cached in {cache_path})" if cache_hit else ""))
+
+    data_collator = DataCollatorWithPadding(tok, pad_to_multiple_of=8)
+
+    # ------------------------------------------------------------
+    # 3. class weights (train split only)
+    train_labels = np.array(ds_tok["train"]["label"])
+    classes, counts = np.unique(train_labels, return_counts=True)
+    class_weights = torch.tensor(len(train_labels) / counts, dtype=torch.float)
+
+    # ------------------------------------------------------------
+    # 4. model
+    model = AutoModelForSequenceClassification.from_pretrained(
+        args.model_name,
+        num_labels=len(classes),
+        id2label=id2label,
+        label2id=label2id,
+    )
+
+    # ------------------------------------------------------------
+    # 5. training args
+    training_args = TrainingArguments(
+        output_dir=args.output_dir,
+        per_device_train_batch_size=args.batch_size,
+        per_device_eval_batch_size=args.eval_batch_size,
+        gradient_accumulation_steps=args.grad_accum,
+        learning_rate=args.learning_rate,
+        num_train_epochs=args.epochs,
+        weight_decay=0.01,
+        eval_strategy="epoch",
+        save_strategy="epoch",
+        save_total_limit=2,  # the best checkpoint is always kept
+        load_best_model_at_end=True,
+        metric_for_best_model="accuracy",
+        train_sampling_strategy="random" if args.pad_to_max_length else "group_by_length",
+        bf16=args.bf16,
+        use_cpu=not torch.cuda.is_available(),  # bf16 on CPU has to be asked for explicitly
+        dataloader_num_workers=args.dataloader_workers,
+        seed=args.seed,
+        remove_unused_columns=False,
+        report_to="none",
+    )
+
+    # ------------------------------------------------------------
+    # 6. train
+    epoch_report = EpochReport()
+    callbacks = [epoch_report]
+    if args.patience > 0:
+        callbacks.append(EarlyStoppingCallback(early_stopping_patience=args.patience))
+    trainer = WeightedTrainer(
+        model=model,
+        args=training_args,
+        train_dataset=ds_tok["train"],
+        eval_dataset=ds_tok["validation"],
+        processing_class=tok,
+        data_collator=data_collator,
+        compute_metrics=compute_metrics,
+        callbacks=callbacks,
+        class_weights=class_weights,
+    )
+    train_started = time.perf_counter()
+    trainer.train()
+    train_seconds = time.perf_counter() - train_started
+
+    # ------------------------------------------------------------
+    # 7. save + report
+    best_dir = os.path.join(args.output_dir, "best")
+    trainer.save_model(best_dir)
+    tok.save_pretrained(best_dir)
+
+    best = trainer.evaluate()
+    test = trainer.predict(ds_tok["test"], metric_key_prefix="test").metrics
+    epochs = epoch_report.epochs
+    report = {
+        "settings": {k: v for k, v in vars(args).items() if k != "compare"},
+        "train_examples": len(ds_tok["train"]),
+        "validation_examples": len(ds_tok["validation"]),
+        "test_examples": len(ds_tok["test"]),
+        "tokenize_seconds": round(tokenize_seconds, 2),
+        "tokenized_cache_hit": cache_hit,
+        "epochs_run": len(epochs),
+        "stopped_early": len(epochs) < args.epochs,
+        "train_seconds": round(train_seconds, 1),
+        "seconds_per_epoch": round(float(np.mean([e["train_seconds"] for e in epochs])), 2) if epochs else None,
+        "best_eval_accuracy": round(best["eval_accuracy"], 4),
+        "test_accuracy": round(test["test_accuracy"], 4),
+        "pad_share": trainer.pad_share(),
+        "total_seconds": round(time.perf_counter() - started, 1),
+        "epochs": epochs,
+    }
+    with open(os.path.join(args.output_dir, REPORT_FILE), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    pad_share = "n/a" if report["pad_share"] is None else f"{report['pad_share']:.0%}"
+    print(f"Best validation accuracy {report['best_eval_accuracy']} after {len(epochs)} epochs "
+          f"({report['seconds_per_epoch']}s per epoch, {pad_share} pad tokens)")
+    print(f"Test accuracy {report['test_accuracy']}")
+    print(f"Model saved to {best_dir}")
+    if args.compare:
+        compare(report, args.compare)
 
-trainer.train()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
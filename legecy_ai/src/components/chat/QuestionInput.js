@@ -24,7 +24,9 @@ const QuestionInput = () => {
     isLoading, 
     categoryReceived,
     category,
-    messages 
+    messages,
+    sessionId,
+    setSessionId
   } = useChat();
 
   const handleSubmit = async (e) => {
@@ -51,8 +53,18 @@ const QuestionInput = () => {
         response = await categorizeQuestion(input);
         setCategory(response.category);
       } else {
-        // Otherwise, just send the message in the existing conversation
-        response = await sendChatMessage(input, category, messages);
+        // Otherwise, just send the message in the existing conversation.
+        // The first chat message starts a server-side session seeded with
+        // the messages so far; the server answers with its id, and later
+        // messages send only the id and the new message.
+        if (sessionId) {
+          response = await sendChatMessage(input, category, sessionId);
+        } else {
+          response = await sendChatMessage(input, category, null, messages);
+          if (response.session_id) {
+            setSessionId(response.session_id);
+          }
+        }
       }
       
       // Add AI response to chat
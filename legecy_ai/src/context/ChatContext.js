@@ -2,7 +2,8 @@
  * ChatContext.js
  * 
  * Context provider for chat functionality in the counseling advice system.
- * Manages global state for messages, categorization, and loading states.
+ * Manages global state for messages, categorization, loading states and the
+ * id under which the backend stores the conversation.
  * Uses reducer pattern to handle state updates through defined actions.
  */
 
@@ -17,6 +18,8 @@ const chatReducer = (state, action) => {
       return { ...state, isLoading: action.payload };
     case 'SET_CATEGORY':
       return { ...state, category: action.payload, categoryReceived: true };
+    case 'SET_SESSION_ID':
+      return { ...state, sessionId: action.payload };
     case 'ADD_MESSAGE':
       return { ...state, messages: [...state.messages, action.payload] };
     case 'RESET_CHAT':
@@ -32,6 +35,7 @@ const initialState = {
   category: null,
   categoryReceived: false,
   isLoading: false,
+  sessionId: null,
 };
 
 export const ChatProvider = ({ children }) => {
@@ -46,6 +50,10 @@ export const ChatProvider = ({ children }) => {
     dispatch({ type: 'SET_CATEGORY', payload: category });
   };
 
+  const setSessionId = (sessionId) => {
+    dispatch({ type: 'SET_SESSION_ID', payload: sessionId });
+  };
+
   const addMessage = (message) => {
     dispatch({ type: 'ADD_MESSAGE', payload: message });
   };
@@ -60,6 +68,7 @@ export const ChatProvider = ({ children }) => {
         ...state,
         setLoading,
         setCategory,
+        setSessionId,
         addMessage,
         resetChat,
       }}
@@ -33,16 +33,23 @@ export const categorizeQuestion = async (question) => {
   }
 };
 
-// Sends a message in an existing chat conversation
-export const sendChatMessage = async (message, category, history) => {
+// Sends a message in an existing chat conversation. The backend keeps the
+// conversation under sessionId, so history is only needed to seed it on the
+// first message; without a sessionId the backend starts a new session and
+// returns its id as session_id.
+export const sendChatMessage = async (message, category, sessionId, history = []) => {
   try {
-    console.log('Sending message:', message, 'with category:', category, 'history:', history);
+    console.log('Sending message:', message, 'with category:', category, 'session:', sessionId);
     const response = await fetch('/api/chat', {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
       },
-      body: JSON.stringify({ message, category, history }),
+      body: JSON.stringify(
+        sessionId
+          ? { message, category, session_id: sessionId }
+          : { message, category, history, new_session: true }
+      ),
     });
 
     if (!response.ok) {
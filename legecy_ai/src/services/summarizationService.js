@@ -5,7 +5,7 @@
  * Provides functions for:
  * - Submitting text input for summarization
  * - Uploading and processing text files
- * - Uploading and processing audio files
+ * - Uploading audio files as background jobs and polling until they finish
  * - Downloading summary results as PDF
  */
 
@@ -15,10 +15,12 @@ const processSummarizationResponse = async (response) => {
     throw new Error(`Failed to process request: ${response.status} ${response.statusText}`);
   }
   
-  const data = await response.json();
-  
-  // Return the API response directly, adding empty arrays for expected fields
-  // to prevent "Cannot read properties of undefined (reading 'map')" errors
+  return toSummary(await response.json());
+};
+
+// Return the API response directly, adding empty arrays for expected fields
+// to prevent "Cannot read properties of undefined (reading 'map')" errors
+const toSummary = (data) => {
   return {
     id: data.id,
     transcript: data.transcript || null,
@@ -66,18 +68,42 @@ export const submitFile = async (file) => {
   }
 };
 
-// Upload and process audio file for summarization
-export const submitAudio = async (audioFile) => {
+const JOB_POLL_INTERVAL_MS = 2000;
+
+// Poll a summarization job until it is done or failed
+const waitForJob = async (statusUrl, onProgress) => {
+  for (;;) {
+    const response = await fetch(statusUrl);
+    if (!response.ok) {
+      throw new Error(`Failed to check job: ${response.status} ${response.statusText}`);
+    }
+    const job = await response.json();
+    if (onProgress) onProgress(job.status);
+    if (job.status === 'done') return job;
+    if (job.status === 'failed') throw new Error(job.error || 'Summarization failed');
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+};
+
+// Upload audio as a background job (long recordings can take minutes) and
+// wait for the result; onProgress receives each status
+// (uploaded, transcribing, summarizing, done)
+export const submitAudio = async (audioFile, onProgress) => {
   try {
     const formData = new FormData();
     formData.append('audio', audioFile);
 
-    const response = await fetch('/api/summarization/audio', {
+    const response = await fetch('/api/summarization/jobs/audio', {
       method: 'POST',
       body: formData,
     });
+    if (!response.ok) {
+      throw new Error(`Failed to process request: ${response.status} ${response.statusText}`);
+    }
 
-    return processSummarizationResponse(response);
+    const { job_id: jobId, status_url: statusUrl } = await response.json();
+    const job = await waitForJob(statusUrl, onProgress);
+    return toSummary({ ...job, id: jobId });
   } catch (error) {
     console.error('Error processing audio:', error);
     throw error;